@@ -0,0 +1,61 @@
+# Benchmark da decodificação de um CSV UTF-8 com um byte Latin-1 perdido na última linha:
+# tentativa em UTF-8 + releitura inteira em Latin-1 (antes) vs detecção no prefixo e
+# decodificação em uma única passada com fallback por linha (depois).
+#
+# Uso: python benchmarks/bench_encoding.py [linhas]
+import sys
+import os
+import time
+import tempfile
+import zipfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from src.processor import iter_zip_member
+
+CABECALHO = '"DATA";"REG_ANS";"CD_CONTA_CONTABIL";"DESCRICAO";"VL_SALDO_INICIAL";"VL_SALDO_FINAL"\n'
+LINHA = '"2024-01-01";"{}";"4111";"EVENTOS INDENIZÁVEIS LÍQUIDOS / SINISTROS RETIDOS";"0";"{},00"\n'
+
+def criar_zip(path, n):
+    corpo = "".join(LINHA.format(300000 + i % 1000, i) for i in range(n - 1)).encode("utf-8")
+    ultima = LINHA.format(419999, n).replace("EVENTOS", "SAÚDE EVENTOS").encode("latin1")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("1T2024.csv", CABECALHO.encode("utf-8") + corpo + ultima)
+
+# Comportamento anterior: UTF-8 e, se falhar em qualquer ponto, o arquivo inteiro em Latin-1
+def ler_com_releitura(zip_path):
+    with zipfile.ZipFile(zip_path) as z:
+        try:
+            with z.open("1T2024.csv") as f:
+                return pd.read_csv(f, sep=';', encoding='utf-8', on_bad_lines='skip', dtype=str)
+        except UnicodeDecodeError:
+            with z.open("1T2024.csv") as f:
+                return pd.read_csv(f, sep=';', encoding='latin1', on_bad_lines='skip', dtype=str)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, "1T2024.zip")
+        criar_zip(zip_path, n)
+
+        start = time.perf_counter()
+        antes = ler_com_releitura(zip_path)
+        t_antes = time.perf_counter() - start
+
+        start = time.perf_counter()
+        chunks = iter_zip_member(zip_path, "1T2024.csv")
+        _, _, decoder = next(chunks)
+        depois = next(chunks)
+        chunks.close()
+        t_depois = time.perf_counter() - start
+
+    assert len(antes) == len(depois) == n, "quantidade de linhas divergente"
+    acentos_ok = lambda df: int(df['DESCRICAO'].str.contains('INDENIZÁVEIS', regex=False).sum())
+    print(f"Linhas: {n:,} | encoding detectado: {decoder.encoding} | linhas em fallback: {decoder.fallback_rows}")
+    print(f"  UTF-8 + releitura em Latin-1:   {t_antes:7.3f}s  (2 parses; {acentos_ok(antes):,} descrições com acentos corretos)")
+    print(f"  Detecção + passada única:       {t_depois:7.3f}s  (1 parse; {acentos_ok(depois):,} descrições com acentos corretos)")
+    print(f"  speedup {t_antes / t_depois:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Benchmark do pré-filtro de contas (EVENTO/SINISTRO) sobre as linhas cruas:
+# parse completo + filtro na Descricao (antes) vs pré-filtro + colunas podadas (depois).
+#
+# Uso: python benchmarks/bench_pre_filter.py [linhas]
+import sys
+import os
+import time
+import tempfile
+import zipfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from src.processor import (ACCOUNT_PATTERNS, read_zip_member, normalize_columns,
+                           clean_and_validate, process_member)
+
+CABECALHO = '"DATA";"REG_ANS";"CD_CONTA_CONTABIL";"DESCRICAO";"VL_SALDO_INICIAL";"VL_SALDO_FINAL"\n'
+# Proporção aproximada das demonstrações contábeis: a maioria das contas não é de eventos/sinistros
+DESCRICOES = (["EVENTOS INDENIZÁVEIS LÍQUIDOS / SINISTROS RETIDOS"] * 1 +
+              ["CONTRAPRESTAÇÕES EFETIVAS DE PLANO DE ASSISTÊNCIA À SAÚDE", "ATIVO CIRCULANTE",
+               "DISPONÍVEL", "APLICAÇÕES FINANCEIRAS", "PROVISÕES TÉCNICAS", "DESPESAS ADMINISTRATIVAS",
+               "CRÉDITOS DE OPERAÇÕES", "PATRIMÔNIO LÍQUIDO", "TRIBUTOS A RECOLHER"])
+
+def criar_zip(path, n):
+    rng = np.random.default_rng(7)
+    descricoes = np.array(DESCRICOES)[rng.integers(0, len(DESCRICOES), n)]
+    regs = rng.integers(300000, 420000, n)
+    valores = rng.integers(0, 10_000_000, n)
+    linhas = [f'"2024-01-01";"{r}";"411{i % 1000}";"{d}";"0";"{v // 100},{v % 100:02d}"\n'
+              for i, (r, d, v) in enumerate(zip(regs, descricoes, valores))]
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("1T2024.csv", CABECALHO + "".join(linhas))
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, "1T2024.zip")
+        criar_zip(zip_path, n)
+
+        start = time.perf_counter()
+        df, _ = read_zip_member(zip_path, "1T2024.csv", 'utf-8')
+        df = normalize_columns(df)
+        antes = clean_and_validate(df, "1T2024.csv", None, stats=None)
+        t_antes = time.perf_counter() - start
+
+        partes = []
+        start = time.perf_counter()
+        linhas, parseadas, _, _, _, _ = process_member(zip_path, "1T2024.csv", None, None, partes.append, 'utf-8')
+        t_depois = time.perf_counter() - start
+
+        assert antes.reset_index(drop=True).equals(partes[0].reset_index(drop=True)), "resultados divergentes"
+
+    print(f"Linhas no arquivo: {linhas:,} | padrões: {', '.join(ACCOUNT_PATTERNS)}")
+    print(f"  Parse completo + filtro:        {t_antes:7.3f}s  ({linhas:,} linhas parseadas, 6 colunas)")
+    print(f"  Pré-filtro + colunas podadas:   {t_depois:7.3f}s  ({parseadas:,} linhas parseadas, 4 colunas)")
+    print(f"  Redução do parse: {100 * (1 - parseadas / linhas):.0f}% das linhas | speedup {t_antes / t_depois:.1f}x")
+
+if __name__ == "__main__":
+    main()
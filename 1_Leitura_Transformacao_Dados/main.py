@@ -1,13 +1,34 @@
 import sys
 import os
+import argparse
 
 # Adiciona o diretório atual ao path para garantir que o python encontre o pacote 'src'
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from src.scraper import download_files
-from src.processor import process_data
+from src.scraper import download_files, MAX_WORKERS
+from src.processor import process_data, ACCOUNT_PATTERNS
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ETL dos dados de despesas da ANS")
+    parser.add_argument("--trimestres", type=int, default=3,
+                        help="Quantidade de trimestres mais recentes a baixar (padrão: 3)")
+    parser.add_argument("--desde", type=int, default=None,
+                        help="Baixa todos os trimestres a partir deste ano (ignora --trimestres)")
+    parser.add_argument("--conexoes", type=int, default=MAX_WORKERS,
+                        help=f"Limite de conexões simultâneas no download (padrão: {MAX_WORKERS})")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Processa os CSVs em blocos de N linhas, com memória limitada (padrão: arquivo inteiro)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processa os arquivos trimestrais em N processos paralelos (padrão: 1)")
+    parser.add_argument("--contas", nargs="+", default=list(ACCOUNT_PATTERNS),
+                        help=f"Textos que identificam as contas de despesa na Descricao (padrão: {' '.join(ACCOUNT_PATTERNS)})")
+    parser.add_argument("--parquet", action="store_true",
+                        help="Gera também o consolidado em Parquet tipado, particionado por Ano/Trimestre (requer pyarrow)")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+
     print("===================================================")
     print("        INICIANDO TESTE 1: ETL DADOS ANS")
     print("===================================================")
@@ -15,7 +36,8 @@ def main():
     # Passo 1: Extração (Crawler)
     print("\n[1/2] Executando Scraper (Download)...")
     try:
-        download_files()
+        n_quarters = None if args.desde else args.trimestres
+        download_files(n_quarters=n_quarters, since_year=args.desde, max_workers=args.conexoes)
     except Exception as e:
         print(f"ERRO CRÍTICO NO SCRAPER: {e}")
         return
@@ -23,7 +45,7 @@ def main():
     # Passo 2: Transformação e Carga
     print("\n[2/2] Executando Processamento (ETL)...")
     try:
-        process_data()
+        process_data(chunksize=args.chunksize, workers=args.workers, patterns=tuple(args.contas), parquet=args.parquet)
     except Exception as e:
         print(f"ERRO CRÍTICO NO PROCESSADOR: {e}")
         return
@@ -33,4 +55,4 @@ def main():
     print("======================================================")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,87 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+MANIFEST_NAME = "manifest.json"
+
+# Calcula o SHA-256 de um arquivo local, em blocos.
+def sha256_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+# Manifesto dos downloads (data/raw/manifest.json), indexado pela URL de origem.
+# Cada entrada guarda: filename, size, etag, last_modified, sha256, fetched_at
+# e, enquanto um download está incompleto, os validadores do arquivo '.part' em 'partial'.
+# Depois do processamento, 'encodings' guarda o encoding detectado em cada CSV do ZIP.
+class DownloadManifest:
+    def __init__(self, target_dir):
+        self.path = os.path.join(target_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                # Manifesto corrompido: tudo será revalidado contra o servidor
+                self.entries = {}
+
+    def get(self, url):
+        with self._lock:
+            return dict(self.entries.get(url, {}))
+
+    def update(self, url, **fields):
+        with self._lock:
+            entry = self.entries.setdefault(url, {})
+            for key, value in fields.items():
+                if value is None:
+                    entry.pop(key, None)
+                else:
+                    entry[key] = value
+            self._save()
+
+    # URL da entrada correspondente ao arquivo local (mesmo nome, tamanho e mtime registrados)
+    def url_for_file(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            for url, entry in self.entries.items():
+                if (entry.get('filename') == os.path.basename(path) and entry.get('size') == stat.st_size
+                        and entry.get('mtime_ns') == stat.st_mtime_ns):
+                    return url
+        return None
+
+    # Encoding já detectado para um CSV do ZIP ({'encoding', 'fallback_rows'}), ou None
+    def member_encoding(self, path, member):
+        url = self.url_for_file(path)
+        if url is None:
+            return None
+        return (self.get(url).get('encodings') or {}).get(member)
+
+    # Registra o encoding de um CSV do ZIP. ZIPs fora do manifesto não são registrados.
+    def record_encoding(self, path, member, info):
+        url = self.url_for_file(path)
+        if url is None:
+            return False
+        encodings = dict(self.get(url).get('encodings') or {})
+        if encodings.get(member) != info:
+            encodings[member] = info
+            self.update(url, encodings=encodings)
+        return True
+
+    # Escrita atômica: um manifesto pela metade nunca substitui o anterior.
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -3,11 +3,19 @@ import zipfile
 import pandas as pd
 import glob
 import logging
-import shutil
-import requests
 import io
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+import re
+import time
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from . import ROOT_DIR
+from shared.columnar import ParquetDatasetWriter, PARQUET_DIR_NAME, remove_parquet_dataset
+from shared.cadop import CadopRegistry, registry_dir, canonical_reg, build_cadop_index, lookup_cadop
+from shared.encoding import DecodedStream
+from shared.compact import compact_frame
+from .manifest import DownloadManifest
 
 # Configuração de Log.
 logging.basicConfig(
@@ -18,107 +26,168 @@ logging.basicConfig(
 )
 
 RAW_DIR = "data/raw"
-EXTRACTED_DIR = "data/extracted"
-AUX_DIR = "data/auxiliary" 
+# Pasta do cadastro CADOP: a mesma do Teste 2 e da API (CADOP_DIR, ou data/auxiliary deste teste)
+AUX_DIR = registry_dir(ROOT_DIR)
 OUTPUT_FILE = "consolidado_despesas.csv"
 
-CADOP_DIR_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/"
+# Contas de interesse: linhas cuja Descricao contém algum destes textos (sem distinção de maiúsculas)
+ACCOUNT_PATTERNS = ('EVENTO', 'SINISTRO')
 
-# Busca dinâmica do arquivo CADOP.
-def find_cadop_url():
-    print(f"  -> Acessando diretório: {CADOP_DIR_URL}...")
-    try:
-        response = requests.get(CADOP_DIR_URL, verify=False, timeout=30)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        links = [a.get('href') for a in soup.find_all('a') if a.get('href')]
-        candidates = [l for l in links if ('csv' in l.lower() or 'zip' in l.lower()) and ('cadop' in l.lower() or 'relatorio' in l.lower())]
-        
-        if candidates:
-            best_match = candidates[0]
-            print(f"     [SUCESSO] Arquivo encontrado: {best_match}")
-            return urljoin(CADOP_DIR_URL, best_match), best_match
-            
-    except Exception as e:
-        print(f"     [AVISO] Erro ao listar diretório: {e}")
-    
-    return urljoin(CADOP_DIR_URL, "Relatorio_cadop.csv"), "Relatorio_cadop.csv"
+# Colunas de origem usadas pelo ETL (demais colunas nem chegam a ser parseadas)
+COLUMN_MAP = {
+    'NR_CNPJ': 'CNPJ', 'CNPJ': 'CNPJ',
+    'NM_RAZAO_SOCIAL': 'RazaoSocial', 'RAZAO_SOCIAL': 'RazaoSocial',
+    'REG_ANS': 'RegAns', 
+    'DATA': 'Data', 'DT_FIM_EXERCICIO': 'Data',
+    'VL_SALDO_FINAL': 'Valor Despesas', 'VALOR': 'Valor Despesas',
+    'DESCRICAO': 'Descricao', 'CD_CONTA_CONTABIL': 'Conta'
+}
 
-def download_and_extract_cadop():
-    os.makedirs(AUX_DIR, exist_ok=True)
-    cadop_url, filename = find_cadop_url()
-    local_csv_path = os.path.join(AUX_DIR, "Relatorio_Cadop.csv")
-    
-    if os.path.exists(local_csv_path) and os.path.getsize(local_csv_path) > 1024:
-        return local_csv_path
+# Cadastro de operadoras (CADOP) via registro compartilhado (shared/cadop.py): download
+# condicional, encoding detectado uma vez e snapshot indexado reaproveitado entre execuções.
+# Retorna o índice Registro ANS canônico -> CNPJ, RazaoSocial (ou None sem cadastro).
+def load_cadop_mapping():
+    registry = CadopRegistry(AUX_DIR).refresh()
+    if registry.empty: return None
+    return registry.por_registro[['CNPJ', 'RazaoSocial']]
 
-    print(f"  -> Baixando {filename}...")
-    try:
-        response = requests.get(cadop_url, verify=False, timeout=60)
-        response.raise_for_status()
-        
-        if filename.lower().endswith('.zip'):
-            with zipfile.ZipFile(io.BytesIO(response.content)) as z:
-                csv_files = [f for f in z.namelist() if f.lower().endswith('.csv')]
-                if csv_files:
-                    with z.open(csv_files[0]) as zf, open(local_csv_path, 'wb') as f:
-                        shutil.copyfileobj(zf, f)
-                    return local_csv_path
-        else:
-            with open(local_csv_path, 'wb') as f:
-                f.write(response.content)
-            return local_csv_path
-    except Exception as e:
-        print(f"     [AVISO] Falha no download do CADOP: {e}")
+# Lista os CSVs contidos nos ZIPs baixados, sem extraí-los: [(caminho_do_zip, membro), ...]
+def list_zip_members():
+    members = []
+    for zip_path in sorted(glob.glob(os.path.join(RAW_DIR, "*.zip"))):
+        try:
+            with zipfile.ZipFile(zip_path, 'r') as z:
+                for info in z.infolist():
+                    if not info.is_dir() and info.filename.lower().endswith('.csv'):
+                        members.append((zip_path, info.filename))
+        except zipfile.BadZipFile:
+            print(f"  -> [AVISO] ZIP inválido ignorado: {zip_path}")
+    return members
+
+# Stream de leitura de um membro do ZIP que contabiliza os bytes descompactados
+# e o tempo gasto na descompressão.
+class MemberReader(io.RawIOBase):
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+        self.seconds = 0.0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        start = time.perf_counter()
+        data = self.raw.read(len(buffer))
+        self.seconds += time.perf_counter() - start
+        n = len(data)
+        buffer[:n] = data
+        self.bytes_read += n
+        return n
+
+# Regex (texto) das contas de interesse, usada sobre a coluna Descricao.
+def account_regex(patterns):
+    return '|'.join(re.escape(p) for p in patterns)
+
+# Padrões (bytes, em maiúsculas) do pré-filtro sobre a linha crua.
+# Só é possível para padrões ASCII (iguais em UTF-8 e Latin-1); caso contrário retorna None.
+def raw_line_patterns(patterns):
+    if not patterns or not all(p.isascii() for p in patterns):
         return None
+    return tuple(p.upper().encode('ascii') for p in patterns)
 
-def load_cadop_mapping():
-    cadop_path = download_and_extract_cadop()
-    if not cadop_path: return None
+# Pré-filtro: repassa ao parser apenas o cabeçalho e as linhas cruas que contêm algum dos
+# 'patterns', antes de qualquer parsing ou conversão de datas. Cada bloco é passado para
+# maiúsculas e varrido com bytes.find (busca em C); o laço Python só passa pelas linhas mantidas.
+# Assume registros de uma linha (sem quebras de linha dentro de aspas).
+class LineFilter(io.RawIOBase):
+    def __init__(self, stream, patterns, block_size=1024 * 1024):
+        self.stream = stream
+        self.patterns = patterns
+        self.block_size = block_size
+        self.lines_read = 0
+        self.lines_kept = 0
+        self._pending = stream.readline()  # cabeçalho, sempre repassado
+        self._rest = b''
+        self._eof = False
 
-    # Tenta ler com diferentes encodings
-    encodings_to_try = ['utf-8', 'latin1', 'cp1252']
-    
-    for encoding in encodings_to_try:
-        try:
-            df_cadop = pd.read_csv(cadop_path, sep=';', encoding=encoding, dtype=str, on_bad_lines='skip', quotechar='"')
-            df_cadop.columns = df_cadop.columns.str.strip().str.upper()
-            
-            reg_col = next((c for c in df_cadop.columns if 'REGISTRO' in c and 'DATA' not in c), None)
-            
-            if reg_col:
-                cnpj_col = next((c for c in df_cadop.columns if 'CNPJ' in c), None)
-                raz_col = next((c for c in df_cadop.columns if 'RAZAO' in c), None)
-
-                if reg_col and cnpj_col and raz_col:
-                    df_cadop[reg_col] = df_cadop[reg_col].astype(str).str.replace('"', '').str.strip()
-                    return df_cadop.set_index(reg_col)[[cnpj_col, raz_col]].to_dict('index')
-        except Exception:
-            continue
-    return None
-
-def extract_files():
-    print(">>> Iniciando extração...")
-    if os.path.exists(EXTRACTED_DIR): shutil.rmtree(EXTRACTED_DIR)
-    os.makedirs(EXTRACTED_DIR, exist_ok=True)
-    zips = glob.glob(os.path.join(RAW_DIR, "*.zip"))
-    for zip_path in zips:
-        try:
-            with zipfile.ZipFile(zip_path, 'r') as z: z.extractall(EXTRACTED_DIR)
-        except: pass
+    def readable(self):
+        return True
+
+    def _fill(self):
+        while not self._pending and not self._eof:
+            block = self.stream.read(self.block_size)
+            if not block:
+                self._eof = True
+                block, self._rest = self._rest, b''
+            else:
+                block = self._rest + block
+                cut = block.rfind(b'\n') + 1
+                block, self._rest = block[:cut], block[cut:]
+            self.lines_read += block.count(b'\n') + (1 if block and not block.endswith(b'\n') else 0)
+            self._pending = self._match_lines(block)
+
+    # Junta, na ordem original, as linhas do bloco que contêm algum padrão.
+    def _match_lines(self, block):
+        upper = block.upper()
+        lines = {}
+        for pattern in self.patterns:
+            pos = upper.find(pattern)
+            while pos >= 0:
+                line_start = upper.rfind(b'\n', 0, pos) + 1
+                line_end = upper.find(b'\n', pos)
+                line_end = len(upper) if line_end < 0 else line_end + 1
+                lines[line_start] = line_end
+                pos = upper.find(pattern, line_end)
+        kept = [block[start:lines[start]] for start in sorted(lines)]
+        self.lines_kept += len(kept)
+        if kept and not kept[-1].endswith(b'\n'):
+            kept[-1] += b'\n'
+        return b''.join(kept)
+
+    def readinto(self, buffer):
+        self._fill()
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+# Lê um CSV direto de dentro do ZIP (ZipFile.open -> read_csv), sem pasta de extração.
+# Com 'chunksize', gera blocos de até 'chunksize' linhas; sem ele, um único bloco com o arquivo todo.
+# Com 'patterns', aplica o pré-filtro de linhas cruas e lê apenas as colunas de COLUMN_MAP.
+# O encoding ('encoding', ou detectado no prefixo quando None) é aplicado em uma única passada
+# por DecodedStream: linhas que falham nele são decodificadas com fallback e contadas, sem reler o arquivo.
+# Primeiro é gerada a tupla (MemberReader, LineFilter ou None, DecodedStream) com as métricas da leitura.
+def iter_zip_member(zip_path, member, encoding=None, chunksize=None, patterns=None):
+    with zipfile.ZipFile(zip_path, 'r') as z, z.open(member) as raw:
+        reader = MemberReader(raw)
+        stream = io.BufferedReader(reader, buffer_size=1024 * 1024)
+        line_filter = None
+        raw_patterns = raw_line_patterns(patterns)
+        if raw_patterns is not None:
+            line_filter = LineFilter(stream, raw_patterns)
+            stream = io.BufferedReader(line_filter, buffer_size=1024 * 1024)
+        decoder = DecodedStream(stream, encoding)
+        stream = io.BufferedReader(decoder, buffer_size=1024 * 1024)
+        yield reader, line_filter, decoder
+
+        options = dict(sep=';', encoding='utf-8', on_bad_lines='skip', dtype=str)
+        if patterns:
+            options['usecols'] = lambda c: c.strip().upper() in COLUMN_MAP
+        if chunksize:
+            with pd.read_csv(stream, chunksize=chunksize, **options) as chunks:
+                yield from chunks
+        else:
+            yield pd.read_csv(stream, **options)
+
+# Lê o membro inteiro de uma vez. Retorna o DataFrame e o MemberReader.
+def read_zip_member(zip_path, member, encoding=None, patterns=None):
+    chunks = iter_zip_member(zip_path, member, encoding, patterns=patterns)
+    reader, _, _ = next(chunks)
+    return next(chunks), reader
 
 def normalize_columns(df):
     df.columns = df.columns.str.strip().str.upper()
-    column_map = {
-        'NR_CNPJ': 'CNPJ', 'CNPJ': 'CNPJ',
-        'NM_RAZAO_SOCIAL': 'RazaoSocial', 'RAZAO_SOCIAL': 'RazaoSocial',
-        'REG_ANS': 'RegAns', 
-        'DATA': 'Data', 'DT_FIM_EXERCICIO': 'Data',
-        'VL_SALDO_FINAL': 'Valor Despesas', 'VALOR': 'Valor Despesas',
-        'DESCRICAO': 'Descricao', 'CD_CONTA_CONTABIL': 'Conta'
-    }
-    df = df.rename(columns=column_map)
+    df = df.rename(columns=COLUMN_MAP)
     
     if 'RegAns' in df.columns:
         df['RegAns'] = df['RegAns'].astype(str).str.replace(r'\.0$', '', regex=True).str.strip().str.replace('"', '')
@@ -131,9 +200,33 @@ def normalize_columns(df):
         df['Ano'] = df['Data'].dt.year
     return df
 
-def clean_and_validate(df, filename, mapping_cadop):
+def new_inconsistency_stats():
+    return {'negativos': 0, 'zerados': 0, 'datas_invalidas': 0, 'exemplos_datas': []}
+
+def count_inconsistencies(df_filtered, stats):
+    # 1. Valores Negativos
+    stats['negativos'] += int((df_filtered['Valor Despesas'] < 0).sum())
+    # 2. Valores Zerados 
+    stats['zerados'] += int((df_filtered['Valor Despesas'] == 0).sum())
+    # 3. Inconsistência de Data
+    if 'Trimestre' in df_filtered.columns:
+        datas_inv = df_filtered[df_filtered['Trimestre'].isna()]
+        stats['datas_invalidas'] += len(datas_inv)
+        for exemplo in datas_inv['Data_Original'].unique():
+            if len(stats['exemplos_datas']) >= 3: break
+            if exemplo not in stats['exemplos_datas']: stats['exemplos_datas'].append(exemplo)
+
+def log_inconsistencies(filename, stats):
+    if stats['negativos']:
+        logging.warning(f"{filename}: {stats['negativos']} registros com VALOR NEGATIVO (mantidos).")
+    if stats['zerados']:
+        logging.warning(f"{filename}: {stats['zerados']} registros com VALOR ZERADO (mantidos).")
+    if stats['datas_invalidas']:
+        logging.warning(f"{filename}: {stats['datas_invalidas']} registros com DATA INVALIDA/INCONSISTENTE. Exemplos: {stats['exemplos_datas']}")
+
+def clean_and_validate(df, filename, mapping_cadop, stats=None, patterns=ACCOUNT_PATTERNS):
     if 'Descricao' in df.columns:
-        mask = df['Descricao'].astype(str).str.contains('EVENTO|SINISTRO', case=False, na=False)
+        mask = df['Descricao'].astype(str).str.contains(account_regex(patterns), case=False, na=False)
         df_filtered = df[mask].copy()
         if df_filtered.empty: return pd.DataFrame()
     else: return pd.DataFrame()
@@ -141,18 +234,12 @@ def clean_and_validate(df, filename, mapping_cadop):
     if 'CNPJ' not in df_filtered.columns: df_filtered['CNPJ'] = None
     if 'RazaoSocial' not in df_filtered.columns: df_filtered['RazaoSocial'] = None
 
-    if mapping_cadop and 'RegAns' in df_filtered.columns:
-        def get_info(reg):
-            val = mapping_cadop.get(reg)
-            if not val: val = mapping_cadop.get(reg.lstrip('0'))
-            if not val: val = mapping_cadop.get(reg.zfill(6))
-            return val if val else {}
-
-        cadop_data = df_filtered['RegAns'].apply(get_info)
-        df_filtered['CNPJ'] = df_filtered['CNPJ'].fillna(cadop_data.apply(lambda x: x.get('CNPJ')))
-        df_filtered['RazaoSocial'] = df_filtered['RazaoSocial'].fillna(
-            cadop_data.apply(lambda x: x.get('RAZAO_SOCIAL') or x.get('Razao_Social'))
-        )
+    if mapping_cadop is not None and 'RegAns' in df_filtered.columns:
+        # Join vetorizado contra o índice do CADOP (sem .apply por linha)
+        cadop_data = lookup_cadop(mapping_cadop, df_filtered['RegAns'])
+        # Equivale a fillna: o CADOP só preenche o que o arquivo não trouxe
+        df_filtered['CNPJ'] = cadop_data['CNPJ'].where(df_filtered['CNPJ'].isna(), df_filtered['CNPJ'])
+        df_filtered['RazaoSocial'] = cadop_data['RazaoSocial'].where(df_filtered['RazaoSocial'].isna(), df_filtered['RazaoSocial'])
 
     if 'RegAns' in df_filtered.columns:
         df_filtered['CNPJ'] = df_filtered['CNPJ'].fillna("Reg: " + df_filtered['RegAns'].astype(str))
@@ -170,73 +257,210 @@ def clean_and_validate(df, filename, mapping_cadop):
         df_filtered['Valor Despesas'] = df_filtered['Valor Despesas'].fillna(0.0)
 
     # INCONSISTÊNCIAS: VALORES E DATAS (Por arquivo)
-    # 1. Valores Negativos
-    negativos = df_filtered[df_filtered['Valor Despesas'] < 0]
-    if not negativos.empty: 
-        logging.warning(f"{filename}: {len(negativos)} registros com VALOR NEGATIVO (mantidos).")
-    
-    # 2. Valores Zerados 
-    zerados = df_filtered[df_filtered['Valor Despesas'] == 0]
-    if not zerados.empty:
-        logging.warning(f"{filename}: {len(zerados)} registros com VALOR ZERADO (mantidos).")
+    # Em modo streaming, os contadores são acumulados em 'stats' e logados ao fim do arquivo.
+    own_stats = stats is None
+    if own_stats: stats = new_inconsistency_stats()
+    count_inconsistencies(df_filtered, stats)
+    if own_stats: log_inconsistencies(filename, stats)
 
-    # 3. Inconsistência de Data
-    if 'Trimestre' in df_filtered.columns:
-        datas_inv = df_filtered[df_filtered['Trimestre'].isna()]
-        if not datas_inv.empty:
-            exemplos = datas_inv['Data_Original'].unique()[:3]
-            logging.warning(f"{filename}: {len(datas_inv)} registros com DATA INVALIDA/INCONSISTENTE. Exemplos: {exemplos}")
+    # Trimestre/Ano como inteiros pequenos (nulos para datas inválidas), iguais em todos os blocos
+    for c in ['Trimestre', 'Ano']:
+        if c in df_filtered.columns: df_filtered[c] = df_filtered[c].astype('Int16')
 
     cols = ['CNPJ', 'RazaoSocial', 'Trimestre', 'Ano', 'Valor Despesas']
     for c in cols: 
         if c not in df_filtered.columns: df_filtered[c] = None
     return df_filtered[cols]
 
-def process_data():
-    extract_files()
-    mapping = load_cadop_mapping()
-    all_data = []
-    files = glob.glob(os.path.join(EXTRACTED_DIR, "**/*.csv"), recursive=True)
-    
-    print(f"\n>>> Processando {len(files)} arquivos...")
-    for file_path in files:
-        filename = os.path.basename(file_path)
-        print(f"  -> Lendo: {filename}...", end=" ")
+# Atualiza o conjunto (ordenado) de Razões Sociais vistas para cada CNPJ.
+def update_razoes_por_cnpj(razoes_por_cnpj, df):
+    pares = df[['CNPJ', 'RazaoSocial']].dropna().drop_duplicates()
+    for cnpj, razao in pares.itertuples(index=False):
+        razoes_por_cnpj.setdefault(cnpj, {})[razao] = None
+
+# Grava os blocos filtrados no CSV consolidado (e, opcionalmente, no dataset Parquet) à medida que chegam.
+# checkpoint/rollback descartam o que um arquivo já gravou, caso ele falhe no meio da leitura.
+class ConsolidatedWriter:
+    def __init__(self, path, parquet_dir=None):
+        self.file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self.parquet = ParquetDatasetWriter(parquet_dir) if parquet_dir else None
+        self.rows = 0
+
+    def write(self, df):
+        df.to_csv(self.file, index=False, sep=';', header=(self.rows == 0))
+        if self.parquet: self.parquet.write(df)
+        self.rows += len(df)
+
+    def checkpoint(self):
+        return self.file.tell(), self.rows, self.parquet.checkpoint() if self.parquet else None
+
+    def rollback(self, checkpoint):
+        position, self.rows, parquet_checkpoint = checkpoint
+        self.file.seek(position)
+        self.file.truncate()
+        if self.parquet: self.parquet.rollback(parquet_checkpoint)
+
+    def close(self):
+        self.file.close()
+
+    # Execução concluída: o dataset Parquet (gravado depois do CSV) passa a valer
+    def commit(self):
+        if self.parquet: self.parquet.commit()
+
+# Processa um membro do ZIP bloco a bloco, entregando cada bloco filtrado a 'sink'.
+# Retorna (linhas lidas, linhas após o pré-filtro, MemberReader, inconsistências, Razões Sociais por CNPJ,
+# encoding usado e linhas decodificadas com fallback).
+def process_member(zip_path, member, mapping, chunksize, sink, encoding=None, patterns=ACCOUNT_PATTERNS):
+    filename = os.path.basename(member)
+    stats = new_inconsistency_stats()
+    razoes = {}
+    linhas = 0
+    chunks = iter_zip_member(zip_path, member, encoding, chunksize, patterns)
+    reader, line_filter, decoder = next(chunks)
+    for df in chunks:
+        linhas += len(df)
+        df = normalize_columns(df)
+        df_cleaned = clean_and_validate(df, filename, mapping, stats, patterns)
+        if df_cleaned.empty: continue
+        update_razoes_por_cnpj(razoes, df_cleaned)
+        sink(df_cleaned)
+    lidas = line_filter.lines_read if line_filter is not None else linhas
+    return lidas, linhas, reader, stats, razoes, decoder.info()
+
+# Mapeamento CADOP de cada processo do pool: enviado uma única vez, no initializer.
+_worker_mapping = None
+
+def _init_worker(mapping):
+    global _worker_mapping
+    _worker_mapping = mapping
+
+def _summary(linhas, linhas_parseadas, reader, stats, razoes, encoding, spill=None):
+    return {'linhas': linhas, 'linhas_parseadas': linhas_parseadas,
+            'bytes_read': reader.bytes_read, 'seconds': reader.seconds,
+            'stats': stats, 'razoes': razoes, 'encoding': encoding, 'spill': spill}
+
+# Tarefa do pool: processa um arquivo e devolve as métricas + o caminho de um arquivo temporário
+# com os blocos filtrados (um pickle por bloco, no esquema compacto). Nem o worker nem o processo
+# principal seguram o arquivo inteiro em memória: o pico fica em um bloco por processo.
+def _process_member_in_worker(task):
+    zip_path, member, chunksize, patterns, encoding, spill_dir = task
+    fd, spill = tempfile.mkstemp(suffix='.pkl', dir=spill_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            sink = lambda df: pickle.dump(compact_frame(df), f, protocol=pickle.HIGHEST_PROTOCOL)
+            resultado = process_member(zip_path, member, _worker_mapping, chunksize, sink, encoding, patterns)
+    except Exception as e:
+        os.remove(spill)
+        return {'erro': str(e)}
+    return _summary(*resultado, spill)
+
+# Lê de volta os blocos gravados por um worker, um de cada vez, e apaga o arquivo temporário
+def _iter_spill(spill):
+    try:
+        with open(spill, 'rb') as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+    finally:
+        os.remove(spill)
+
+# Gera (zip, membro, resumo) na ordem de 'members', gravando os dados filtrados em 'writer'.
+# Com workers > 1, os arquivos são processados em paralelo, mas gravados e logados
+# na mesma ordem do modo sequencial: a saída é idêntica byte a byte.
+# 'encodings' traz o encoding já conhecido de cada membro (None: detectado no prefixo).
+def _iter_processed_members(members, mapping, chunksize, writer, workers, patterns, encodings):
+    if workers > 1:
+        with tempfile.TemporaryDirectory(prefix='consolidado_') as spill_dir, \
+                ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(mapping,)) as pool:
+            tasks = [(zip_path, member, chunksize, patterns, encodings.get((zip_path, member)), spill_dir)
+                     for zip_path, member in members]
+            for (zip_path, member), resultado in zip(members, pool.map(_process_member_in_worker, tasks)):
+                if resultado.get('spill'):
+                    for df in _iter_spill(resultado.pop('spill')): writer.write(df)
+                yield zip_path, member, resultado
+        return
+
+    for zip_path, member in members:
+        checkpoint = writer.checkpoint()
         try:
-            try: df = pd.read_csv(file_path, sep=';', encoding='utf-8', on_bad_lines='skip', dtype=str)
-            except: df = pd.read_csv(file_path, sep=';', encoding='latin1', on_bad_lines='skip', dtype=str)
-            
-            print(f"[OK] {len(df)} linhas.")
-            df = normalize_columns(df)
-            df_cleaned = clean_and_validate(df, filename, mapping)
-            if not df_cleaned.empty: all_data.append(df_cleaned)
-        except Exception as e: print(f"[ERRO] {e}")
-
-    if all_data:
+            resultado = process_member(
+                zip_path, member, mapping, chunksize, writer.write, encodings.get((zip_path, member)), patterns
+            )
+        except Exception as e:
+            writer.rollback(checkpoint)
+            yield zip_path, member, {'erro': str(e)}
+            continue
+        yield zip_path, member, _summary(*resultado)
+
+# Encoding de cada membro já registrado no manifesto de downloads (só vale para o mesmo ZIP).
+def known_encodings(manifest, members):
+    encodings = {}
+    for zip_path, member in members:
+        info = manifest.member_encoding(zip_path, member)
+        if info and info.get('encoding'):
+            encodings[(zip_path, member)] = info['encoding']
+    return encodings
+
+def process_data(chunksize=None, workers=1, patterns=ACCOUNT_PATTERNS, parquet=False):
+    mapping = load_cadop_mapping()
+    members = list_zip_members()
+    razoes_por_cnpj = {}
+    manifest = DownloadManifest(RAW_DIR)
+    encodings = known_encodings(manifest, members)
+
+    print(f"  -> Contas filtradas: {', '.join(patterns)}")
+    modo = f"streaming em blocos de {chunksize} linhas" if chunksize else "arquivo inteiro"
+    if workers > 1: modo += f", {workers} processos"
+    print(f"\n>>> Processando {len(members)} arquivos ({modo})...")
+
+    # Os blocos filtrados são anexados ao CSV final à medida que são processados:
+    # a memória fica limitada a um bloco, e não ao volume total de dados.
+    writer = ConsolidatedWriter(OUTPUT_FILE, PARQUET_DIR_NAME if parquet else None)
+    # Sem --parquet, o dataset de uma execução anterior ficaria desatualizado em relação ao CSV
+    if not parquet and remove_parquet_dataset(PARQUET_DIR_NAME):
+        print(f"  -> Dataset Parquet anterior removido: {PARQUET_DIR_NAME}/")
+    try:
+        for zip_path, member, resultado in _iter_processed_members(members, mapping, chunksize, writer, workers, patterns, encodings):
+            filename = os.path.basename(member)
+            if 'erro' in resultado:
+                print(f"  -> Lendo: {filename}... [ERRO] {resultado['erro']}")
+                continue
+
+            mb = resultado['bytes_read'] / (1024 * 1024)
+            parseadas = ""
+            if resultado['linhas_parseadas'] != resultado['linhas']:
+                parseadas = f" ({resultado['linhas_parseadas']} após pré-filtro)"
+            encoding = resultado['encoding']
+            print(f"  -> Lendo: {filename}... [OK] {resultado['linhas']} linhas{parseadas} | {mb:.1f} MB descompactados em {resultado['seconds']:.2f}s | {encoding['encoding']}.")
+            if encoding['fallback_rows']:
+                print(f"     [AVISO] {encoding['fallback_rows']} linhas fora de {encoding['encoding']} (decodificadas com fallback).")
+                logging.warning(f"{filename}: {encoding['fallback_rows']} linhas com bytes inválidos em {encoding['encoding']} (decodificadas com fallback).")
+            manifest.record_encoding(zip_path, member, encoding)
+            log_inconsistencies(filename, resultado['stats'])
+            for cnpj, nomes in resultado['razoes'].items():
+                razoes_por_cnpj.setdefault(cnpj, {}).update(nomes)
+    finally:
+        writer.close()
+    writer.commit()
+    if writer.rows:
         print("\n>>> Consolidando dados...")
-        final_df = pd.concat(all_data, ignore_index=True)
         
         # INCONSISTÊNCIAS 2: CNPJS DUPLICADOS
+        # Mantido durante o streaming como um pequeno conjunto de nomes por CNPJ
         print("  -> Verificando duplicidade de Razão Social por CNPJ...")
+        for cnpj in sorted(razoes_por_cnpj):
+            nomes = list(razoes_por_cnpj[cnpj])
+            if len(nomes) > 1:
+                logging.warning(f"GLOBAL: CNPJ {cnpj} possui múltiplas Razões Sociais diferentes: {nomes}")
         
-        # Agrupa por CNPJ e conta quantas Razões Sociais ÚNICAS existem para ele
-        duplicidades = final_df.groupby('CNPJ')['RazaoSocial'].nunique()
-        cnpjs_problematicos = duplicidades[duplicidades > 1]
-        
-        if not cnpjs_problematicos.empty:
-            for cnpj in cnpjs_problematicos.index:
-                nomes = final_df[final_df['CNPJ'] == cnpj]['RazaoSocial'].unique()
-                logging.warning(f"GLOBAL: CNPJ {cnpj} possui múltiplas Razões Sociais diferentes: {list(nomes)}")
-        
-        # Filtra colunas finais
-        cols_final = ['CNPJ', 'RazaoSocial', 'Trimestre', 'Ano', 'Valor Despesas']
-        final_df = final_df[cols_final]
-        
-        final_df.to_csv(OUTPUT_FILE, index=False, sep=';', encoding='utf-8-sig')
-        
-        print(f"Arquivo gerado: {OUTPUT_FILE} ({len(final_df)} linhas)")
+        print(f"Arquivo gerado: {OUTPUT_FILE} ({writer.rows} linhas)")
+        if parquet: print(f"Dataset Parquet gerado: {PARQUET_DIR_NAME}/ (particionado por Ano/Trimestre)")
         with zipfile.ZipFile('consolidado_despesas.zip', 'w') as zf: zf.write(OUTPUT_FILE)
-    else: print("Nenhum dado gerado.")
+    else:
+        os.remove(OUTPUT_FILE)
+        print("Nenhum dado gerado.")
 
 if __name__ == "__main__":
-    process_data()
\ No newline at end of file
+    process_data()
@@ -2,21 +2,51 @@ import os
 import requests
 from bs4 import BeautifulSoup
 import re
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
 import urllib3
+from requests.adapters import HTTPAdapter
+
+from .manifest import DownloadManifest, sha256_file, utc_now
 
 # Suprime os avisos de segurança por não verificar o SSL (necessário para sites gov.br)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 URL_BASE = "https://dadosabertos.ans.gov.br/FTP/PDA/demonstracoes_contabeis/"
 
+# Limite padrão de conexões simultâneas (listagens de anos e downloads)
+MAX_WORKERS = 4
+CHUNK_SIZE = 1024 * 1024
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+_session = None
+_session_pool_size = 0
+_session_lock = threading.Lock()
+
+# Retorna uma sessão HTTP compartilhada, com pool de conexões dimensionado para os workers.
+def get_session(pool_size=MAX_WORKERS):
+    global _session, _session_pool_size
+    with _session_lock:
+        if _session is None or pool_size > _session_pool_size:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(HEADERS)
+            session.verify = False
+            _session = session
+            _session_pool_size = pool_size
+        return _session
+
 # Retorna o objeto BeautifulSoup de uma URL.
 def get_soup(url):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
     try:
-        response = requests.get(url, headers=headers, timeout=30, verify=False)
+        response = get_session().get(url, timeout=30)
         response.raise_for_status()
         return BeautifulSoup(response.text, 'html.parser')
     except Exception as e:
@@ -37,57 +67,225 @@ def get_links(url):
             
     return links
 
-# Navega nas pastas de anos e encontra os links diretos para os 3 últimos .zip disponíveis.
-def find_last_3_quarters_files():
+# Filtra os arquivos .zip que parecem ser trimestres, do mais recente para o mais antigo.
+def filter_quarter_zips(items):
+    # Procura por "1T2024", "1t24", "trimestre", etc.
+    quarter_zips = [
+        item for item in items
+        if item.lower().endswith('.zip') and ('t' in item.lower() or 'trimestre' in item.lower())
+    ]
+    # Ordena decrescente (3T > 2T > 1T)
+    return sorted(quarter_zips, reverse=True)
+
+# Navega nas pastas de anos e encontra os links diretos para os trimestres desejados.
+# - n_quarters: quantidade de trimestres mais recentes (None = sem limite)
+# - since_year: ignora anos anteriores a este (None = todos)
+# As listagens dos anos são buscadas em paralelo, em lotes do tamanho do pool.
+def find_quarter_files(n_quarters=3, since_year=None, base_url=URL_BASE, max_workers=MAX_WORKERS):
     print("Buscando anos disponíveis...")
     
     # 1. Pega os anos disponíveis na raiz
-    root_links = get_links(URL_BASE)
+    root_links = get_links(base_url)
     # Filtra apenas strings que são anos (4 dígitos), ex: '2024/', '2023/'
     years = sorted([y for y in root_links if re.match(r'^\d{4}/?$', y)], reverse=True)
+    if since_year:
+        years = [y for y in years if int(y[:4]) >= since_year]
     
     print(f"Anos encontrados: {years[:3]}") # Mostra os 3 primeiros anos
     
     zip_files_found = []
-    
-    # 2. Entra em cada ano (do mais recente para o mais antigo)
-    for year in years:
-        if len(zip_files_found) >= 3:
-            break
-        year_url = urljoin(URL_BASE, year)
-        print(f"Verificando dentro do ano: {year}")
-        
-        items = get_links(year_url)
-            
-        # 3. Filtra arquivos .zip que parecem ser trimestres
-        quarter_zips = []
-        for item in items:
-            # Procura por "1T2024", "1t24", "trimestre", etc.
-            if item.lower().endswith('.zip') and ('t' in item.lower() or 'trimestre' in item.lower()):
-                quarter_zips.append(item)
-        
-        # Ordena decrescente (3T > 2T > 1T)
-        quarter_zips = sorted(quarter_zips, reverse=True)
-        
-        for q_zip in quarter_zips:
-            if len(zip_files_found) >= 3:
+
+    def done():
+        return n_quarters is not None and len(zip_files_found) >= n_quarters
+
+    # 2. Entra nos anos (do mais recente para o mais antigo), um lote por vez
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for start in range(0, len(years), max_workers):
+            if done():
                 break
-            
-            full_url = urljoin(year_url, q_zip)
-            print(f"  -> Encontrado: {q_zip}")
-            zip_files_found.append({
-                "filename": q_zip,
-                "url": full_url
-            })
+            batch = years[start:start + max_workers]
+            year_urls = [urljoin(base_url, year) for year in batch]
+            # map preserva a ordem dos anos, então a seleção continua determinística
+            listings = pool.map(get_links, year_urls)
+
+            for year, year_url, items in zip(batch, year_urls, listings):
+                print(f"Verificando dentro do ano: {year}")
+                # 3. Filtra arquivos .zip que parecem ser trimestres
+                for q_zip in filter_quarter_zips(items):
+                    if done():
+                        break
+                    full_url = urljoin(year_url, q_zip)
+                    print(f"  -> Encontrado: {q_zip}")
+                    zip_files_found.append({
+                        "filename": q_zip,
+                        "url": full_url
+                    })
 
     return zip_files_found
 
-# Baixa os arquivos .zip identificados.
-def download_files(target_dir="data/raw"):
+# Mantida por compatibilidade: os 3 últimos trimestres disponíveis.
+def find_last_3_quarters_files():
+    return find_quarter_files(n_quarters=3)
+
+# Retorna os validadores HTTP (tamanho, ETag, Last-Modified) do arquivo remoto via HEAD.
+def get_remote_info(url):
+    try:
+        r = get_session().head(url, timeout=30, allow_redirects=True)
+        r.raise_for_status()
+    except Exception:
+        return {}
+    size = r.headers.get('Content-Length')
+    return {
+        "size": int(size) if size and size.isdigit() else None,
+        "etag": r.headers.get('ETag'),
+        "last_modified": r.headers.get('Last-Modified'),
+    }
+
+# Validador usado no If-Range: ETag forte ou, na falta dele, Last-Modified.
+def _range_validator(info):
+    etag = info.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return info.get('last_modified')
+
+# Compara a versão remota com a registrada no manifesto.
+def _same_version(entry, remote):
+    if remote.get('etag') and entry.get('etag'):
+        return remote['etag'] == entry['etag']
+    if remote.get('last_modified') and entry.get('last_modified'):
+        return remote['last_modified'] == entry['last_modified'] and remote.get('size') in (None, entry.get('size'))
+    return False
+
+# Confere o arquivo local contra o manifesto (tamanho + mtime; SHA-256 se o mtime mudou).
+def _local_is_intact(local_path, entry):
+    if not entry.get('sha256') or not os.path.exists(local_path):
+        return False
+    stat = os.stat(local_path)
+    if stat.st_size != entry.get('size'):
+        return False
+    if stat.st_mtime_ns == entry.get('mtime_ns'):
+        return True
+    return sha256_file(local_path) == entry['sha256']
+
+# Um ZIP só é aceito se abrir e todos os CRCs baterem.
+def _is_valid_zip(path):
+    try:
+        with zipfile.ZipFile(path) as z:
+            return z.testzip() is None
+    except (zipfile.BadZipFile, OSError):
+        return False
+
+# Registra no manifesto um arquivo local já verificado.
+def _record(manifest, url, file_name, local_path, validators, sha256=None):
+    stat = os.stat(local_path)
+    manifest.update(
+        url,
+        filename=file_name,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        etag=validators.get('etag'),
+        last_modified=validators.get('last_modified'),
+        sha256=sha256 or sha256_file(local_path),
+        fetched_at=utc_now(),
+        partial=None,
+        # Arquivo novo: o encoding dos CSVs será detectado de novo no processamento
+        encodings=None,
+    )
+
+# Baixa (ou retoma) o arquivo para 'part_path'. Retorna (bytes retomados, validadores da resposta).
+def _fetch(url, part_path, entry, remote, manifest):
+    validator = _range_validator(remote)
+    partial = entry.get('partial') or {}
+    resume_from = 0
+    if os.path.exists(part_path) and validator and partial.get('validator') == validator:
+        resume_from = os.path.getsize(part_path)
+
+    # Guarda o validador antes de baixar: se cair no meio, a próxima execução sabe se pode retomar
+    manifest.update(url, partial={"validator": validator} if validator else None)
+
+    headers = {}
+    if resume_from:
+        headers['Range'] = f"bytes={resume_from}-"
+        headers['If-Range'] = validator
+
+    with get_session().get(url, stream=True, timeout=60, headers=headers) as r:
+        # 416: o .part já tem todos os bytes (a execução anterior caiu depois do último byte,
+        # antes da validação). Se o tamanho bate, segue para a validação; senão, recomeça do zero.
+        if r.status_code == 416 and resume_from:
+            if remote.get('size') in (None, resume_from):
+                return resume_from, {"etag": remote.get('etag'), "last_modified": remote.get('last_modified')}
+            os.remove(part_path)
+            return _fetch(url, part_path, {}, remote, manifest)
+        r.raise_for_status()
+        if r.status_code != 206:
+            # Servidor ignorou o Range (ou o arquivo mudou): recomeça do zero
+            resume_from = 0
+        with open(part_path, 'ab' if resume_from else 'wb') as f:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+        validators = {
+            "etag": r.headers.get('ETag') or remote.get('etag'),
+            "last_modified": r.headers.get('Last-Modified') or remote.get('last_modified'),
+        }
+    return resume_from, validators
+
+# Baixa um único arquivo de forma incremental. Retorna o caminho local ou None em caso de falha.
+# - Pula arquivos íntegros cuja versão remota (ETag/Last-Modified) não mudou;
+# - Retoma downloads interrompidos com HTTP Range;
+# - Só publica o ZIP em 'local_path' depois de validar tamanho e CRCs.
+def download_file(item, target_dir, manifest=None):
+    file_name = item['filename']
+    url = item['url']
+    local_path = os.path.join(target_dir, file_name)
+    part_path = local_path + ".part"
+    manifest = manifest or DownloadManifest(target_dir)
+
+    entry = manifest.get(url)
+    remote = get_remote_info(url)
+
+    # Sem alterações: arquivo local íntegro e mesma versão no servidor (ou servidor inacessível)
+    if _local_is_intact(local_path, entry) and (not remote or _same_version(entry, remote)):
+        print(f"  -> {file_name} sem alterações. Pulando.")
+        return local_path
+
+    # Arquivo de execuções anteriores ao manifesto: adota se bater com o servidor
+    if not entry.get('sha256') and os.path.exists(local_path):
+        if remote.get('size') == os.path.getsize(local_path) and _is_valid_zip(local_path):
+            _record(manifest, url, file_name, local_path, remote)
+            print(f"  -> {file_name} já existe. Registrado no manifesto.")
+            return local_path
+
+    try:
+        resumed, validators = _fetch(url, part_path, entry, remote, manifest)
+
+        expected = remote.get('size')
+        if expected is not None and os.path.getsize(part_path) != expected:
+            tamanho = os.path.getsize(part_path)
+            os.remove(part_path)
+            manifest.update(url, partial=None)
+            raise IOError(f"tamanho inesperado ({tamanho} de {expected} bytes, descartado)")
+        if not _is_valid_zip(part_path):
+            os.remove(part_path)
+            manifest.update(url, partial=None)
+            raise IOError("ZIP corrompido (descartado)")
+
+        sha256 = sha256_file(part_path)
+        os.replace(part_path, local_path)
+        _record(manifest, url, file_name, local_path, validators, sha256)
+
+        status = f"[OK] retomado a partir de {resumed} bytes" if resumed else "[OK]"
+        print(f"  -> Baixando {file_name}... {status}")
+        return local_path
+    except Exception as e:
+        print(f"  -> Baixando {file_name}... [ERRO]\n     Falha ao baixar {file_name}: {e}")
+        return None
+
+# Baixa os arquivos .zip identificados, com até max_workers downloads simultâneos.
+def download_files(target_dir="data/raw", n_quarters=3, since_year=None, base_url=URL_BASE, max_workers=MAX_WORKERS):
     os.makedirs(target_dir, exist_ok=True)
+    get_session(pool_size=max_workers)
     
-    files_to_download = find_last_3_quarters_files()
-    downloaded_paths = []
+    files_to_download = find_quarter_files(n_quarters, since_year, base_url, max_workers)
 
     if not files_to_download:
         print("Nenhum arquivo encontrado. Verifique a conexão ou a URL base.")
@@ -95,32 +293,12 @@ def download_files(target_dir="data/raw"):
 
     print(f"\nArquivos selecionados para download: {[f['filename'] for f in files_to_download]}")
 
-    for item in files_to_download:
-        file_name = item['filename']
-        file_url = item['url']
-        local_path = os.path.join(target_dir, file_name)
-        
-        # Evita baixar de novo se já existe
-        if os.path.exists(local_path):
-            print(f"  -> {file_name} já existe. Pulando.")
-            downloaded_paths.append(local_path)
-            continue
-            
-        print(f"  -> Baixando {file_name}...", end='', flush=True)
-        
-        try:
-            # Usa verify=False também no download
-            with requests.get(file_url, stream=True, verify=False, timeout=60) as r:
-                r.raise_for_status()
-                with open(local_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
-            print(" [OK]")
-            downloaded_paths.append(local_path)
-        except Exception as e:
-            print(f" [ERRO]\n     Falha ao baixar {file_name}: {e}")
+    manifest = DownloadManifest(target_dir)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(lambda item: download_file(item, target_dir, manifest), files_to_download)
+        downloaded_paths = [path for path in results if path]
     
     return downloaded_paths
 
 if __name__ == "__main__":
-    download_files()
\ No newline at end of file
+    download_files()
@@ -0,0 +1,148 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import hashlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Adiciona a raiz do repositório ao path para conseguir importar o pacote 'shared'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import pandas as pd
+from shared import cadop
+
+CABECALHO = "REGISTRO_OPERADORA;CNPJ;Razao_Social;Modalidade;UF;Data_Registro_ANS\n"
+LINHAS = [
+    '"000123";"11.111.111/0001-11";"OPERADORA AÇÃO";"Medicina de Grupo";"SP";"2015-05-19"\n',
+    '"456789";"22222222000122";"OPERADORA BETA";"Autogestão";"RJ";"2010-01-01"\n',
+    '"456789";"33333333000133";"BETA DUPLICADA";"Autogestão";"RJ";"2011-01-01"\n',
+]
+
+# Imita o servidor da ANS para um único arquivo: listagem do diretório, ETag e respostas 304 (If-None-Match)
+class HandlerCadop(BaseHTTPRequestHandler):
+    conteudo = b""
+    arquivo = "Relatorio_cadop.csv"
+    requisicoes = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/":
+            listagem = f'<html><body><a href="../">../</a><a href="{HandlerCadop.arquivo}">{HandlerCadop.arquivo}</a></body></html>'.encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(listagem)))
+            self.end_headers()
+            self.wfile.write(listagem)
+            return
+        if self.path != "/" + HandlerCadop.arquivo:
+            self.send_error(404)
+            return
+        etag = '"%s"' % hashlib.md5(HandlerCadop.conteudo).hexdigest()
+        HandlerCadop.requisicoes.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(HandlerCadop.conteudo)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(HandlerCadop.conteudo)
+
+class TestCadopRegistry(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), HandlerCadop)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/Relatorio_cadop.csv"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = os.path.join(self.tmp.name, "auxiliary")
+        # Arquivo em cp1252 (acentos inválidos em UTF-8): o encoding é detectado uma vez
+        HandlerCadop.conteudo = (CABECALHO + "".join(LINHAS)).encode("cp1252")
+        HandlerCadop.arquivo = "Relatorio_cadop.csv"
+        HandlerCadop.requisicoes = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_download_e_indices(self):
+        registry = cadop.CadopRegistry(self.dir, url=self.url).refresh()
+        self.assertEqual(registry.status, "baixado")
+        self.assertEqual(registry.meta["encoding"], "cp1252")
+        self.assertEqual(len(registry.operadoras), 3)
+        self.assertEqual(str(registry.operadoras["UF"].dtype), "category")
+
+        # Por registro: zeros à esquerda e aspas não importam; repetido vale o primeiro
+        por_registro = registry.lookup_registro(pd.Series(["123", "00123", "456789", None, "999"]))
+        self.assertEqual(por_registro["CNPJ"].tolist()[:3], ["11111111000111", "11111111000111", "22222222000122"])
+        self.assertTrue(por_registro["CNPJ"].iloc[3:].isna().all())
+        self.assertEqual(por_registro["RazaoSocial"].iloc[0], "OPERADORA AÇÃO")
+
+        # Por CNPJ (só dígitos)
+        por_cnpj = registry.lookup_cnpj(pd.Series(["33333333000133", "0"], index=[7, 8]))
+        self.assertEqual(por_cnpj["RegistroANS"].tolist()[0], "456789")
+        self.assertEqual(por_cnpj.index.tolist(), [7, 8])
+        self.assertEqual(len(registry.operadoras_por_cnpj()), 3)
+
+    # Sem mudança no servidor: 304, sem download e sem reparsear o CSV
+    def test_requisicao_condicional(self):
+        cadop.CadopRegistry(self.dir, url=self.url).refresh()
+
+        parse_original = cadop.parse_cadop
+        cadop.parse_cadop = lambda texto: self.fail("CSV reparseado")
+        try:
+            registry = cadop.CadopRegistry(self.dir, url=self.url).refresh()
+        finally:
+            cadop.parse_cadop = parse_original
+        self.assertEqual(registry.status, "nao_modificado")
+        self.assertIsNotNone(HandlerCadop.requisicoes[-1])
+        self.assertEqual(len(registry.operadoras), 3)
+
+        # Arquivo novo no servidor: baixa e reconstrói o snapshot
+        HandlerCadop.conteudo = (CABECALHO + LINHAS[1]).encode("utf-8")
+        registry = cadop.CadopRegistry(self.dir, url=self.url).refresh()
+        self.assertEqual(registry.status, "baixado")
+        self.assertEqual(registry.meta["encoding"], "utf-8")
+        self.assertEqual(registry.operadoras["RegistroANS"].tolist(), ["456789"])
+
+    # Arquivo renomeado no servidor: a URL fixa dá 404 e o nome novo vem da listagem do diretório
+    def test_arquivo_renomeado(self):
+        HandlerCadop.arquivo = "Relatorio_cadop_2026.csv"
+        registry = cadop.CadopRegistry(self.dir, url=self.url).refresh()
+        self.assertEqual(registry.status, "baixado")
+        self.assertTrue(registry.meta["url"].endswith("/Relatorio_cadop_2026.csv"))
+        self.assertEqual(len(registry.operadoras), 3)
+
+        # Na próxima execução, a requisição condicional vale para a URL encontrada
+        registry = cadop.CadopRegistry(self.dir, url=self.url).refresh()
+        self.assertEqual(registry.status, "nao_modificado")
+
+        # Sem candidato na listagem: o 404 vira aviso e a cópia local é usada
+        HandlerCadop.arquivo = "outro.txt"
+        registry = cadop.CadopRegistry(self.dir, url=self.url).refresh()
+        self.assertEqual(registry.status, "offline")
+        self.assertEqual(len(registry.operadoras), 3)
+
+    # Sem rede: usa a cópia local (e o snapshot), sem erro
+    def test_offline(self):
+        cadop.CadopRegistry(self.dir, url=self.url).refresh()
+        registry = cadop.CadopRegistry(self.dir, url="http://127.0.0.1:9/Relatorio_cadop.csv").refresh(timeout=2)
+        self.assertEqual(registry.status, "offline")
+        self.assertEqual(len(registry.operadoras), 3)
+
+        # Sem rede e sem cópia local: cadastro vazio
+        vazio = cadop.CadopRegistry(os.path.join(self.tmp.name, "vazio"), url="http://127.0.0.1:9/x.csv").refresh(timeout=2)
+        self.assertTrue(vazio.empty)
+
+if __name__ == '__main__':
+    unittest.main()
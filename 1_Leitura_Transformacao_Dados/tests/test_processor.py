@@ -0,0 +1,262 @@
+import unittest
+import sys
+import os
+import tempfile
+import zipfile
+import io
+import json
+
+# Adiciona a raiz do módulo ao path para conseguir importar o pacote 'src'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd
+from src import processor
+from shared import columnar
+from shared.encoding import sniff_encoding, decode_bytes
+from shared.compact import compact_frame, csv_dtypes, memory_report
+
+CABECALHO = '"DATA";"REG_ANS";"CD_CONTA_CONTABIL";"DESCRICAO";"VL_SALDO_INICIAL";"VL_SALDO_FINAL"\n'
+
+# CADOP simplificado no formato retornado por load_cadop_mapping
+MAPEAMENTO = processor.build_cadop_index(
+    pd.DataFrame({
+        "REGISTRO_OPERADORA": ["419761", "421545", "005711"],
+        "CNPJ": ["19541931000125", "22869997000153", "92693118000160"],
+        "RAZAO_SOCIAL": ["18 DE JULHO ADMINISTRADORA", "2B ODONTOLOGIA", "BRADESCO SAUDE"],
+    }),
+    "REGISTRO_OPERADORA", "CNPJ", "RAZAO_SOCIAL",
+)
+
+def linhas_trimestre(data, n=40):
+    linhas = []
+    for i in range(n):
+        reg = "419761" if i % 2 else "421545"
+        descricao = "EVENTOS INDENIZÁVEIS LÍQUIDOS" if i % 3 == 0 else "CONTRAPRESTAÇÕES EFETIVAS"
+        valor = "0,00" if i == 3 else f"{i * 1000},{i:02d}"
+        linhas.append(f'"{data}";"{reg}";"4111{i}";"{descricao}";"0";"{valor}"\n')
+    return linhas
+
+def criar_zip(raw_dir, nome, membros, encoding="utf-8"):
+    with zipfile.ZipFile(os.path.join(raw_dir, nome), "w", zipfile.ZIP_DEFLATED) as z:
+        for membro, linhas in membros.items():
+            z.writestr(membro, (CABECALHO + "".join(linhas)).encode(encoding))
+
+class TestProcessDataZip(unittest.TestCase):
+
+    def setUp(self):
+        # Cada teste roda em uma pasta temporária com a estrutura data/raw do módulo
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        os.makedirs(processor.RAW_DIR)
+        criar_zip(processor.RAW_DIR, "1T2024.zip", {"1T2024.csv": linhas_trimestre("2024-01-01")})
+        criar_zip(processor.RAW_DIR, "2T2024.zip", {"2T2024.csv": linhas_trimestre("2024-04-01")}, encoding="latin1")
+        self._load = processor.load_cadop_mapping
+        processor.load_cadop_mapping = lambda: MAPEAMENTO
+
+    def tearDown(self):
+        processor.load_cadop_mapping = self._load
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_le_membros_sem_extrair(self):
+        processor.process_data()
+        self.assertFalse(os.path.exists(os.path.join("data", "extracted")))
+
+        df = pd.read_csv(processor.OUTPUT_FILE, sep=';', encoding='utf-8-sig', dtype=str)
+        self.assertEqual(len(df), 2 * 14)
+        self.assertEqual(sorted(df['Trimestre'].unique()), ['1', '2'])
+        self.assertEqual(set(df['CNPJ']), {"19541931000125", "22869997000153"})
+        self.assertTrue(os.path.exists('consolidado_despesas.zip'))
+
+    def test_streaming_em_blocos_igual_ao_arquivo_inteiro(self):
+        processor.process_data()
+        with open(processor.OUTPUT_FILE, 'rb') as f:
+            inteiro = f.read()
+        processor.process_data(chunksize=7)
+        with open(processor.OUTPUT_FILE, 'rb') as f:
+            self.assertEqual(f.read(), inteiro)
+
+    def test_workers_saida_identica_ao_modo_sequencial(self):
+        criar_zip(processor.RAW_DIR, "3T2024.zip", {
+            "3T2024.csv": linhas_trimestre("2024-07-01"),
+            "3T2024_retificado.csv": linhas_trimestre("data-invalida", n=10),
+        })
+        with self.assertLogs(level='WARNING') as log_serial:
+            processor.process_data()
+        with open(processor.OUTPUT_FILE, 'rb') as f:
+            serial = f.read()
+
+        with self.assertLogs(level='WARNING') as log_paralelo:
+            processor.process_data(chunksize=9, workers=3)
+        with open(processor.OUTPUT_FILE, 'rb') as f:
+            self.assertEqual(f.read(), serial)
+        self.assertEqual(log_paralelo.output, log_serial.output)
+
+    # O worker grava os blocos filtrados em um arquivo temporário (um bloco por vez),
+    # em vez de devolver o arquivo inteiro concatenado; a leitura de volta apaga o temporário
+    def test_worker_grava_blocos_em_arquivo_temporario(self):
+        processor._init_worker(MAPEAMENTO)
+        zip_path = os.path.join(processor.RAW_DIR, "1T2024.zip")
+        resultado = processor._process_member_in_worker((zip_path, "1T2024.csv", 5, processor.ACCOUNT_PATTERNS, None, self.tmp.name))
+        self.assertTrue(os.path.exists(resultado['spill']))
+        blocos = list(processor._iter_spill(resultado['spill']))
+        self.assertGreater(len(blocos), 1)
+        self.assertEqual(sum(len(b) for b in blocos), 14)
+        self.assertFalse(os.path.exists(resultado['spill']))
+
+        erro = processor._process_member_in_worker((zip_path, "inexistente.csv", 5, processor.ACCOUNT_PATTERNS, None, self.tmp.name))
+        self.assertIn('erro', erro)
+        self.assertEqual([n for n in os.listdir(self.tmp.name) if n.endswith('.pkl')], [])
+
+    def test_lookup_cadop_tolera_zeros_a_esquerda(self):
+        df = pd.DataFrame({
+            'Descricao': ['EVENTOS'] * 4,
+            'RegAns': ['5711', '005711', '0419761', '999999'],
+            'Valor Despesas': ['1,00'] * 4,
+        })
+        resultado = processor.clean_and_validate(df, 'teste.csv', MAPEAMENTO)
+        self.assertEqual(resultado['CNPJ'].tolist(),
+                         ['92693118000160', '92693118000160', '19541931000125', 'Reg: 999999'])
+        self.assertEqual(resultado['RazaoSocial'].tolist()[-1], 'ID: 999999')
+
+    def test_duplicidade_de_razao_social_entre_arquivos(self):
+        razoes = {}
+        processor.update_razoes_por_cnpj(razoes, pd.DataFrame({'CNPJ': ['1', '1'], 'RazaoSocial': ['A', 'A']}))
+        processor.update_razoes_por_cnpj(razoes, pd.DataFrame({'CNPJ': ['1', '2'], 'RazaoSocial': ['B', 'C']}))
+        self.assertEqual({c: list(n) for c, n in razoes.items()}, {'1': ['A', 'B'], '2': ['C']})
+
+    def test_pre_filtro_descarta_linhas_antes_do_parse(self):
+        conteudo = (CABECALHO + "".join(linhas_trimestre("2024-01-01"))).encode("utf-8")
+        filtro = processor.LineFilter(io.BytesIO(conteudo), processor.raw_line_patterns(("evento", "SINISTRO")), block_size=97)
+        saida = filtro.read().decode("utf-8").splitlines()
+        self.assertEqual(saida[0] + "\n", CABECALHO)
+        self.assertEqual(len(saida) - 1, 14)
+        self.assertTrue(all("EVENTOS" in linha for linha in saida[1:]))
+        self.assertEqual((filtro.lines_read, filtro.lines_kept), (40, 14))
+
+    def test_padroes_de_conta_configuraveis(self):
+        processor.process_data(patterns=("CONTRAPRESTA",))
+        df = pd.read_csv(processor.OUTPUT_FILE, sep=';', encoding='utf-8-sig', dtype=str)
+        self.assertEqual(len(df), 2 * 26)
+        # Padrões não-ASCII desligam o pré-filtro cru, mas o filtro por Descricao continua valendo
+        self.assertIsNone(processor.raw_line_patterns(("CONTRAPRESTAÇÕES",)))
+        processor.process_data(patterns=("CONTRAPRESTAÇÕES",))
+        self.assertEqual(len(pd.read_csv(processor.OUTPUT_FILE, sep=';', encoding='utf-8-sig')), 2 * 26)
+
+    @unittest.skipUnless(columnar.pyarrow_available(), "pyarrow não instalado")
+    def test_saida_parquet_tipada_e_particionada(self):
+        processor.process_data(chunksize=9, parquet=True)
+        self.assertTrue(os.path.isdir(os.path.join(columnar.PARQUET_DIR_NAME, "Ano=2024", "Trimestre=2")))
+
+        caminho = columnar.find_parquet_dataset(".")
+        df = columnar.read_consolidado_parquet(caminho)
+        csv = pd.read_csv(processor.OUTPUT_FILE, sep=';', encoding='utf-8-sig')
+        self.assertEqual(str(df['Ano'].dtype), 'Int16')
+        self.assertEqual(str(df['Trimestre'].dtype), 'Int16')
+        self.assertEqual(str(df['RazaoSocial'].dtype), 'category')
+        self.assertEqual(str(df['CNPJ'].dtype), 'category')
+        self.assertEqual(df['Valor Despesas'].dtype, 'float64')
+        self.assertEqual(len(df), len(csv))
+        self.assertAlmostEqual(df['Valor Despesas'].sum(), csv['Valor Despesas'].sum())
+
+    # Dataset de uma execução anterior não pode esconder o CSV gravado depois dele
+    @unittest.skipUnless(columnar.pyarrow_available(), "pyarrow não instalado")
+    def test_parquet_desatualizado_ignorado(self):
+        processor.process_data(parquet=True)
+        self.assertIsNotNone(columnar.find_parquet_dataset("."))
+
+        # CSV mais novo que o dataset (ex: gravado por outra ferramenta)
+        marcador = os.stat(os.path.join(columnar.PARQUET_DIR_NAME, columnar.MARKER_NAME)).st_mtime_ns
+        os.utime(processor.OUTPUT_FILE, ns=(marcador + 10**9, marcador + 10**9))
+        self.assertIsNone(columnar.find_parquet_dataset("."))
+
+        # Execução sem --parquet remove o dataset anterior
+        processor.process_data()
+        self.assertFalse(os.path.exists(columnar.PARQUET_DIR_NAME))
+        self.assertIsNone(columnar.find_parquet_dataset("."))
+
+    def test_metricas_de_leitura(self):
+        zip_path, membro = processor.list_zip_members()[0]
+        df, reader = processor.read_zip_member(zip_path, membro, 'utf-8')
+        with zipfile.ZipFile(zip_path) as z:
+            self.assertEqual(reader.bytes_read, z.getinfo(membro).file_size)
+        self.assertEqual(len(df), 40)
+        self.assertGreaterEqual(reader.seconds, 0.0)
+
+    # UTF-8 com um byte Latin-1 na última linha: uma única passada, só essa linha em fallback,
+    # e o encoding fica registrado no manifesto de downloads para as próximas execuções
+    def test_encoding_em_passada_unica(self):
+        zip_path = os.path.join(processor.RAW_DIR, "4T2024.zip")
+        with zipfile.ZipFile(zip_path, "w") as z:
+            corpo = (CABECALHO + "".join(linhas_trimestre("2024-10-01"))).encode("utf-8")
+            z.writestr("4T2024.csv", corpo + '"2024-10-01";"005711";"41";"EVENTOS SAÚDE";"0";"5,00"\n'.encode("latin1"))
+        stat = os.stat(zip_path)
+        with open(os.path.join(processor.RAW_DIR, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"http://ans/4T2024.zip": {"filename": "4T2024.zip", "size": stat.st_size,
+                                                 "mtime_ns": stat.st_mtime_ns}}, f)
+
+        usados = []
+        original = processor.DecodedStream
+        class DecodedStreamEspiao(original):
+            def __init__(self, stream, encoding=None):
+                usados.append(encoding)
+                super().__init__(stream, encoding)
+        processor.DecodedStream = DecodedStreamEspiao
+        try:
+            processor.process_data()
+            with open(os.path.join(processor.RAW_DIR, "manifest.json"), encoding="utf-8") as f:
+                encodings = json.load(f)["http://ans/4T2024.zip"]["encodings"]
+            self.assertEqual(encodings, {"4T2024.csv": {"encoding": "utf-8", "fallback_rows": 1}})
+            self.assertEqual(usados, [None, None, None])
+
+            df = pd.read_csv(processor.OUTPUT_FILE, sep=';', encoding='utf-8-sig', dtype=str)
+            self.assertEqual(len(df), 3 * 14 + 1)
+            self.assertIn("BRADESCO SAUDE", set(df['RazaoSocial']))
+
+            # Execução seguinte: o encoding registrado é reaproveitado (sem nova detecção)
+            usados.clear()
+            processor.process_data()
+            self.assertEqual(usados, [None, None, "utf-8"])
+        finally:
+            processor.DecodedStream = original
+
+class TestDecodificacao(unittest.TestCase):
+
+    def test_deteccao_no_prefixo(self):
+        self.assertEqual(sniff_encoding("AÇÃO;".encode("utf-8")), "utf-8")
+        # Caractere multibyte cortado no fim da amostra não invalida o UTF-8
+        self.assertEqual(sniff_encoding("AÇÃO".encode("utf-8")[:-1]), "utf-8")
+        self.assertEqual(sniff_encoding(b"\xef\xbb\xbfCNPJ"), "utf-8-sig")
+        self.assertEqual(sniff_encoding("AÇÃO – 1".encode("cp1252")), "cp1252")
+        self.assertEqual(sniff_encoding(b"A\x81B"), "latin1")
+
+    def test_fallback_por_linha(self):
+        conteudo = b"\xef\xbb\xbfNOME\n" + "AÇÃO\n".encode("utf-8") + "SAÚDE\n".encode("latin1") + "FIM".encode("utf-8")
+        texto, encoding, fallback = decode_bytes(conteudo)
+        self.assertEqual((texto, encoding, fallback), ("NOME\nAÇÃO\nSAÚDE\nFIM", "utf-8-sig", 1))
+
+class TestEsquemaCompacto(unittest.TestCase):
+
+    def test_compact_frame(self):
+        csv = "CNPJ;RazaoSocial;Trimestre;Ano;Valor Despesas\n" + "".join(
+            f"{i % 3}1111111000111;OPERADORA {i % 3};{i % 4 + 1};2024;{i}.5\n" for i in range(300)
+        ) + "2111111000111;OPERADORA 2;;;1.0\n"
+        texto = pd.read_csv(io.StringIO(csv), sep=';', dtype=str)
+        df = pd.read_csv(io.StringIO(csv), sep=';', dtype=csv_dtypes())
+        self.assertEqual(str(df['CNPJ'].dtype), 'category')
+        df['Valor Despesas'] = pd.to_numeric(df['Valor Despesas'])
+        compact_frame(df)
+
+        self.assertEqual(str(df['Ano'].dtype), 'Int16')
+        self.assertEqual(str(df['Trimestre'].dtype), 'Int16')
+        self.assertTrue(df['Ano'].isna().iloc[-1])
+        self.assertEqual(df['Valor Despesas'].dtype, 'float64')
+        self.assertEqual(df['RazaoSocial'].tolist(), texto['RazaoSocial'].tolist())
+
+        antes, depois = memory_report(texto), memory_report(df)
+        self.assertEqual(depois['linhas'], 301)
+        self.assertLess(depois['bytes_por_linha'], antes['bytes_por_linha'] / 2)
+
+if __name__ == '__main__':
+    unittest.main()
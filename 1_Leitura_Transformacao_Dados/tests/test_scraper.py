@@ -0,0 +1,212 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import io
+import json
+import hashlib
+import zipfile
+import functools
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+# Adiciona a raiz do módulo ao path para conseguir importar o pacote 'src'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import scraper
+
+# Estrutura que imita o diretório FTP/PDA da ANS (listagem de anos com os ZIPs trimestrais)
+ESTRUTURA_ANS = {
+    "2022": ["1T2022.zip", "2T2022.zip", "3T2022.zip", "4T2022.zip"],
+    "2023": ["1T2023.zip", "2T2023.zip", "3T2023.zip", "4T2023.zip"],
+    "2024": ["1T2024.zip", "2T2024.zip", "leiame.txt"],
+}
+
+# Data fixa no ZIP: os bytes (e o ETag) não podem depender do horário em que o teste roda
+def conteudo_zip(nome, versao=1):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as z:
+        info = zipfile.ZipInfo(nome.replace(".zip", ".csv"), date_time=(2024, 1, 1, 0, 0, 0))
+        z.writestr(info, f"{nome};{versao}\n" * 5000, compress_type=zipfile.ZIP_DEFLATED)
+    return buffer.getvalue()
+
+# Imita o servidor da ANS: listagem de diretórios, ETag, HEAD e requisições com Range/If-Range.
+class HandlerANS(SimpleHTTPRequestHandler):
+    requisicoes = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            return super().send_head()
+        if not os.path.exists(path):
+            self.send_error(404)
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        HandlerANS.requisicoes.append((self.command, os.path.basename(path), range_header))
+
+        inicio = 0
+        if range_header and (if_range is None or if_range == etag):
+            inicio = int(range_header.split("=")[1].split("-")[0])
+            # Range a partir do fim do arquivo: 416, como no servidor real
+            if inicio >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return io.BytesIO(b"")
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {inicio}-{len(data) - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(len(data) - inicio))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        return io.BytesIO(data[inicio:])
+
+class TestScraperLocal(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Servidor HTTP local servindo a pasta 'demonstracoes_contabeis/'
+        cls.tmp = tempfile.TemporaryDirectory()
+        root = os.path.join(cls.tmp.name, "demonstracoes_contabeis")
+        for ano, arquivos in ESTRUTURA_ANS.items():
+            os.makedirs(os.path.join(root, ano))
+            for nome in arquivos:
+                with open(os.path.join(root, ano, nome), "wb") as f:
+                    f.write(conteudo_zip(nome))
+        cls.root = root
+
+        handler = functools.partial(HandlerANS, directory=cls.tmp.name)
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}/demonstracoes_contabeis/"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.tmp.cleanup()
+
+    def test_ultimos_3_trimestres(self):
+        arquivos = scraper.find_quarter_files(n_quarters=3, base_url=self.base_url)
+        self.assertEqual([a["filename"] for a in arquivos], ["2T2024.zip", "1T2024.zip", "4T2023.zip"])
+
+    def test_ultimos_n_trimestres_atravessa_anos(self):
+        arquivos = scraper.find_quarter_files(n_quarters=7, base_url=self.base_url, max_workers=1)
+        self.assertEqual(len(arquivos), 7)
+        self.assertEqual(arquivos[-1]["filename"], "4T2022.zip")
+
+    def test_todos_desde_ano(self):
+        arquivos = scraper.find_quarter_files(n_quarters=None, since_year=2023, base_url=self.base_url)
+        self.assertEqual(len(arquivos), 6)
+        self.assertTrue(all("2022" not in a["filename"] for a in arquivos))
+
+    def setUp(self):
+        HandlerANS.requisicoes.clear()
+
+    def _gets(self):
+        return [r for r in HandlerANS.requisicoes if r[0] == "GET"]
+
+    def test_download_paralelo(self):
+        with tempfile.TemporaryDirectory() as destino:
+            caminhos = scraper.download_files(
+                target_dir=destino, n_quarters=5, base_url=self.base_url, max_workers=3
+            )
+            self.assertEqual(len(caminhos), 5)
+            for caminho in caminhos:
+                nome = os.path.basename(caminho)
+                with open(caminho, "rb") as f:
+                    self.assertEqual(f.read(), conteudo_zip(nome))
+
+    def test_manifesto_pula_arquivos_inalterados(self):
+        with tempfile.TemporaryDirectory() as destino:
+            scraper.download_files(target_dir=destino, n_quarters=2, base_url=self.base_url)
+            with open(os.path.join(destino, "manifest.json"), encoding="utf-8") as f:
+                manifesto = json.load(f)
+            entrada = next(e for e in manifesto.values() if e["filename"] == "2T2024.zip")
+            self.assertEqual(entrada["sha256"], hashlib.sha256(conteudo_zip("2T2024.zip")).hexdigest())
+            self.assertIn("etag", entrada)
+            self.assertIn("fetched_at", entrada)
+
+            HandlerANS.requisicoes.clear()
+            scraper.download_files(target_dir=destino, n_quarters=2, base_url=self.base_url)
+            self.assertEqual(self._gets(), [])
+
+    def test_retoma_download_com_range(self):
+        item = {"filename": "1T2023.zip", "url": self.base_url + "2023/1T2023.zip"}
+        dados = conteudo_zip("1T2023.zip")
+        with tempfile.TemporaryDirectory() as destino:
+            # Simula um download interrompido pela metade
+            manifesto = scraper.DownloadManifest(destino)
+            etag = '"%s"' % hashlib.md5(dados).hexdigest()
+            manifesto.update(item["url"], partial={"validator": etag})
+            with open(os.path.join(destino, "1T2023.zip.part"), "wb") as f:
+                f.write(dados[:100])
+
+            caminho = scraper.download_file(item, destino, manifesto)
+            self.assertEqual(self._gets(), [("GET", "1T2023.zip", "bytes=100-")])
+            with open(caminho, "rb") as f:
+                self.assertEqual(f.read(), dados)
+            self.assertFalse(os.path.exists(caminho + ".part"))
+
+    # Execução anterior caiu depois do último byte, antes da validação/renomeação: o servidor
+    # responde 416 ao Range e o .part é validado e publicado. Um .part maior que o arquivo
+    # remoto é descartado e o download recomeça do zero.
+    def test_part_completo_responde_416(self):
+        item = {"filename": "2T2023.zip", "url": self.base_url + "2023/2T2023.zip"}
+        dados = conteudo_zip("2T2023.zip")
+        etag = '"%s"' % hashlib.md5(dados).hexdigest()
+        for conteudo_part, gets in [(dados, [("GET", "2T2023.zip", f"bytes={len(dados)}-")]),
+                                    (dados + b"lixo", [("GET", "2T2023.zip", f"bytes={len(dados) + 4}-"),
+                                                       ("GET", "2T2023.zip", None)])]:
+            with tempfile.TemporaryDirectory() as destino:
+                manifesto = scraper.DownloadManifest(destino)
+                manifesto.update(item["url"], partial={"validator": etag})
+                with open(os.path.join(destino, "2T2023.zip.part"), "wb") as f:
+                    f.write(conteudo_part)
+
+                HandlerANS.requisicoes.clear()
+                caminho = scraper.download_file(item, destino, manifesto)
+                self.assertEqual(self._gets(), gets)
+                with open(caminho, "rb") as f:
+                    self.assertEqual(f.read(), dados)
+                self.assertFalse(os.path.exists(caminho + ".part"))
+                self.assertIsNone(manifesto.get(item["url"]).get("partial"))
+
+    def test_rebaixa_arquivo_republicado_ou_corrompido(self):
+        item = {"filename": "4T2023.zip", "url": self.base_url + "2023/4T2023.zip"}
+        arquivo_remoto = os.path.join(self.root, "2023", "4T2023.zip")
+        with tempfile.TemporaryDirectory() as destino:
+            caminho = scraper.download_file(item, destino)
+
+            # Arquivo local truncado é detectado e baixado novamente
+            with open(caminho, "r+b") as f:
+                f.truncate(100)
+            scraper.download_file(item, destino)
+            with open(caminho, "rb") as f:
+                self.assertEqual(f.read(), conteudo_zip("4T2023.zip"))
+
+            # A ANS republica o arquivo: nova versão é baixada
+            try:
+                with open(arquivo_remoto, "wb") as f:
+                    f.write(conteudo_zip("4T2023.zip", versao=2))
+                HandlerANS.requisicoes.clear()
+                scraper.download_file(item, destino)
+                self.assertEqual(len(self._gets()), 1)
+                with open(caminho, "rb") as f:
+                    self.assertEqual(f.read(), conteudo_zip("4T2023.zip", versao=2))
+            finally:
+                with open(arquivo_remoto, "wb") as f:
+                    f.write(conteudo_zip("4T2023.zip"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# Benchmark de memória do consolidado de despesas em uma base de vários anos:
+# leitura como texto (dtype=str, implementação anterior) vs esquema compacto de shared/compact.py
+# (categorias para CNPJ/RazaoSocial, Int16 para Ano/Trimestre e float64 para o valor).
+#
+# Cada leitura roda em um processo novo, para que a RSS de uma não contamine a outra.
+# Uso: python benchmarks/bench_memory.py [linhas] [anos]
+import sys
+import os
+import json
+import shutil
+import subprocess
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+# Código executado em cada processo: lê o consolidado, converte o valor e mede
+LEITURA = """
+import sys, json
+sys.path.insert(0, {root!r})
+import pandas as pd
+from shared.compact import compact_frame, csv_dtypes, memory_report, process_memory
+compacto = {compacto!r}
+df = pd.read_csv({path!r}, sep=';', encoding='utf-8-sig', dtype=csv_dtypes() if compacto else str)
+df['Valor Despesas'] = pd.to_numeric(df['Valor Despesas'], errors='coerce').fillna(0.0)
+if compacto:
+    df = compact_frame(df)
+relatorio = memory_report(df)
+relatorio['pico_kb'] = process_memory().get('VmHWM')
+print(json.dumps(relatorio))
+"""
+
+# Consolidado no formato do Teste 1: ~1500 operadoras, 4 trimestres por ano
+def criar_consolidado(path, n, anos):
+    rng = np.random.default_rng(11)
+    ops = rng.integers(0, 1500, n)
+    trimestres = rng.integers(0, 4 * anos, n)
+    valores = rng.integers(0, 10_000_000, n)
+    with open(path, 'w', encoding='utf-8-sig') as f:
+        f.write("CNPJ;RazaoSocial;Trimestre;Ano;Valor Despesas\n")
+        for i, t, v in zip(ops, trimestres, valores):
+            f.write(f"{i:08d}0001{i % 100:02d};OPERADORA SAUDE {i} LTDA;{t % 4 + 1};{2025 - anos + t // 4};{v / 100:.2f}\n")
+
+def medir(path, compacto):
+    codigo = LEITURA.format(root=ROOT_DIR, path=path, compacto=compacto)
+    saida = subprocess.run([sys.executable, '-c', codigo], stdout=subprocess.PIPE, text=True, check=True).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+def resumo(titulo, r):
+    print(f"  {titulo:<22} DataFrame: {r['bytes'] / 1024 ** 2:7.1f} MB ({r['bytes_por_linha']:5.1f} bytes/linha) | "
+          f"RSS: {r['rss_kb'] / 1024:6.0f} MB | pico: {r['pico_kb'] / 1024:6.0f} MB")
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 3_000_000
+    anos = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "consolidado_despesas.csv")
+        print(f"Gerando {n:,} linhas ({anos} anos, {4 * anos} trimestres)...")
+        criar_consolidado(path, n, anos)
+
+        texto, compacto = medir(path, False), medir(path, True)
+        resumo("Texto (dtype=str)", texto)
+        resumo("Esquema compacto", compacto)
+        print("  Por coluna (MB):")
+        for col in texto['colunas']:
+            print(f"    {col:<16} {texto['colunas'][col] / 1024 ** 2:7.1f} -> {compacto['colunas'][col] / 1024 ** 2:6.1f} "
+                  f"({texto['dtypes'][col]} -> {compacto['dtypes'][col]})")
+        print(f"  Redução: DataFrame {texto['bytes'] / compacto['bytes']:.1f}x | RSS {texto['rss_kb'] / compacto['rss_kb']:.1f}x")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Benchmark da validação de CNPJs do main.py:
+# df['CNPJ'].apply por linha (implementação anterior) vs validate_cnpj_batch (matriz N x 14)
+# vs CnpjMemo (uma validação por CNPJ distinto, como no main.py).
+#
+# Uso: python benchmarks/bench_validator.py [linhas] [CNPJs distintos]
+import sys
+import os
+import re
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from src.validator import validate_cnpj_batch
+from shared.cnpj import PESOS1, PESOS2, CnpjMemo
+
+# Implementação anterior, mantida aqui apenas como referência de desempenho.
+def validate_cnpj_por_linha(cnpj):
+    cnpj = re.sub(r'\D', '', str(cnpj))
+    if len(cnpj) != 14 or len(set(cnpj)) == 1:
+        return False
+    pesos1 = [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+    digito1 = 11 - (sum(int(cnpj[i]) * pesos1[i] for i in range(12)) % 11)
+    if (0 if digito1 >= 10 else digito1) != int(cnpj[12]):
+        return False
+    pesos2 = [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+    digito2 = 11 - (sum(int(cnpj[i]) * pesos2[i] for i in range(13)) % 11)
+    return (0 if digito2 >= 10 else digito2) == int(cnpj[13])
+
+# CNPJs válidos (metade com máscara), 10% com o último dígito trocado e 2% nulos
+def gerar_cnpjs(n, rng):
+    base = rng.integers(0, 10, size=(n, 12))
+    d1 = 11 - (base @ PESOS1) % 11
+    d1 = np.where(d1 >= 10, 0, d1)
+    d2 = 11 - (np.column_stack([base, d1]) @ PESOS2) % 11
+    d2 = np.where(d2 >= 10, 0, d2)
+    d2 = np.where(rng.random(n) < 0.10, (d2 + 1) % 10, d2)
+    digitos = np.column_stack([base, d1, d2]).astype(np.uint8) + ord('0')
+    cnpjs = pd.Series(digitos.view('S14').ravel()).str.decode('ascii')
+    mascara = rng.random(n) < 0.5
+    cnpjs[mascara] = cnpjs[mascara].str.replace(r'(\d{2})(\d{3})(\d{3})(\d{4})(\d{2})', r'\1.\2.\3/\4-\5', regex=True)
+    cnpjs[rng.random(n) < 0.02] = None
+    return cnpjs
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    distintos = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    rng = np.random.default_rng(42)
+    cnpjs = gerar_cnpjs(n, rng)
+    # Despesas reais: poucos milhares de operadoras repetidas em milhões de linhas
+    repetidos = gerar_cnpjs(distintos, rng)[rng.integers(0, distintos, n)].reset_index(drop=True)
+
+    start = time.perf_counter()
+    antes = cnpjs.apply(validate_cnpj_por_linha)
+    t_antes = time.perf_counter() - start
+
+    start = time.perf_counter()
+    depois = validate_cnpj_batch(cnpjs)
+    t_depois = time.perf_counter() - start
+
+    start = time.perf_counter()
+    memo = CnpjMemo().validate(repetidos)
+    t_memo = time.perf_counter() - start
+
+    assert antes.tolist() == depois.tolist(), "resultados divergentes"
+    assert memo.tolist() == validate_cnpj_batch(repetidos).tolist(), "resultados divergentes (memo)"
+
+    print(f"Linhas: {n:,} ({int(depois.sum()):,} válidos)")
+    print(f"  Por linha (.apply):        {t_antes:8.3f}s  {n / t_antes:14,.0f} linhas/s")
+    print(f"  Lote (validate_cnpj_batch): {t_depois:8.3f}s  {n / t_depois:14,.0f} linhas/s")
+    print(f"  Speedup: {t_antes / t_depois:.1f}x (resultados idênticos)")
+    print(f"  Memo ({distintos:,} distintos):    {t_memo:8.3f}s  {n / t_memo:14,.0f} linhas/s")
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,15 @@ import os
 import sys
 import zipfile
 
-# Adiciona src ao path para importar os módulos vizinhos
-sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+# Adiciona o diretório atual ao path para garantir que o python encontre o pacote 'src'
+# (que, ao ser importado, coloca a raiz do repositório no path para o 'shared')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from validator import validate_cnpj
-from enricher import enrich_data_with_cadop
-from aggregator import calculate_statistics
+from src.enricher import enrich_data_with_cadop
+from src.aggregator import calculate_statistics
+from shared.columnar import find_parquet_dataset, read_consolidado_parquet
+from shared.cnpj import CnpjMemo, MEMO_FILE
+from shared.compact import compact_frame, csv_dtypes, memory_report, format_memory
 
 # CONFIGURAÇÃO
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -16,9 +19,19 @@ PATH_TESTE_1 = os.path.join(CURRENT_DIR, '..', '1_Leitura_Transformacao_Dados')
 FILE_NAME = "consolidado_despesas.csv"
 ZIP_NAME = "consolidado_despesas.zip"
 OUTPUT_FILE = os.path.join(CURRENT_DIR, "despesas_agregadas.csv")
+# Memo de CNPJs (bruto -> limpo -> válido), reaproveitado entre execuções, pelo Teste 3 e pela API
+MEMO_PATH = os.path.join(CURRENT_DIR, 'data', MEMO_FILE)
 
-# Busca inteligente do input (CSV ou ZIP) nas pastas.
+# Busca inteligente do input (Parquet, CSV ou ZIP) nas pastas.
+# O dataset Parquet do Teste 1, quando existe, é preferido: já vem tipado (sem conversão de valores).
+# No CSV, as colunas de texto repetidas já são lidas como categorias (esquema de shared/compact.py).
 def get_input_dataframe():
+    for base_dir in [os.path.join(CURRENT_DIR, 'data'), PATH_TESTE_1]:
+        parquet_path = find_parquet_dataset(base_dir)
+        if parquet_path:
+            print(f"  -> Dataset Parquet encontrado: {parquet_path}")
+            return read_consolidado_parquet(parquet_path)
+
     possible_paths = [
         os.path.join(CURRENT_DIR, 'data', FILE_NAME),
         os.path.join(PATH_TESTE_1, FILE_NAME)
@@ -26,14 +39,14 @@ def get_input_dataframe():
     for p in possible_paths:
         if os.path.exists(p):
             print(f"  -> Arquivo encontrado: {p}")
-            return pd.read_csv(p, sep=';', encoding='utf-8-sig', dtype=str)
+            return pd.read_csv(p, sep=';', encoding='utf-8-sig', dtype=csv_dtypes())
 
     zip_path = os.path.join(PATH_TESTE_1, ZIP_NAME)
     if os.path.exists(zip_path):
         print(f"  -> ZIP encontrado no Teste 1: {zip_path}. Extraindo...")
         with zipfile.ZipFile(zip_path) as z:
             with z.open(FILE_NAME) as f:
-                return pd.read_csv(f, sep=';', encoding='utf-8-sig', dtype=str)
+                return pd.read_csv(f, sep=';', encoding='utf-8-sig', dtype=csv_dtypes())
     
     raise FileNotFoundError("Input não encontrado no Teste 1 ou localmente.")
 
@@ -48,20 +61,27 @@ def main():
     except Exception as e:
         print(f"[ERRO] {e}"); return
 
-    # Conversão Monetária
-    print("  -> Convertendo valores monetários...")
-    df['Valor Despesas'] = pd.to_numeric(df['Valor Despesas'].str.replace(',', '.'), errors='coerce').fillna(0.0)
+    # Conversão Monetária (desnecessária quando o input já é tipado)
+    if not pd.api.types.is_numeric_dtype(df['Valor Despesas']):
+        print("  -> Convertendo valores monetários...")
+        df['Valor Despesas'] = pd.to_numeric(df['Valor Despesas'].str.replace(',', '.'), errors='coerce').fillna(0.0)
+
+    # Esquema compacto em memória (categorias, Int16 e float64)
+    df = compact_frame(df)
+    print(f"  -> Memória do consolidado: {format_memory(memory_report(df))}")
 
-    # 2. Validação (Usa src/validator.py)
+    # 2. Validação (validação em lote de src/validator.py, uma vez por CNPJ distinto via memo)
     print("  -> Executando Validação de CNPJs...")
-    df['CNPJ_Valido'] = df['CNPJ'].apply(validate_cnpj)
+    memo = CnpjMemo(MEMO_PATH)
+    df['CNPJ_Valido'] = memo.validate(df['CNPJ'])
+    print(f"     {len(memo.used)} CNPJs distintos ({memo.new_entries} fora do memo).")
     
     invalidos = len(df[~df['CNPJ_Valido']])
     if invalidos > 0:
         print(f"     [ALERTA] Encontrados {invalidos} registros com CNPJ matematicamente inválido.")
 
     # 3. Enriquecimento (Usa src/enricher.py)
-    df_enriched = enrich_data_with_cadop(df)
+    df_enriched = enrich_data_with_cadop(df, memo)
 
     # 4. Agregação (Usa src/aggregator.py)
     df_final = calculate_statistics(df_enriched)
@@ -69,6 +89,8 @@ def main():
     # 5. Salvamento
     print(f"  -> Salvando resultado em: {OUTPUT_FILE}")
     df_final.to_csv(OUTPUT_FILE, index=False, sep=';', encoding='utf-8-sig')
+    if not memo.save():
+        print(f"     [AVISO] Não foi possível gravar o memo de CNPJs em: {MEMO_PATH}")
 
     print("\n======================================================")
     print("   SUCESSO! Arquivo 'despesas_agregadas.csv' gerado.")
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Raiz do repositório no sys.path, uma única vez para todo o pacote 'src': os módulos
+# daqui importam os utilitários compartilhados entre os Testes e a API ('shared').
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
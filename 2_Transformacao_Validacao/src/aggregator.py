@@ -24,7 +24,8 @@ def calculate_statistics(df):
     agg_cols = {'Valor Despesas': ['sum', 'mean', 'std', 'count']}
     
     # GroupBy
-    resultado = df.groupby(group_cols).agg(agg_cols).reset_index()
+    # observed=True: com RazaoSocial categórica (input Parquet), agrupa só as combinações existentes
+    resultado = df.groupby(group_cols, observed=True).agg(agg_cols).reset_index()
     
     # Achatando as colunas (MultiIndex -> Colunas simples)
     # A ordem aqui tem que bater com group_cols + agg_cols
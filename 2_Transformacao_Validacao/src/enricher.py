@@ -1,54 +1,34 @@
-import pandas as pd
-import os
-import io
+# O cadastro CADOP local fica na pasta auxiliar do Teste 1 (ver shared/cadop.py)
+from . import ROOT_DIR
+from shared.cnpj import CnpjMemo
+from shared.cadop import CadopRegistry, registry_dir
+from shared.compact import compact_frame
 
-CADOP_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/Relatorio_cadop.csv"
-
-def enrich_data_with_cadop(df_despesas):
+def enrich_data_with_cadop(df_despesas, memo=None):
     """
-    Realiza o download do CADOP, SALVA O ARQUIVO LIMPO (requisito Teste 3)
+    Atualiza o CADOP local (download condicional), SALVA O ARQUIVO LIMPO (requisito Teste 3)
     e faz o Left Join com as despesas.
-    Retorna o DataFrame enriquecido com UF e Modalidade.
+    A limpeza dos CNPJs passa pelo memo (uma vez por valor distinto).
+    Retorna o DataFrame enriquecido com UF e Modalidade (categóricas, esquema compacto).
     """
-    print("  -> [ENRICHER] Baixando e processando CADOP...")
-    
-    try:
-        # 1. Download e Leitura com Estratégia de Encoding
-        # Tenta UTF-8 primeiro (Padrão Web). Se der erro, tenta Latin-1.
-        try:
-            cadop = pd.read_csv(CADOP_URL, sep=';', encoding='utf-8', dtype=str, on_bad_lines='skip')
-        except UnicodeDecodeError:
-            print("     [INFO] UTF-8 falhou. Tentando Latin-1...")
-            cadop = pd.read_csv(CADOP_URL, sep=';', encoding='latin1', dtype=str, on_bad_lines='skip')
-        except Exception:
-            # Fallback final para 'cp1252' (comum no Windows)
-            cadop = pd.read_csv(CADOP_URL, sep=';', encoding='cp1252', dtype=str, on_bad_lines='skip')
+    print("  -> [ENRICHER] Atualizando cadastro CADOP...")
+    memo = memo or CnpjMemo()
 
-        # 2. Normalização de Colunas
-        cadop.columns = cadop.columns.str.strip().str.upper()
-        
-        # 3. Busca dinâmica de colunas (Resiliência contra mudança de nomes)
-        try:
-            col_cnpj = next(c for c in cadop.columns if 'CNPJ' in c)
-            col_reg = next(c for c in cadop.columns if 'REGISTRO' in c)
-            col_uf = next(c for c in cadop.columns if 'UF' in c)
-            col_mod = next(c for c in cadop.columns if 'MODALIDADE' in c)
-            col_razao = next(c for c in cadop.columns if 'RAZAO' in c) # Adicionado para o Teste 3
-        except StopIteration:
-            print("     [ERRO] Colunas esperadas do CADOP não encontradas. Pulando enriquecimento.")
+    try:
+        # 1. Cadastro já tipado e indexado por CNPJ: só é baixado se mudou no servidor
+        # e só é reparseado se o CSV local mudou
+        registry = CadopRegistry(registry_dir(ROOT_DIR)).refresh()
+        if registry.empty:
+            print("     [ERRO] CADOP indisponível (sem rede e sem cópia local). Pulando enriquecimento.")
             df_despesas['UF'] = 'N/I'
             df_despesas['Modalidade'] = 'Desconhecida'
             return df_despesas
+        print(f"     {len(registry.operadoras)} operadoras ({registry.status}, encoding {registry.meta.get('encoding')}).")
+        if registry.meta.get('fallback_rows'):
+            print(f"     [AVISO] {registry.meta['fallback_rows']} linhas do CADOP decodificadas com fallback (Latin-1).")
 
-        # 4. Limpeza e Seleção
-        cadop_clean = cadop[[col_cnpj, col_reg, col_razao, col_uf, col_mod]].copy()
-        cadop_clean.columns = ['CNPJ', 'RegistroANS', 'RazaoSocial', 'UF', 'Modalidade']
-        
-        # Remove não numéricos do CNPJ para garantir o match
-        cadop_clean['CNPJ'] = cadop_clean['CNPJ'].str.replace(r'\D', '', regex=True)
-        
-        # Remove duplicatas (mantém a primeira ocorrência encontrada)
-        cadop_clean = cadop_clean.drop_duplicates(subset=['CNPJ'])
+        # 2. Uma linha por CNPJ (mantém a primeira ocorrência encontrada)
+        cadop_clean = registry.operadoras_por_cnpj()
 
         # Calcula o caminho da pasta 'data' dentro do módulo 2 (sobe um nível de src/)
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -58,31 +38,24 @@ def enrich_data_with_cadop(df_despesas):
         # Salvamos com encoding utf-8-sig para evitar problemas no SQL depois
         cadop_clean.to_csv(output_path, index=False, sep=';', encoding='utf-8-sig')
 
-        # 5. Preparação da chave no DF principal
-        df_despesas['CNPJ_Clean'] = df_despesas['CNPJ'].str.replace(r'\D', '', regex=True)
+        # 3. Preparação da chave no DF principal
+        cnpj_clean = memo.clean(df_despesas['CNPJ'])
 
-        # 6. O JOIN (Left)
-        print("  -> [ENRICHER] Cruzando tabelas (Merge)...")
-        # Fazemos o merge apenas com as colunas necessárias para o enriquecimento
-        df_merged = df_despesas.merge(
-            cadop_clean[['CNPJ', 'RegistroANS', 'UF', 'Modalidade']], 
-            left_on='CNPJ_Clean', 
-            right_on='CNPJ', 
-            how='left', 
-            suffixes=('', '_cadop')
-        )
-        
-        # 7. Fallback para nulos (Preenche quem não deu match)
+        # 4. O JOIN (Left), pelo índice por CNPJ do cadastro: mesma ordem e quantidade de linhas
+        print("  -> [ENRICHER] Cruzando tabelas (índice por CNPJ)...")
+        cadop_data = registry.lookup_cnpj(cnpj_clean)
+        df_merged = df_despesas.copy()
+        for col in ['RegistroANS', 'UF', 'Modalidade']:
+            df_merged[col] = cadop_data[col].astype(object)
+
+        # 5. Fallback para nulos (Preenche quem não deu match)
         df_merged['UF'] = df_merged['UF'].fillna('N/I')
         df_merged['Modalidade'] = df_merged['Modalidade'].fillna('Desconhecida')
 
-        # Limpeza da coluna auxiliar usada apenas para o join
-        if 'CNPJ_Clean' in df_merged.columns:
-            df_merged.drop(columns=['CNPJ_Clean'], inplace=True)
-            
-        return df_merged
+        # UF e Modalidade (já preenchidas) também ficam categóricas
+        return compact_frame(df_merged)
 
     except Exception as e:
         print(f"     [ERRO CRÍTICO] Falha no enriquecimento: {e}")
         # Retorna o original para não quebrar o pipeline
-        return df_despesas
\ No newline at end of file
+        return df_despesas
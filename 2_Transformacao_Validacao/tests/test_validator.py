@@ -1,11 +1,57 @@
 import unittest
 import sys
 import os
+import random
+import re
+import shutil
+import tempfile
 
 # Adiciona o diretório 'src' ao path para conseguir importar o validator
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.validator import validate_cnpj
+from src.validator import validate_cnpj, validate_cnpj_batch
+from shared.cnpj import CnpjMemo, clean_cnpjs
+
+# Implementação anterior (por linha), usada como referência de equivalência
+def validate_cnpj_referencia(cnpj):
+    cnpj = re.sub(r'[^0-9]', '', str(cnpj))
+    if len(cnpj) != 14 or len(set(cnpj)) == 1:
+        return False
+    pesos1 = [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+    digito1 = 11 - (sum(int(cnpj[i]) * pesos1[i] for i in range(12)) % 11)
+    if (0 if digito1 >= 10 else digito1) != int(cnpj[12]):
+        return False
+    pesos2 = [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+    digito2 = 11 - (sum(int(cnpj[i]) * pesos2[i] for i in range(13)) % 11)
+    return (0 if digito2 >= 10 else digito2) == int(cnpj[13])
+
+# Gera um CNPJ válido a partir de 12 dígitos aleatórios
+def gerar_cnpj_valido(rng):
+    base = [rng.randint(0, 9) for _ in range(12)]
+    for pesos in ([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]):
+        digito = 11 - (sum(d * p for d, p in zip(base, pesos)) % 11)
+        base.append(0 if digito >= 10 else digito)
+    return ''.join(map(str, base))
+
+# Amostra mista: válidos (com e sem máscara), dígito alterado, tamanhos errados, sequências e nulos
+def gerar_amostra(rng, n):
+    amostra = []
+    for _ in range(n):
+        cnpj = gerar_cnpj_valido(rng)
+        caso = rng.randint(0, 6)
+        if caso == 1:
+            cnpj = f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}"
+        elif caso == 2:
+            pos = rng.randint(0, 13)
+            cnpj = cnpj[:pos] + str((int(cnpj[pos]) + rng.randint(1, 9)) % 10) + cnpj[pos + 1:]
+        elif caso == 3:
+            cnpj = cnpj[:rng.randint(0, 13)] if rng.random() < 0.5 else cnpj + str(rng.randint(0, 9))
+        elif caso == 4:
+            cnpj = str(rng.randint(0, 9)) * 14
+        elif caso == 5:
+            cnpj = rng.choice([None, float('nan'), "", "N/I", int(cnpj)])
+        amostra.append(cnpj)
+    return amostra
 
 class TestCNPJValidator(unittest.TestCase):
 
@@ -28,5 +74,75 @@ class TestCNPJValidator(unittest.TestCase):
         self.assertFalse(validate_cnpj(""))
         self.assertFalse(validate_cnpj(None))
 
+class TestCNPJValidatorLote(unittest.TestCase):
+
+    def test_equivalencia_com_implementacao_por_linha(self):
+        amostra = gerar_amostra(random.Random(42), 5000)
+        esperado = [validate_cnpj_referencia(c) for c in amostra]
+        self.assertEqual(validate_cnpj_batch(amostra).tolist(), esperado)
+        self.assertEqual([validate_cnpj(c) for c in amostra[:500]], esperado[:500])
+        # A amostra precisa exercitar os dois lados
+        self.assertTrue(0 < sum(esperado) < len(esperado))
+
+    def test_series_com_indice_e_tipo_str(self):
+        import pandas as pd
+        serie = pd.Series(["06.990.590/0001-23", None, "06990590000100"], index=[10, 5, 7], dtype="str")
+        self.assertEqual(validate_cnpj_batch(serie).tolist(), [True, False, False])
+
+    def test_lote_vazio_ou_sem_candidatos(self):
+        self.assertEqual(validate_cnpj_batch([]).tolist(), [])
+        self.assertEqual(validate_cnpj_batch(["123", None]).tolist(), [False, False])
+
+class TestCnpjMemo(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'data', 'cnpj_memo.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    # Mesmo resultado da limpeza e da validação linha a linha, com poucos valores distintos
+    def test_equivalencia(self):
+        import pandas as pd
+        distintos = gerar_amostra(random.Random(7), 300)
+        rng = random.Random(8)
+        serie = pd.Series([rng.choice(distintos) for _ in range(5000)], index=range(5000, 0, -1), dtype=object)
+
+        memo = CnpjMemo()
+        limpo, valido = memo.resolve(serie)
+        self.assertEqual(valido.tolist(), [validate_cnpj_referencia(c) for c in serie])
+        esperado = [None if c is None or c != c else re.sub(r'[^0-9]', '', str(c)) for c in serie]
+        self.assertEqual(limpo.tolist(), esperado)
+        self.assertTrue(limpo.index.equals(serie.index))
+        self.assertLessEqual(memo.new_entries, 300)
+
+        # Coluna de texto do pandas mantém o tipo (e os nulos)
+        texto = pd.Series(["06.990.590/0001-23", None], dtype="str")
+        self.assertEqual(memo.clean(texto).dtype, texto.dtype)
+        self.assertTrue(memo.clean(texto).equals(clean_cnpjs(texto)))
+
+    # Gravado e relido, o memo não recalcula nada; o arquivo respeita o limite de entradas
+    def test_persistencia_e_limite(self):
+        memo = CnpjMemo(self.path, max_entries=3)
+        memo.resolve(["06.990.590/0001-23", "06990590000100", "", "N/I"])
+        self.assertTrue(memo.save())
+
+        relido = CnpjMemo(self.path, max_entries=3)
+        self.assertEqual(len(relido.entries), 3)
+        self.assertEqual(relido.entries["06.990.590/0001-23"], ("06990590000123", True))
+
+        # As entradas usadas na execução atual têm prioridade na hora de cortar
+        relido.resolve(["12.345.678/0001-95"])
+        self.assertTrue(relido.save())
+        self.assertIn("12.345.678/0001-95", CnpjMemo(self.path).entries)
+        self.assertEqual(relido.new_entries, 0)
+
+    def test_arquivo_invalido_e_ignorado(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write("outra;coisa\n1;2\n")
+        self.assertEqual(CnpjMemo(self.path).entries, {})
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
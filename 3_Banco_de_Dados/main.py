@@ -0,0 +1,39 @@
+import sys
+import os
+import argparse
+
+# Adiciona o diretório atual ao path para garantir que o python encontre o pacote 'src'
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.loader import load_star_schema, DEFAULT_DB, READ_CHUNK_ROWS
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Carga do esquema estrela (Teste 3) em SQLite local")
+    parser.add_argument("--db", default=DEFAULT_DB,
+                        help=f"Arquivo do banco SQLite (padrão: {os.path.basename(DEFAULT_DB)} nesta pasta)")
+    parser.add_argument("--completo", action="store_true",
+                        help="Recarrega todos os trimestres, mesmo os que não mudaram")
+    parser.add_argument("--chunksize", type=int, default=READ_CHUNK_ROWS,
+                        help=f"Linhas do consolidado lidas por bloco (padrão: {READ_CHUNK_ROWS})")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    print("===================================================")
+    print("   INICIANDO TESTE 3: CARGA DO BANCO (SQLITE)")
+    print("===================================================")
+
+    try:
+        report = load_star_schema(db_path=args.db, full=args.completo, chunk_rows=args.chunksize)
+    except Exception as e:
+        print(f"ERRO CRÍTICO NA CARGA: {e}")
+        return
+
+    report.imprimir()
+    print("\n======================================================")
+    print(f"   SUCESSO! Banco '{args.db}' atualizado.")
+    print("======================================================")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+import os
+import time
+import zipfile
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from shared.columnar import find_parquet_dataset, iter_consolidado_parquet
+from shared.star_schema import connect, create_indexes, create_tables
+from shared.cnpj import CnpjMemo, memo_path
+from shared.compact import csv_dtypes
+
+# CONFIGURAÇÃO
+CURRENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE_DIR = os.path.dirname(CURRENT_DIR)
+DEFAULT_DB = os.path.join(CURRENT_DIR, 'teste3.sqlite')
+FILE_NAME = "consolidado_despesas.csv"
+ZIP_NAME = "consolidado_despesas.zip"
+
+# Linhas lidas do consolidado por bloco
+READ_CHUNK_ROWS = 250000
+# Linhas por INSERT (multi-row VALUES): ~1,6x mais rápido que um INSERT por linha no executemany
+ROWS_PER_INSERT = 50
+# Se a carga trouxer pelo menos esta fração das linhas já existentes, os índices de
+# fato_despesas são removidos e recriados no final (mais rápido que atualizá-los linha a linha)
+REBUILD_INDEX_RATIO = 0.2
+
+# Controle das partições (Ano, Trimestre) já carregadas, com a assinatura do conteúdo
+CONTROL_TABLE = """CREATE TABLE IF NOT EXISTS carga_particoes (
+    ano INTEGER NOT NULL,
+    trimestre INTEGER NOT NULL,
+    linhas INTEGER NOT NULL,
+    assinatura TEXT NOT NULL,
+    carregado_em TEXT NOT NULL,
+    PRIMARY KEY (ano, trimestre)
+)"""
+# Índice da carga: localizar uma partição para substituí-la
+LOADER_INDEXES = ["CREATE INDEX IF NOT EXISTS idx_periodo ON fato_despesas (ano, trimestre)"]
+FATO_INDEXES = ['idx_data', 'idx_cnpj', 'idx_periodo']
+
+FATO_COLS = ['cnpj_operadora', 'data_evento', 'trimestre', 'ano', 'valor_despesa']
+
+
+# Arquivos gerados pelos Testes 1 e 2
+def source_paths(base_dir=BASE_DIR):
+    teste1 = os.path.join(base_dir, '1_Leitura_Transformacao_Dados')
+    teste2 = os.path.join(base_dir, '2_Transformacao_Validacao')
+    return {
+        'ops': os.path.join(teste2, 'data', 'operadoras_ativas.csv'),
+        'desp_parquet': find_parquet_dataset(teste1),
+        'desp': os.path.join(teste1, FILE_NAME),
+        'desp_zip': os.path.join(teste1, ZIP_NAME),
+        'agg': os.path.join(teste2, 'despesas_agregadas.csv'),
+    }
+
+
+# Lê o consolidado em blocos: o dataset Parquet (já tipado) se existir, senão o CSV ou o ZIP
+# (com as colunas de texto repetidas já como categorias, esquema de shared/compact.py)
+def iter_consolidado(paths, chunk_rows=READ_CHUNK_ROWS):
+    if paths['desp_parquet']:
+        yield from iter_consolidado_parquet(paths['desp_parquet'], chunk_rows)
+    elif os.path.exists(paths['desp']):
+        with pd.read_csv(paths['desp'], sep=';', encoding='utf-8-sig', dtype=csv_dtypes(), chunksize=chunk_rows) as reader:
+            yield from reader
+    elif os.path.exists(paths['desp_zip']):
+        with zipfile.ZipFile(paths['desp_zip']) as z, z.open(FILE_NAME) as f:
+            with pd.read_csv(f, sep=';', encoding='utf-8-sig', dtype=csv_dtypes(), chunksize=chunk_rows) as reader:
+                yield from reader
+    else:
+        raise FileNotFoundError("Consolidado de despesas não encontrado no Teste 1.")
+
+
+# Valores monetários: com vírgula, formato BR (1.234,56); sem vírgula, formato US (1234.56),
+# que é como o Teste 1 grava o consolidado
+def parse_valores(serie):
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype('float64').fillna(0.0)
+    texto = serie.astype('string').str.strip()
+    br = texto.str.contains(',', regex=False).fillna(False)
+    texto = texto.where(~br, texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    return pd.to_numeric(texto, errors='coerce').fillna(0.0).astype('float64')
+
+
+# Converte um bloco do consolidado nas colunas de fato_despesas (as mesmas conversões do
+# 2_import_data.sql: CNPJ só com dígitos, data DD/MM/AAAA -> ISO, valor numérico).
+# Com o CNPJ categórico, o memo resolve as categorias e só o resultado vira texto.
+def to_fatos(df, memo):
+    col_data = next((c for c in df.columns if 'DATA' in c.upper()), None)
+    data = None
+    if col_data:
+        data = pd.to_datetime(df[col_data], format='%d/%m/%Y', errors='coerce').dt.strftime('%Y-%m-%d')
+    return pd.DataFrame({
+        'cnpj_operadora': memo.clean(df['CNPJ']).astype('string'),
+        'data_evento': data,
+        'trimestre': pd.to_numeric(df['Trimestre'], errors='coerce').astype('Int64'),
+        'ano': pd.to_numeric(df['Ano'], errors='coerce').astype('Int64'),
+        'valor_despesa': parse_valores(df['Valor Despesas']),
+    }, index=df.index)
+
+
+# Assinatura de cada partição (Ano, Trimestre) de um bloco: linhas e soma dos hashes das linhas
+# (em duas metades de 32 bits). A soma não depende da ordem e se acumula bloco a bloco.
+def partition_signatures(fatos):
+    hashes = pd.util.hash_pandas_object(fatos[['cnpj_operadora', 'data_evento', 'valor_despesa']], index=False).to_numpy()
+    partes = pd.DataFrame({
+        'ano': fatos['ano'], 'trimestre': fatos['trimestre'],
+        'baixo': (hashes & np.uint64(0xFFFFFFFF)).astype('int64'),
+        'alto': (hashes >> np.uint64(32)).astype('int64'),
+    })
+    grupos = partes.groupby(['ano', 'trimestre']).agg(linhas=('baixo', 'size'), baixo=('baixo', 'sum'), alto=('alto', 'sum'))
+    return {(int(a), int(t)): (int(r.linhas), int(r.baixo), int(r.alto)) for (a, t), r in zip(grupos.index, grupos.itertuples())}
+
+
+# Nulos do pandas viram None (o sqlite3 não conhece pd.NA)
+def _valores(serie):
+    return serie.astype(object).where(serie.notna(), None).tolist()
+
+
+# Insere as linhas com INSERTs de ROWS_PER_INSERT linhas cada (o resto vai linha a linha)
+def insert_rows(conn, table, cols, rows, rows_per_insert=ROWS_PER_INSERT):
+    rows = list(rows)
+    unidade = "(" + ", ".join("?" * len(cols)) + ")"
+    prefixo = f"INSERT INTO {table} ({', '.join(cols)}) VALUES "
+    cheios = len(rows) // rows_per_insert * rows_per_insert
+    if cheios:
+        conn.executemany(prefixo + ", ".join([unidade] * rows_per_insert),
+                         (tuple(chain.from_iterable(rows[i:i + rows_per_insert])) for i in range(0, cheios, rows_per_insert)))
+    if cheios < len(rows):
+        conn.executemany(prefixo + unidade, rows[cheios:])
+    return len(rows)
+
+
+# Cronômetro e contadores da carga, por tabela
+class LoadReport:
+    def __init__(self):
+        self.tabelas = {}
+        self.carregadas, self.substituidas, self.puladas, self.removidas = [], [], [], []
+        self.ignoradas = 0
+        self.indices_segundos = 0.0
+        self.inicio = time.perf_counter()
+
+    def registrar(self, tabela, linhas, segundos):
+        self.tabelas[tabela] = {"linhas": linhas, "segundos": segundos}
+
+    def imprimir(self):
+        for tabela, info in self.tabelas.items():
+            taxa = info["linhas"] / info["segundos"] if info["segundos"] > 0 else 0
+            print(f"  -> {tabela}: {info['linhas']} linhas em {info['segundos']:.2f}s ({taxa:,.0f} linhas/s)")
+        rotulo = lambda ps: ', '.join(f"{t}T{a}" for a, t in ps) or '-'
+        print(f"  -> Trimestres novos: {rotulo(self.carregadas)} | substituídos: {rotulo(self.substituidas)} | "
+              f"sem mudança (pulados): {rotulo(self.puladas)} | fora da fonte (removidos): {rotulo(self.removidas)}")
+        if self.ignoradas:
+            print(f"     [ALERTA] {self.ignoradas} linhas sem Ano/Trimestre válidos foram ignoradas.")
+        print(f"  -> Índices: {self.indices_segundos:.2f}s | Total: {time.perf_counter() - self.inicio:.2f}s")
+
+
+# ---------------------------
+# 1. DIMENSÃO: OPERADORAS (upsert por registro ANS)
+# ---------------------------
+def load_operadoras(conn, path_ops, memo):
+    df = pd.read_csv(path_ops, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    df.columns = [c.strip().upper() for c in df.columns]
+    col = lambda nome: next((c for c in df.columns if nome in c), None)
+    registros = df[col('REGISTRO')]
+    linhas = list(zip(
+        registros, memo.clean(df[col('CNPJ')]), df[col('RAZAO')],
+        df[col('MODALIDADE')] if col('MODALIDADE') else [''] * len(df), df[col('UF')] if col('UF') else [''] * len(df),
+    ))
+    # Linhas sem registro ANS não têm chave para o upsert: ficam de fora (e da contagem)
+    linhas = [l for l in linhas if l[0]]
+    conn.executemany(
+        """INSERT INTO dim_operadoras (registro_ans, cnpj, razao_social, modalidade, uf)
+           VALUES (?, ?, ?, NULLIF(?, ''), NULLIF(?, ''))
+           ON CONFLICT (registro_ans) DO UPDATE SET cnpj = excluded.cnpj, razao_social = excluded.razao_social,
+               modalidade = excluded.modalidade, uf = excluded.uf""",
+        linhas
+    )
+    return len(linhas)
+
+
+# ---------------------------
+# 2. FATO: DESPESAS (por partição Ano/Trimestre)
+# ---------------------------
+# 1ª passada: assinatura de cada partição da fonte. 2ª passada (só se algo mudou): insere
+# apenas as partições novas ou alteradas; as alteradas têm as linhas antigas removidas antes.
+# Partições carregadas que saíram da fonte (ex: a janela de trimestres do Teste 1 andou) são apagadas.
+def load_despesas(conn, paths, report, memo, full=False, chunk_rows=READ_CHUNK_ROWS):
+    assinaturas = {}
+    for bloco in iter_consolidado(paths, chunk_rows):
+        fatos = to_fatos(bloco, memo).dropna(subset=['ano', 'trimestre'])
+        for chave, (linhas, baixo, alto) in partition_signatures(fatos).items():
+            atual = assinaturas.get(chave, (0, 0, 0))
+            assinaturas[chave] = (atual[0] + linhas, atual[1] + baixo, atual[2] + alto)
+    assinaturas = {k: (v[0], f"{v[0]}:{v[1] & 0xFFFFFFFFFFFF:x}:{v[2] & 0xFFFFFFFFFFFF:x}") for k, v in assinaturas.items()}
+
+    carregadas = {(a, t): assinatura for a, t, assinatura in conn.execute("SELECT ano, trimestre, assinatura FROM carga_particoes")}
+    report.removidas = sorted(set(carregadas) - set(assinaturas))
+    for ano, trimestre in report.removidas:
+        conn.execute("DELETE FROM fato_despesas WHERE ano = ? AND trimestre = ?", (ano, trimestre))
+        conn.execute("DELETE FROM carga_particoes WHERE ano = ? AND trimestre = ?", (ano, trimestre))
+
+    pendentes = set()
+    for chave, (_, assinatura) in sorted(assinaturas.items()):
+        if chave not in carregadas:
+            report.carregadas.append(chave)
+        elif full or carregadas[chave] != assinatura:
+            report.substituidas.append(chave)
+        else:
+            report.puladas.append(chave)
+            continue
+        pendentes.add(chave)
+    if not pendentes:
+        return 0
+
+    for ano, trimestre in report.substituidas:
+        conn.execute("DELETE FROM fato_despesas WHERE ano = ? AND trimestre = ?", (ano, trimestre))
+        conn.execute("DELETE FROM carga_particoes WHERE ano = ? AND trimestre = ?", (ano, trimestre))
+
+    # Muitas linhas novas em relação ao que já existe: índices só depois da carga
+    existentes = conn.execute("SELECT COALESCE(SUM(linhas), 0) FROM carga_particoes").fetchone()[0]
+    novas = sum(assinaturas[k][0] for k in pendentes)
+    if novas >= REBUILD_INDEX_RATIO * existentes:
+        for nome in FATO_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {nome}")
+
+    total = 0
+    chaves = pd.MultiIndex.from_tuples(sorted(pendentes), names=['ano', 'trimestre'])
+    for bloco in iter_consolidado(paths, chunk_rows):
+        fatos = to_fatos(bloco, memo)
+        validas = fatos['ano'].notna() & fatos['trimestre'].notna()
+        report.ignoradas += int((~validas).sum())
+        fatos = fatos[validas]
+        fatos = fatos[pd.MultiIndex.from_arrays([fatos['ano'], fatos['trimestre']]).isin(chaves)]
+        total += insert_rows(conn, 'fato_despesas', FATO_COLS, zip(*(_valores(fatos[c]) for c in FATO_COLS)))
+
+    agora = time.strftime('%Y-%m-%dT%H:%M:%S')
+    conn.executemany("INSERT INTO carga_particoes (ano, trimestre, linhas, assinatura, carregado_em) VALUES (?, ?, ?, ?, ?)",
+                     [(a, t, assinaturas[(a, t)][0], assinaturas[(a, t)][1], agora) for a, t in sorted(pendentes)])
+    return total
+
+
+# ---------------------------
+# 3. AGREGADA: substituída por inteiro (tabela pequena, recalculada pelo Teste 2 a cada execução)
+# ---------------------------
+def load_agregados(conn, path_agg):
+    df = pd.read_csv(path_agg, sep=';', encoding='utf-8-sig', dtype=str)
+    colunas = ['RazaoSocial', 'RegistroANS', 'Modalidade', 'UF', 'Despesa_Total', 'Media_Trimestral',
+               'Desvio_Padrao', 'Qtd_Registros']
+    df = df.reindex(columns=colunas)
+    for c in ['Despesa_Total', 'Media_Trimestral', 'Desvio_Padrao']:
+        df[c] = parse_valores(df[c])
+    df['Qtd_Registros'] = pd.to_numeric(df['Qtd_Registros'], errors='coerce').astype('Int64')
+
+    conn.execute("DELETE FROM agg_despesas_uf")
+    conn.executemany(
+        "INSERT OR REPLACE INTO agg_despesas_uf (razao_social, registro_ans, modalidade, uf, despesa_total, "
+        "media_trimestral, desvio_padrao, qtd_registros) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        zip(*(_valores(df[c]) for c in colunas))
+    )
+    return len(df)
+
+
+# Carrega as saídas dos Testes 1 e 2 no esquema estrela (SQLite), numa única transação:
+# se algo falhar, o banco fica como estava. 'full' recarrega todas as partições.
+# Os CNPJs são limpos via memo do Teste 2 (uma vez por valor distinto, nas duas passadas).
+def load_star_schema(db_path=DEFAULT_DB, base_dir=BASE_DIR, full=False, chunk_rows=READ_CHUNK_ROWS):
+    paths = source_paths(base_dir)
+    report = LoadReport()
+    memo = CnpjMemo(memo_path(base_dir))
+    conn = connect(db_path)
+    try:
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-200000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        # Transação explícita: no modo legado do sqlite3 o DDL (CREATE/DROP INDEX) não abre
+        # transação sozinho e seria gravado na hora, fora do rollback
+        conn.execute("BEGIN")
+        create_tables(conn)
+        conn.execute(CONTROL_TABLE)
+
+        if os.path.exists(paths['ops']):
+            inicio = time.perf_counter()
+            report.registrar('dim_operadoras', load_operadoras(conn, paths['ops'], memo), time.perf_counter() - inicio)
+        else:
+            print(f"  -> [AVISO] Operadoras não encontradas: {paths['ops']}")
+
+        inicio = time.perf_counter()
+        report.registrar('fato_despesas', load_despesas(conn, paths, report, memo, full, chunk_rows), time.perf_counter() - inicio)
+
+        if os.path.exists(paths['agg']):
+            inicio = time.perf_counter()
+            report.registrar('agg_despesas_uf', load_agregados(conn, paths['agg']), time.perf_counter() - inicio)
+        else:
+            print(f"  -> [AVISO] Agregados não encontrados: {paths['agg']}")
+
+        inicio = time.perf_counter()
+        create_indexes(conn)
+        for ddl in LOADER_INDEXES:
+            conn.execute(ddl)
+        conn.commit()
+        conn.execute("ANALYZE")
+        report.indices_segundos = time.perf_counter() - inicio
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    if not memo.save():
+        print(f"  -> [AVISO] Não foi possível gravar o memo de CNPJs em: {memo.path}")
+    return report
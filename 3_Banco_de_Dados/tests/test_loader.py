@@ -0,0 +1,168 @@
+import unittest
+import sys
+import os
+import shutil
+import sqlite3
+import tempfile
+
+# Adiciona a raiz do módulo ao path para conseguir importar o pacote 'src'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd
+from src import loader
+
+CABECALHO = "CNPJ;RazaoSocial;Trimestre;Ano;Valor Despesas\n"
+
+# Saídas mínimas dos Testes 1 e 2 (o consolidado como o Teste 1 grava: valores em formato US)
+def criar_base(base_dir, linhas_despesas):
+    os.makedirs(os.path.join(base_dir, '1_Leitura_Transformacao_Dados'))
+    os.makedirs(os.path.join(base_dir, '2_Transformacao_Validacao', 'data'))
+    with open(os.path.join(base_dir, '2_Transformacao_Validacao', 'data', 'operadoras_ativas.csv'), 'w', encoding='utf-8-sig') as f:
+        f.write("CNPJ;RegistroANS;RazaoSocial;UF;Modalidade\n")
+        f.write("11111111000111;111111;OPERADORA ALFA;SP;Medicina de Grupo\n")
+        f.write("22222222000122;222222;OPERADORA BETA;;Cooperativa Médica\n")
+    with open(os.path.join(base_dir, '2_Transformacao_Validacao', 'despesas_agregadas.csv'), 'w', encoding='utf-8-sig') as f:
+        f.write("RazaoSocial;RegistroANS;Modalidade;UF;Despesa_Total;Media_Trimestral;Desvio_Padrao;Qtd_Registros\n")
+        f.write("OPERADORA ALFA;111111;Medicina de Grupo;SP;30.0;15.0;7.07;2\n")
+        f.write("OPERADORA SEM CADASTRO;N/I;Desconhecida;N/I;5.0;5.0;0.0;1\n")
+        f.write("OUTRA SEM CADASTRO;N/I;Desconhecida;N/I;7.0;7.0;0.0;1\n")
+    escrever_consolidado(base_dir, linhas_despesas)
+
+def escrever_consolidado(base_dir, linhas):
+    with open(os.path.join(base_dir, '1_Leitura_Transformacao_Dados', 'consolidado_despesas.csv'), 'w', encoding='utf-8-sig') as f:
+        f.write(CABECALHO + "".join(linhas))
+
+LINHAS = [
+    "11.111.111/0001-11;OPERADORA ALFA;1;2024;10.5\n",
+    "22222222000122;OPERADORA BETA;1;2024;1.234,56\n",
+    "11111111000111;OPERADORA ALFA;2;2024;20.0\n",
+    "22222222000122;OPERADORA BETA;;2024;99.0\n",
+]
+
+class TestCargaSQLite(unittest.TestCase):
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.base_dir, 'teste3.sqlite')
+        criar_base(self.base_dir, LINHAS)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def carregar(self, **kwargs):
+        return loader.load_star_schema(db_path=self.db, base_dir=self.base_dir, **kwargs)
+
+    def consultar(self, sql):
+        with sqlite3.connect(self.db) as conn:
+            return conn.execute(sql).fetchall()
+
+    def test_carga_inicial(self):
+        report = self.carregar()
+        self.assertEqual(report.carregadas, [(2024, 1), (2024, 2)])
+        self.assertEqual(report.ignoradas, 1)
+        self.assertEqual(report.tabelas['fato_despesas']['linhas'], 3)
+
+        self.assertEqual(self.consultar("SELECT cnpj_operadora, trimestre, ano, valor_despesa FROM fato_despesas ORDER BY id"), [
+            ('11111111000111', 1, 2024, 10.5), ('22222222000122', 1, 2024, 1234.56), ('11111111000111', 2, 2024, 20.0)])
+        self.assertEqual(self.consultar("SELECT registro_ans, cnpj, uf FROM dim_operadoras ORDER BY registro_ans"),
+                         [('111111', '11111111000111', 'SP'), ('222222', '22222222000122', None)])
+        # Operadoras 'N/I' distintas não colidem na chave da agregada
+        self.assertEqual(self.consultar("SELECT COUNT(*), SUM(despesa_total) FROM agg_despesas_uf"), [(3, 42.0)])
+
+        indices = {nome for (nome,) in self.consultar("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue({'idx_cnpj', 'idx_data', 'idx_uf', 'idx_periodo'} <= indices)
+
+    # Reexecução sem mudanças não insere nada; só os trimestres novos ou alterados entram
+    def test_carga_incremental(self):
+        self.carregar()
+        report = self.carregar()
+        self.assertEqual(report.puladas, [(2024, 1), (2024, 2)])
+        self.assertEqual(report.tabelas['fato_despesas']['linhas'], 0)
+        self.assertEqual(self.consultar("SELECT COUNT(*) FROM fato_despesas"), [(3,)])
+
+        escrever_consolidado(self.base_dir, LINHAS[:2] + [
+            "11111111000111;OPERADORA ALFA;2;2024;25.0\n",
+            "11111111000111;OPERADORA ALFA;3;2024;30.0\n",
+        ])
+        report = self.carregar()
+        self.assertEqual(report.puladas, [(2024, 1)])
+        self.assertEqual(report.substituidas, [(2024, 2)])
+        self.assertEqual(report.carregadas, [(2024, 3)])
+        self.assertEqual(report.tabelas['fato_despesas']['linhas'], 2)
+        self.assertEqual(self.consultar("SELECT trimestre, SUM(valor_despesa) FROM fato_despesas GROUP BY trimestre"),
+                         [(1, 1245.06), (2, 25.0), (3, 30.0)])
+
+        # --completo recarrega tudo, sem duplicar
+        report = self.carregar(full=True)
+        self.assertEqual(report.substituidas, [(2024, 1), (2024, 2), (2024, 3)])
+        self.assertEqual(self.consultar("SELECT COUNT(*) FROM fato_despesas"), [(4,)])
+
+    # Trimestres que saíram da fonte (a janela do Teste 1 andou) são apagados do banco
+    def test_trimestre_fora_da_fonte_removido(self):
+        self.carregar()
+        escrever_consolidado(self.base_dir, [
+            "11111111000111;OPERADORA ALFA;2;2024;20.0\n",
+            "11111111000111;OPERADORA ALFA;3;2024;30.0\n",
+        ])
+        report = self.carregar()
+        self.assertEqual(report.removidas, [(2024, 1)])
+        self.assertEqual(report.puladas, [(2024, 2)])
+        self.assertEqual(report.carregadas, [(2024, 3)])
+        self.assertEqual(self.consultar("SELECT trimestre, COUNT(*) FROM fato_despesas GROUP BY trimestre"), [(2, 1), (3, 1)])
+        self.assertEqual(self.consultar("SELECT ano, trimestre FROM carga_particoes ORDER BY trimestre"), [(2024, 2), (2024, 3)])
+
+        # Mesmo sem nada novo a carregar, a remoção acontece
+        escrever_consolidado(self.base_dir, ["11111111000111;OPERADORA ALFA;3;2024;30.0\n"])
+        report = self.carregar()
+        self.assertEqual(report.removidas, [(2024, 2)])
+        self.assertEqual(report.puladas, [(2024, 3)])
+        self.assertEqual(self.consultar("SELECT trimestre FROM fato_despesas"), [(3,)])
+
+    # Só as operadoras com registro ANS entram no upsert (e na contagem)
+    def test_contagem_operadoras(self):
+        with open(os.path.join(self.base_dir, '2_Transformacao_Validacao', 'data', 'operadoras_ativas.csv'), 'a', encoding='utf-8') as f:
+            f.write("33333333000133;;OPERADORA SEM REGISTRO;RJ;Autogestão\n")
+        report = self.carregar()
+        self.assertEqual(report.tabelas['dim_operadoras']['linhas'], 2)
+        self.assertEqual(self.consultar("SELECT COUNT(*) FROM dim_operadoras"), [(2,)])
+
+    # Falha no meio da carga: o rollback desfaz também a remoção dos índices (DDL na mesma transação)
+    def test_falha_desfaz_tudo(self):
+        self.carregar()
+        os.remove(os.path.join(self.base_dir, '2_Transformacao_Validacao', 'data', 'operadoras_ativas.csv'))
+        escrever_consolidado(self.base_dir, LINHAS[:3] + ["11111111000111;OPERADORA ALFA;3;2024;30.0\n"] * 5)
+        indices = "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%' ORDER BY name"
+        antes = self.consultar(indices)
+
+        insert_original = loader.insert_rows
+        def falhar(*args, **kwargs):
+            raise RuntimeError("falha simulada")
+        loader.insert_rows = falhar
+        try:
+            with self.assertRaises(RuntimeError):
+                self.carregar()
+        finally:
+            loader.insert_rows = insert_original
+
+        self.assertEqual(self.consultar(indices), antes)
+        self.assertEqual(self.consultar("SELECT COUNT(*) FROM fato_despesas"), [(3,)])
+        self.assertEqual(self.consultar("SELECT COUNT(*) FROM carga_particoes"), [(2,)])
+
+    # Blocos pequenos: a assinatura acumulada e a inserção dão o mesmo resultado
+    def test_blocos(self):
+        self.carregar(chunk_rows=1)
+        self.assertEqual(self.consultar("SELECT COUNT(*) FROM fato_despesas"), [(3,)])
+        self.assertEqual(self.carregar().puladas, [(2024, 1), (2024, 2)])
+
+    def test_insercao_multi_linhas(self):
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE t (a INTEGER, b TEXT)")
+        linhas = [(i, str(i)) for i in range(7)]
+        self.assertEqual(loader.insert_rows(conn, 't', ['a', 'b'], linhas, rows_per_insert=3), 7)
+        self.assertEqual(conn.execute("SELECT a, b FROM t ORDER BY a").fetchall(), linhas)
+
+    def test_valores_br_e_us(self):
+        valores = loader.parse_valores(pd.Series(["1.234,56", "1234.56", "10", None, "abc"]))
+        self.assertEqual(valores.tolist(), [1234.56, 1234.56, 10.0, 0.0, 0.0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import pandas as pd
+
+# Mínimo de trimestres acima da média de mercado (Query 3)
+MIN_TRIMESTRES_ACIMA = 2
+
+
+def _rotulo(ano, trimestre):
+    return f"{trimestre}T{ano}"
+
+
+# Equivalentes em memória das três consultas de 3_Banco_de_Dados/3_queries_analiticas.sql.
+# Tudo sai das células (CNPJ, Ano, Trimestre) mantidas durante a carga (ExpenseCells):
+# na montagem calculamos, por operadora, o primeiro e o último trimestre com seus totais,
+# a média de mercado de cada trimestre e os totais por UF. As consultas só ordenam e
+# recortam esses resultados, sem varrer as despesas.
+#
+# Diferenças de semântica em relação ao SQL (documentadas no README):
+# - Query 1 compara o TOTAL do primeiro e do último trimestre (Ano+Trimestre) da operadora;
+#   o SQL pega o valor de uma linha qualquer da data mais antiga/recente e conta trimestres
+#   distintos só pelo número do trimestre.
+# - Query 3 compara o total da operadora no trimestre com a média por operadora do mercado
+#   naquele trimestre e conta trimestres; o SQL compara linha a linha com a média das
+#   linhas e conta linhas acima da média.
+class MarketAnalytics:
+    def __init__(self, celulas, cadastro):
+        # cadastro: CNPJ limpo, RegistroANS, RazaoSocial, UF (junção interna, como no SQL)
+        cadastro = cadastro.drop_duplicates('CNPJ')
+        celulas = celulas.dropna(subset=['Ano', 'Trimestre'])
+        por_trimestre = (celulas.groupby(['CNPJ', 'Ano', 'Trimestre'], observed=True)['total'].sum()
+                         .reset_index().sort_values(['CNPJ', 'Ano', 'Trimestre']))
+
+        self.crescimento = self._build_crescimento(por_trimestre, cadastro)
+        self.ufs = self._build_ufs(por_trimestre, cadastro)
+        self.acima_media = self._build_acima_media(por_trimestre, cadastro)
+
+    # Query 1: primeiro e último trimestre de cada operadora com dados em mais de um trimestre
+    @staticmethod
+    def _build_crescimento(por_trimestre, cadastro):
+        grupos = por_trimestre.groupby('CNPJ', sort=False)
+        limites = pd.DataFrame({
+            'Ano_Inicial': grupos['Ano'].first(), 'Trimestre_Inicial': grupos['Trimestre'].first(),
+            'Valor_Inicial': grupos['total'].first(),
+            'Ano_Final': grupos['Ano'].last(), 'Trimestre_Final': grupos['Trimestre'].last(),
+            'Valor_Final': grupos['total'].last(),
+            'Qtd_Trimestres': grupos.size(),
+        }).reset_index()
+        limites = limites[(limites['Qtd_Trimestres'] > 1) & (limites['Valor_Inicial'] > 0)]
+        limites = limites.merge(cadastro, on='CNPJ', how='inner')
+        limites['Crescimento_Pct'] = ((limites['Valor_Final'] - limites['Valor_Inicial']) / limites['Valor_Inicial'] * 100).round(2)
+        limites['Periodo'] = [f"{_rotulo(a, t)} -> {_rotulo(b, u)}" for a, t, b, u in zip(
+            limites['Ano_Inicial'], limites['Trimestre_Inicial'], limites['Ano_Final'], limites['Trimestre_Final'])]
+        limites = limites.sort_values('Crescimento_Pct', ascending=False, kind='stable')
+        return limites[['RegistroANS', 'RazaoSocial', 'Periodo', 'Valor_Inicial', 'Valor_Final', 'Crescimento_Pct']]
+
+    # Query 2: total por UF, operadoras distintas e média por operadora
+    @staticmethod
+    def _build_ufs(por_trimestre, cadastro):
+        df = por_trimestre.merge(cadastro, on='CNPJ', how='inner')
+        df = df[df['UF'].notna() & (df['UF'] != '')]
+        ufs = df.groupby('UF').agg(Despesa_Total=('total', 'sum'), Qtd_Operadoras=('CNPJ', 'nunique')).reset_index()
+        ufs['Media_Por_Operadora'] = (ufs['Despesa_Total'] / ufs['Qtd_Operadoras']).round(2)
+        return ufs.sort_values('Despesa_Total', ascending=False, kind='stable')
+
+    # Query 3: trimestres em que a operadora ficou acima da média de mercado do trimestre
+    @staticmethod
+    def _build_acima_media(por_trimestre, cadastro):
+        mercado = por_trimestre.groupby(['Ano', 'Trimestre'], observed=True)['total'].transform('mean')
+        acima = por_trimestre.assign(acima=(por_trimestre['total'] > mercado).astype('int64'))
+        contagem = (acima.groupby('CNPJ').agg(Trimestres_Acima_Media=('acima', 'sum'), Despesa_Total=('total', 'sum'))
+                    .reset_index().merge(cadastro, on='CNPJ', how='inner'))
+        contagem = contagem.sort_values(['Trimestres_Acima_Media', 'Despesa_Total'], ascending=False, kind='stable')
+        return contagem[['RegistroANS', 'RazaoSocial', 'Trimestres_Acima_Media', 'Despesa_Total']]
+
+    @staticmethod
+    def _records(df):
+        df = df.copy()
+        for c in df.columns:
+            if pd.api.types.is_float_dtype(df[c]):
+                df[c] = df[c].round(2)
+        return df.astype(object).where(df.notna(), None).to_dict('records')
+
+    def top_crescimento(self, top=5):
+        return self._records(self.crescimento.head(top))
+
+    def top_ufs(self, top=5):
+        return self._records(self.ufs.head(top))
+
+    def operadoras_acima_media(self, minimo=MIN_TRIMESTRES_ACIMA, top=None):
+        df = self.acima_media[self.acima_media['Trimestres_Acima_Media'] >= minimo]
+        return self._records(df.head(top) if top else df)
@@ -0,0 +1,92 @@
+# Benchmark da subida da API: tempo até a primeira resposta e memória por worker,
+# carregando das fontes (CSV) vs do snapshot binário (Arrow IPC) vs do banco SQLite
+# (DATA_BACKEND=sqlite).
+#
+# Cada medição roda em processos novos (como workers do uvicorn), em paralelo.
+# Uso: python benchmarks/bench_startup.py [linhas_despesas] [workers]
+import sys
+import os
+import json
+import shutil
+import subprocess
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+# Código executado em cada worker: importa o serviço, carrega e responde uma requisição
+WORKER = """
+import sys, time, json
+inicio = time.perf_counter()
+sys.path.insert(0, {backend!r})
+import service
+ds = {criar}
+ds.get_despesas_by_registro('300000')
+ds.get_operadoras(1, 10, 'saude')
+print(json.dumps({{"segundos": time.perf_counter() - inicio, "origem": ds.loaded_from,
+                  "memoria": service.process_memory()}}))
+"""
+
+def criar_base(base_dir, n):
+    rng = np.random.default_rng(7)
+    os.makedirs(os.path.join(base_dir, '2_Transformacao_Validacao', 'data'))
+    os.makedirs(os.path.join(base_dir, '1_Leitura_Transformacao_Dados'))
+
+    n_ops = 1500
+    regs = np.arange(300000, 300000 + n_ops)
+    ufs = np.array(['SP', 'RJ', 'MG', 'BA', 'RS', 'PR'])
+    with open(os.path.join(base_dir, '2_Transformacao_Validacao', 'data', 'operadoras_ativas.csv'), 'w', encoding='utf-8') as f:
+        f.write("Registro_ANS;CNPJ;Razao_Social;UF;Modalidade\n")
+        for i, reg in enumerate(regs):
+            f.write(f"{reg};{i:08d}0001{i % 100:02d};OPERADORA SAUDE {i};{ufs[i % len(ufs)]};Medicina de Grupo\n")
+
+    ops = rng.integers(0, n_ops, n)
+    valores = rng.integers(0, 10_000_000, n)
+    with open(os.path.join(base_dir, '1_Leitura_Transformacao_Dados', 'consolidado_despesas.csv'), 'w', encoding='utf-8') as f:
+        f.write("CNPJ;RazaoSocial;Trimestre;Ano;Valor Despesas\n")
+        for i, v in zip(ops, valores):
+            f.write(f"{i:08d}0001{i % 100:02d};OPERADORA SAUDE {i};{i % 4 + 1};2024;{v // 100},{v % 100:02d}\n")
+
+    with open(os.path.join(base_dir, '2_Transformacao_Validacao', 'despesas_agregadas.csv'), 'w', encoding='utf-8') as f:
+        f.write("RazaoSocial;UF;Total_Despesas\n")
+        for i in range(n_ops):
+            f.write(f"OPERADORA SAUDE {i};{ufs[i % len(ufs)]};{i * 10},50\n")
+
+def rodar_workers(base_dir, workers, snapshot, backend='pandas'):
+    criar = f"service.DataService(base_dir={base_dir!r}, use_snapshot={snapshot!r})"
+    if backend == 'sqlite':
+        criar = f"service.SqlDataService(base_dir={base_dir!r})"
+    codigo = WORKER.format(backend=BACKEND_DIR, criar=criar)
+    env = dict(os.environ, RELOAD_INTERVAL='0')
+    procs = [subprocess.Popen([sys.executable, '-c', codigo], stdout=subprocess.PIPE, text=True, env=env)
+             for _ in range(workers)]
+    saidas = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+    return saidas
+
+def resumo(titulo, saidas):
+    tempos = [s["segundos"] for s in saidas]
+    rss = [s["memoria"].get("VmRSS", s["memoria"].get("VmHWM", 0)) / 1024 for s in saidas]
+    anon = [s["memoria"].get("RssAnon", 0) / 1024 for s in saidas]
+    arquivo = [s["memoria"].get("RssFile", 0) / 1024 for s in saidas]
+    print(f"{titulo:<28} origem={saidas[0]['origem']:<8} primeira resposta: {np.mean(tempos):6.2f}s | "
+          f"RSS/worker: {np.mean(rss):6.0f} MB (anônima {np.mean(anon):6.0f} MB, arquivos {np.mean(arquivo):6.0f} MB)")
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    base_dir = tempfile.mkdtemp()
+    try:
+        print(f"Gerando {n} linhas de despesas...")
+        criar_base(base_dir, n)
+
+        resumo("CSV (sem snapshot)", rodar_workers(base_dir, workers, snapshot=False))
+        # Primeiro processo com snapshot grava o arquivo; os seguintes só o leem
+        rodar_workers(base_dir, 1, snapshot=True)
+        resumo("Snapshot Arrow (mmap)", rodar_workers(base_dir, workers, snapshot=True))
+        # Idem para o banco SQLite: o primeiro monta, os seguintes só abrem
+        resumo("SQLite (montagem)", rodar_workers(base_dir, 1, snapshot=False, backend='sqlite'))
+        resumo("SQLite (banco pronto)", rodar_workers(base_dir, workers, snapshot=False, backend='sqlite'))
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
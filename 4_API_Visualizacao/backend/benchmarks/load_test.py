@@ -0,0 +1,119 @@
+# Teste de carga da API com concorrência fixa: latência p50/p99 por rota e códigos de status.
+#
+# Sem --url, gera uma base sintética, sobe o uvicorn numa porta livre e testa contra ele.
+# Uso: python benchmarks/load_test.py [--url http://127.0.0.1:8000] [--concurrency 32]
+#                                     [--requests 4000] [--linhas 1000000]
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from bench_startup import BACKEND_DIR, criar_base
+
+REGISTROS = list(range(300000, 301500))
+
+# Mistura de requisições: (rota, peso, gerador do caminho)
+MIX = [
+    ("busca", 40, lambda r: f"/api/operadoras?search={r.choice(['saude ', 'operadora ', ''])}{r.randint(1, 1499)}"),
+    ("pagina", 20, lambda r: f"/api/operadoras?page={r.randint(1, 150)}&limit=10"),
+    ("detalhe", 20, lambda r: f"/api/operadoras/{r.choice(REGISTROS)}"),
+    ("despesas", 15, lambda r: f"/api/operadoras/{r.choice(REGISTROS)}/despesas"),
+    ("estatisticas", 5, lambda r: "/api/estatisticas"),
+]
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def subir_servidor(base_dir, porta):
+    env = dict(os.environ, DATA_BASE_DIR=base_dir, RELOAD_INTERVAL='0')
+    proc = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(porta), '--log-level', 'warning'],
+                            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{porta}"
+    limite = time.time() + 120
+    while time.time() < limite:
+        try:
+            # Loopback: /admin/status não exige token (o ADMIN_TOKEN do ambiente, se houver, é enviado)
+            headers = {"X-Admin-Token": env['ADMIN_TOKEN']} if env.get('ADMIN_TOKEN') else {}
+            if httpx.get(url + "/api/admin/status", headers=headers, timeout=1).status_code == 200:
+                return proc, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("API não subiu a tempo")
+
+async def executar(url, concurrency, total, seed=7):
+    rng = random.Random(seed)
+    rotas = [m[0] for m in MIX]
+    pesos = [m[1] for m in MIX]
+    geradores = {m[0]: m[2] for m in MIX}
+    fila = asyncio.Queue()
+    for _ in range(total):
+        rota = rng.choices(rotas, pesos)[0]
+        fila.put_nowait((rota, geradores[rota](rng)))
+
+    latencias = defaultdict(list)
+    status = defaultdict(lambda: defaultdict(int))
+
+    async def cliente(http):
+        while not fila.empty():
+            rota, caminho = fila.get_nowait()
+            inicio = time.perf_counter()
+            try:
+                resp = await http.get(caminho)
+                codigo = resp.status_code
+            except httpx.HTTPError:
+                codigo = 'erro'
+            latencias[rota].append((time.perf_counter() - inicio) * 1000)
+            status[rota][codigo] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as http:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente(http) for _ in range(concurrency)))
+        duracao = time.perf_counter() - inicio
+    return latencias, status, duracao
+
+def relatorio(latencias, status, duracao, concurrency):
+    todas = [x for v in latencias.values() for x in v]
+    print(f"\n{len(todas)} requisições, concorrência {concurrency}: {len(todas) / duracao:.0f} req/s")
+    print(f"{'rota':<14}{'n':>6}{'p50 (ms)':>10}{'p99 (ms)':>10}  status")
+    for rota, valores in list(latencias.items()) + [("TOTAL", todas)]:
+        p50, p99 = np.percentile(valores, [50, 99])
+        codigos = "" if rota == "TOTAL" else " ".join(f"{k}:{v}" for k, v in sorted(status[rota].items(), key=str))
+        print(f"{rota:<14}{len(valores):>6}{p50:>10.1f}{p99:>10.1f}  {codigos}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    proc, base_dir, url = None, None, args.url
+    try:
+        if not url:
+            base_dir = tempfile.mkdtemp()
+            print(f"Gerando {args.linhas} linhas de despesas e subindo a API...")
+            criar_base(base_dir, args.linhas)
+            proc, url = subir_servidor(base_dir, porta_livre())
+        relatorio(*asyncio.run(executar(url, args.concurrency, args.requests)), args.concurrency)
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+        if base_dir:
+            shutil.rmtree(base_dir, ignore_errors=True)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Raiz do repositório no sys.path, uma única vez para toda a API: os módulos de backend/
+# (soltos, sem pacote) importam os utilitários compartilhados com os Testes ('shared').
+# Quem usa 'shared' importa este módulo antes.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
@@ -0,0 +1,150 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+# orjson é opcional: serializa bem mais rápido e entende tipos do NumPy direto
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Limites do cache de respostas (o que estourar primeiro dispara a remoção do item mais antigo)
+MAX_ENTRIES = 512
+MAX_BYTES = 32 * 1024 * 1024
+# Força o navegador a revalidar (If-None-Match) antes de reutilizar a cópia local
+CACHE_CONTROL = "no-cache"
+# Respostas a partir deste tamanho também são guardadas comprimidas (gzip)
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+
+
+# Serializa o resultado em JSON (orjson se disponível; senão o caminho padrão do FastAPI)
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=jsonable_encoder, option=orjson.OPT_SERIALIZE_NUMPY)
+    return JSONResponse(content=jsonable_encoder(data)).body
+
+
+# Aceita gzip? (ignora 'gzip;q=0')
+def accepts_gzip(accept_encoding):
+    for item in (accept_encoding or '').split(','):
+        nome, _, parametros = item.strip().partition(';')
+        if nome.strip() in ('gzip', '*'):
+            return parametros.replace(' ', '') not in ('q=0', 'q=0.0')
+    return False
+
+
+# ETag forte: hash do corpo serializado (mesmo conteúdo -> mesmo ETag, inclusive entre reinícios)
+def make_etag(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+# Confere o cabeçalho If-None-Match (aceita lista, '*' e o prefixo W/)
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+# Cache LRU das respostas JSON já serializadas.
+# A chave inclui a geração do dataset: quando os dados mudam, as entradas antigas
+# deixam de ser encontradas e acabam removidas pelo LRU.
+class ResponseCache:
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    # Cada entrada é (corpo, etag, corpo_gzip ou None)
+    @staticmethod
+    def _entry_size(entry):
+        return len(entry[0]) + len(entry[2] or b'')
+
+    def put(self, key, body, etag, body_gzip=None):
+        entry = (body, etag, body_gzip)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= self._entry_size(old)
+            self.entries[key] = entry
+            self.size_bytes += self._entry_size(entry)
+            while self.entries and (len(self.entries) > self.max_entries or self.size_bytes > self.max_bytes):
+                removed = self.entries.popitem(last=False)[1]
+                self.size_bytes -= self._entry_size(removed)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size_bytes = 0
+
+    # Serializa o resultado de 'compute' (e comprime, se for grande) e guarda no cache.
+    # Exceções (ex: HTTPException 404) não são cacheadas.
+    def _compute_entry(self, key, compute):
+        body = dumps(compute())
+        body_gzip = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0) if len(body) >= GZIP_MIN_BYTES else None
+        entry = (body, make_etag(body), body_gzip)
+        self.put(key, *entry)
+        return entry
+
+    # A versão comprimida tem ETag próprio (representações diferentes, validadores diferentes)
+    @staticmethod
+    def _response(request, entry):
+        body, etag, body_gzip = entry
+        headers = {"Cache-Control": CACHE_CONTROL}
+        if body_gzip is not None:
+            headers["Vary"] = "Accept-Encoding"
+            if accepts_gzip(request.headers.get("accept-encoding")):
+                body, etag = body_gzip, etag[:-1] + '-gzip"'
+                headers["Content-Encoding"] = "gzip"
+        headers["ETag"] = etag
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            headers.pop("Content-Encoding", None)
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    # Devolve a resposta da rota usando o cache. 'compute' só roda em caso de miss.
+    def respond(self, request, route, params, generation, compute):
+        key = (route, tuple(sorted(params.items())), generation)
+        entry = self.get(key) or self._compute_entry(key, compute)
+        return self._response(request, entry)
+
+    # Versão assíncrona: o hit é respondido direto no event loop; no miss, cálculo e
+    # serialização vão para 'run' (ex: o executor limitado das rotas pesadas).
+    async def respond_async(self, request, route, params, generation, compute, run):
+        key = (route, tuple(sorted(params.items())), generation)
+        entry = self.get(key)
+        if entry is None:
+            entry = await run(lambda: self._compute_entry(key, compute))
+        return self._response(request, entry)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+# Threads para o trabalho pesado (pandas) e quantas tarefas podem esperar na fila.
+# Poucas threads de propósito: o trabalho disputa o GIL com o event loop, e mais
+# threads só aumentam a latência das rotas leves sem ganhar vazão.
+# Acima de HEAVY_WORKERS + HEAVY_QUEUE tarefas em andamento, novas requisições pesadas
+# recebem 503 na hora em vez de aumentar a latência de todas as outras.
+HEAVY_WORKERS = int(os.environ.get('HEAVY_WORKERS', '2'))
+HEAVY_QUEUE = int(os.environ.get('HEAVY_QUEUE', '32'))
+RETRY_AFTER_SECONDS = 1
+
+# Tempo máximo (s) de cada rota pesada antes de responder 504
+ROUTE_TIMEOUTS = {
+    "operadoras": float(os.environ.get('TIMEOUT_OPERADORAS', '2')),
+    "despesas": float(os.environ.get('TIMEOUT_DESPESAS', '5')),
+    "estatisticas": float(os.environ.get('TIMEOUT_ESTATISTICAS', '5')),
+}
+
+
+# Executor limitado com controle de admissão.
+# O contador só é liberado quando a tarefa termina de fato: uma tarefa que estourou o
+# timeout já em execução não pode ser interrompida (é uma thread) e continua ocupando a
+# thread e a vaga até acabar, então a admissão reflete a carga real. Se ainda estava na
+# fila, é cancelada e libera a vaga na hora.
+class BoundedExecutor:
+    def __init__(self, max_workers=HEAVY_WORKERS, max_queue=HEAVY_QUEUE):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='heavy')
+        self.capacity = max_workers + max_queue
+        self.in_flight = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.lock = threading.Lock()
+
+    def _release(self, _future):
+        with self.lock:
+            self.in_flight -= 1
+
+    async def run(self, fn, timeout):
+        with self.lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Servidor ocupado, tente novamente",
+                                    headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+            self.in_flight += 1
+
+        future = self.pool.submit(fn)
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            with self.lock:
+                self.timed_out += 1
+            raise HTTPException(status_code=504, detail="Tempo limite da consulta excedido")
+
+    def stats(self):
+        with self.lock:
+            return {"in_flight": self.in_flight, "capacity": self.capacity,
+                    "rejected": self.rejected, "timed_out": self.timed_out}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+heavy_executor = BoundedExecutor()
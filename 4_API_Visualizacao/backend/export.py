@@ -0,0 +1,26 @@
+import csv
+import io
+
+from cache import dumps
+from service import to_format
+
+# Formatos de exportação: NDJSON (um objeto JSON por linha) ou CSV com ';' (padrão do projeto)
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Gera o arquivo bloco a bloco a partir de DataService.iter_export (transferência chunked)
+def stream_export(snapshot, dataset, fmt):
+    primeiro = True
+    for colunas in snapshot.iter_export(dataset):
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, delimiter=';', lineterminator='\n')
+            if primeiro:
+                writer.writerow(colunas.keys())
+            writer.writerows(zip(*colunas.values()))
+            yield buffer.getvalue().encode('utf-8')
+        else:
+            yield b''.join(dumps(registro) + b'\n' for registro in to_format(colunas))
+        primeiro = False
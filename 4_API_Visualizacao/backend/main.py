@@ -1,12 +1,25 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from routes import router
+from service import data_service
+from executor import heavy_executor
+
+# Liga o watcher de recarga dos dados enquanto a API estiver no ar
+@asynccontextmanager
+async def lifespan(app):
+    data_service.start_watcher()
+    yield
+    data_service.stop_watcher()
+    heavy_executor.shutdown()
 
 # Inicialização da API
 app = FastAPI(
     title="API Operadoras ANS",
     description="API para consulta de dados financeiros e cadastrais.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configuração de CORS (Permite que o Frontend HTML acesse)
@@ -16,8 +29,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# Comprime respostas grandes que não vêm do cache (as do cache já saem comprimidas)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Registra as rotas
 app.include_router(router, prefix="/api")
 
@@ -0,0 +1,38 @@
+import base64
+import json
+
+from fastapi import HTTPException
+
+# Cursores opacos para paginação keyset: JSON em base64 url-safe (sem '=' no final).
+# O cliente só repassa o 'next_cursor' recebido; o conteúdo pode mudar sem quebrar a API.
+
+def encode_cursor(payload):
+    texto = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(texto).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return json.loads(texto.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+# Ano/Trimestre como inteiro (vazio ou inválido: -1, antes dos demais)
+def _numero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return -1
+
+# Chave keyset de cada despesa de uma operadora: (Ano, Trimestre, ordem dentro do trimestre).
+# A ordem conta as despesas do mesmo trimestre na ordem de carga, então a chave de um
+# trimestre não muda quando outros trimestres entram ou saem em uma recarga dos dados.
+def despesas_keys(anos, trimestres):
+    vistos = {}
+    chaves = []
+    for ano, trimestre in zip(anos, trimestres):
+        periodo = (_numero(ano), _numero(trimestre))
+        ordem = vistos.get(periodo, 0)
+        vistos[periodo] = ordem + 1
+        chaves.append(periodo + (ordem,))
+    return chaves
@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+
+# Dimensões consultáveis (nome no parâmetro da API -> coluna do cubo)
+DIMENSIONS = {
+    'uf': 'UF',
+    'modalidade': 'Modalidade',
+    'ano': 'Ano',
+    'trimestre': 'Trimestre',
+    'operadora': 'RegistroANS',
+}
+CELL_KEYS = ['CNPJ', 'Ano', 'Trimestre']
+REGION_DIMS = ['UF', 'Modalidade', 'Ano', 'Trimestre']
+OPERATOR_DIMS = ['RegistroANS'] + REGION_DIMS
+
+# Métricas das respostas (nome no parâmetro order_by -> coluna)
+ORDER_BY = {
+    'total': 'Total',
+    'registros': 'Registros',
+    'media': 'Media',
+    'desvio_padrao': 'Desvio_Padrao',
+}
+
+# Mesmos valores padrão do agregador do Teste 2 para quem não casa com o cadastro
+FILL_VALUES = {'UF': 'N/I', 'RegistroANS': 'N/I', 'Modalidade': 'Desconhecida'}
+
+
+# Agrega células do cubo para as chaves pedidas.
+# Cada célula guarda n, soma, média e M2 (soma dos quadrados dos desvios); a combinação
+# usa a fórmula paralela de Chan, que é estável mesmo com valores grandes.
+# Chaves nulas (ex: Ano/Trimestre inválidos) formam um grupo próprio em vez de sumir dos totais.
+def combine(cube, keys):
+    if not keys:
+        cube = cube.assign(_todos=0)
+        keys = ['_todos']
+    grupos = cube.groupby(keys, observed=True, sort=False, dropna=False)
+    n_total = grupos['n'].transform('sum')
+    media_total = grupos['total'].transform('sum') / n_total
+    m2 = cube['m2'] + cube['n'] * (cube['mean'] - media_total) ** 2
+
+    out = (cube.assign(m2=m2)
+           .groupby(keys, observed=True, sort=False, dropna=False)
+           .agg(n=('n', 'sum'), total=('total', 'sum'), m2=('m2', 'sum'))
+           .reset_index())
+    out['mean'] = out['total'] / out['n']
+    return out.drop(columns=['_todos'], errors='ignore')
+
+
+# Agrega um bloco de despesas (CNPJ limpo, Ano, Trimestre, Valor) por (CNPJ, Ano, Trimestre).
+# Linhas sem CNPJ ou com período inválido continuam nas células (chave nula): os totais dos
+# cubos batem com a soma das despesas; só as análises por trimestre as descartam.
+def facts_to_cells(fatos):
+    grupos = fatos.groupby(CELL_KEYS, observed=True, sort=False, dropna=False)['Valor']
+    celulas = grupos.agg(n='count', total='sum', mean='mean').reset_index()
+    celulas['m2'] = grupos.var(ddof=0).to_numpy() * celulas['n'].to_numpy()
+    celulas['Ano'] = pd.to_numeric(celulas['Ano'], errors='coerce').astype('Int16')
+    celulas['Trimestre'] = pd.to_numeric(celulas['Trimestre'], errors='coerce').astype('Int16')
+    return celulas
+
+
+# Agregados por (CNPJ, Ano, Trimestre), mantidos de forma incremental: cada bloco de
+# despesas carregado é agregado e somado às células existentes. É a base comum dos cubos
+# e das análises (analytics.py); depois da carga, nada precisa voltar às despesas.
+# As células de cada bloco ficam pendentes e só são combinadas quando somam tanto quanto
+# as já combinadas (ou na leitura de .cells): o custo total fica linear no número de blocos.
+class ExpenseCells:
+    def __init__(self):
+        self._cells = facts_to_cells(pd.DataFrame({c: pd.Series(dtype=object) for c in CELL_KEYS + ['Valor']}))
+        self._pendentes = []
+        self._linhas_pendentes = 0
+        self.rows = 0
+
+    def add(self, fatos):
+        self.rows += len(fatos)
+        novas = facts_to_cells(fatos)
+        self._pendentes.append(novas)
+        self._linhas_pendentes += len(novas)
+        if self._linhas_pendentes >= max(len(self._cells), 1):
+            self._combinar()
+        return self
+
+    def _combinar(self):
+        if not self._pendentes:
+            return
+        blocos = ([self._cells] if not self._cells.empty else []) + self._pendentes
+        self._cells = blocos[0] if len(blocos) == 1 else combine(pd.concat(blocos, ignore_index=True), CELL_KEYS)
+        self._pendentes, self._linhas_pendentes = [], 0
+
+    @property
+    def cells(self):
+        self._combinar()
+        return self._cells
+
+
+# Cubos de agregação das despesas, montados uma vez na carga dos dados:
+# - by_operator: operadora x UF x Modalidade x Ano x Trimestre (grão mais fino);
+# - by_region: UF x Modalidade x Ano x Trimestre (sem a operadora, bem menor).
+# Cada consulta filtra e reagrega o menor cubo que contém as dimensões pedidas,
+# sem voltar à tabela de despesas.
+class RollupCube:
+    def __init__(self, by_operator, nomes=None):
+        self.by_operator = by_operator
+        self.by_region = combine(by_operator, REGION_DIMS)
+        self.nomes = nomes or {}
+
+    # células: agregados por (CNPJ, Ano, Trimestre) (ver ExpenseCells);
+    # cadastro: CNPJ limpo -> RegistroANS/UF/Modalidade
+    @classmethod
+    def from_cells(cls, celulas, cadastro, nomes=None):
+        celulas = celulas.merge(cadastro.drop_duplicates('CNPJ'), on='CNPJ', how='left')
+        celulas = celulas.fillna(FILL_VALUES)
+        return cls(combine(celulas, OPERATOR_DIMS), nomes)
+
+    @classmethod
+    def empty(cls):
+        cube = pd.DataFrame({c: pd.Series(dtype=object) for c in OPERATOR_DIMS})
+        for c in ['n', 'total', 'mean', 'm2']:
+            cube[c] = pd.Series(dtype='float64')
+        return cls(cube)
+
+    # filtros: {dimensão: lista de valores}; group_by/order_by com os nomes da API.
+    # Retorna a lista de grupos e o total de grupos antes do top-N.
+    def query(self, group_by=(), filters=None, order_by='total', top=None):
+        filters = filters or {}
+        desconhecidas = [d for d in list(group_by) + list(filters) if d not in DIMENSIONS]
+        if desconhecidas:
+            raise ValueError(f"Dimensão inválida: {', '.join(desconhecidas)}")
+        if order_by != 'dims' and order_by not in ORDER_BY:
+            raise ValueError(f"Ordenação inválida: {order_by}")
+
+        keys = [DIMENSIONS[d] for d in group_by]
+        usadas = set(keys) | {DIMENSIONS[d] for d in filters}
+        cube = self.by_operator if 'RegistroANS' in usadas else self.by_region
+
+        mask = np.ones(len(cube), dtype=bool)
+        for dim, valores in filters.items():
+            col = cube[DIMENSIONS[dim]]
+            if dim in ('ano', 'trimestre'):
+                valores = [int(v) for v in valores]
+            mask &= col.isin(valores).to_numpy(dtype=bool)
+
+        out = combine(cube[mask], keys)
+        out = out[out['n'] > 0]
+        out['Desvio_Padrao'] = np.sqrt(out['m2'] / (out['n'] - 1)).where(out['n'] > 1, 0.0)
+        out = out.rename(columns={'total': 'Total', 'n': 'Registros', 'mean': 'Media'}).drop(columns='m2')
+        out['Registros'] = out['Registros'].astype('int64')
+
+        # Série temporal: variação % sobre o trimestre anterior do mesmo grupo
+        if 'Ano' in keys and 'Trimestre' in keys:
+            outras = [k for k in keys if k not in ('Ano', 'Trimestre')]
+            out = out.sort_values(outras + ['Ano', 'Trimestre'])
+            anterior = out.groupby(outras, sort=False)['Total'].shift() if outras else out['Total'].shift()
+            out['Variacao_Pct'] = ((out['Total'] / anterior - 1) * 100).round(2)
+
+        if order_by == 'dims':
+            out = out.sort_values(keys) if keys else out
+        else:
+            out = out.sort_values(ORDER_BY[order_by], ascending=False, kind='stable')
+
+        total_grupos = len(out)
+        if top:
+            out = out.head(top)
+        if 'RegistroANS' in keys:
+            out.insert(keys.index('RegistroANS') + 1, 'RazaoSocial', out['RegistroANS'].map(self.nomes).fillna(''))
+
+        for c in ['Total', 'Media', 'Desvio_Padrao']:
+            out[c] = out[c].round(2)
+        for c in ['Ano', 'Trimestre']:
+            if c in out.columns:
+                out[c] = out[c].astype(object)
+        registros = out.astype(object).where(out.notna(), None).to_dict('records')
+        return registros, total_grupos
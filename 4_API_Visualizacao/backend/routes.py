@@ -1,46 +1,273 @@
-from fastapi import APIRouter, HTTPException, Query
-from service import data_service
+import os
+from functools import partial
+from fastapi import APIRouter, Header, HTTPException, Path, Query, Request
+from fastapi.responses import StreamingResponse
+from service import data_service, FORMAT_RECORDS
+from pagination import encode_cursor, decode_cursor
+from export import EXPORT_FORMATS, stream_export
+from cache import response_cache
+from executor import heavy_executor, ROUTE_TIMEOUTS
 
 router = APIRouter()
 
+# As rotas passam pelo cache de respostas (chave = rota + parâmetros + geração do dataset),
+# que devolve ETag/Cache-Control e responde 304 quando o cliente já tem a versão atual.
+# Cada requisição pega o snapshot atual uma única vez: se houver recarga no meio,
+# dados e geração continuam consistentes entre si.
+#
+# As rotas são assíncronas: hits do cache e buscas O(1) nos índices respondem direto no
+# event loop; o que usa pandas de verdade vai para o executor limitado (503 se lotado,
+# 504 se passar do tempo limite da rota), sem segurar as demais requisições.
+# O 504 não interrompe o cálculo: uma consulta que já começou segue na thread até o fim e
+# ocupa uma das HEAVY_WORKERS threads (e a vaga na admissão) até lá; só as que ainda
+# estavam na fila são canceladas.
+
+# Executa o cálculo direto no event loop (respostas baratas: cache e índices O(1))
+async def run_inline(fn):
+    return fn()
+
+# Executa o cálculo no executor limitado, com o tempo limite da rota
+def run_in_executor(route):
+    return partial(heavy_executor.run, timeout=ROUTE_TIMEOUTS[route])
+
+# Tamanho padrão da página de despesas quando só o cursor é informado
+DESPESAS_PAGE_SIZE = 100
+
+# Cursor da listagem: última chave vista (RegistroANS, CNPJ, posição)
+def decode_operadoras_cursor(cursor):
+    if not cursor:
+        return None
+    chave = decode_cursor(cursor)
+    chave = chave.get("k") if isinstance(chave, dict) else None
+    if not (isinstance(chave, list) and len(chave) == 3 and isinstance(chave[0], str)
+            and isinstance(chave[1], str) and isinstance(chave[2], int)):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return chave
+
+# Cursor do histórico: última chave vista (Ano, Trimestre, ordem no trimestre)
+def decode_despesas_cursor(cursor):
+    if not cursor:
+        return None
+    chave = decode_cursor(cursor)
+    chave = chave.get("k") if isinstance(chave, dict) else None
+    if not (isinstance(chave, list) and len(chave) == 3
+            and all(isinstance(v, int) and not isinstance(v, bool) for v in chave)):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return chave
+
 @router.get("/operadoras")
-def listar_operadoras(
+async def listar_operadoras(
+    request: Request,
     page: int = Query(1, ge=1), 
     limit: int = Query(10, ge=1, le=100),
-    search: str = None
+    search: str = None,
+    format: str = Query(FORMAT_RECORDS, pattern="^(records|columns)$"),
+    cursor: str = None
 ):
-    resultado = data_service.get_operadoras(page, limit, search)
-    
-    total_registros = resultado['total']
-    total_paginas = (total_registros // limit) + (1 if total_registros % limit > 0 else 0)
-
-    return {
-        "data": resultado['data'],
-        "meta": {
-            "page": page,
-            "limit": limit,
-            "total_records": total_registros,
-            "total_pages": total_paginas
+    snapshot = data_service.current
+
+    # Com 'cursor' (vazio na primeira página) a paginação é keyset, ordenada por registro ANS
+    if cursor is not None:
+        after = decode_operadoras_cursor(cursor)
+
+        def calcular():
+            resultado = snapshot.get_operadoras_keyset(limit, after, search, format)
+            last_key = resultado['last_key']
+            return {
+                "data": resultado['data'],
+                "meta": {
+                    "limit": limit,
+                    "total_records": resultado['total'],
+                    "next_cursor": encode_cursor({"k": last_key}) if last_key else None
+                }
+            }
+
+        params = {"limit": limit, "search": search, "format": format, "cursor": cursor}
+        return await response_cache.respond_async(request, "operadoras_keyset", params, snapshot.generation,
+                                                  calcular, run_in_executor("operadoras"))
+
+    def calcular():
+        resultado = snapshot.get_operadoras(page, limit, search, format)
+        
+        total_registros = resultado['total']
+        total_paginas = (total_registros // limit) + (1 if total_registros % limit > 0 else 0)
+
+        return {
+            "data": resultado['data'],
+            "meta": {
+                "page": page,
+                "limit": limit,
+                "total_records": total_registros,
+                "total_pages": total_paginas
+            }
         }
-    }
+
+    # Sem busca, a página é só uma fatia da lista pronta
+    run = run_in_executor("operadoras") if search else run_inline
+    params = {"page": page, "limit": limit, "search": search, "format": format}
+    return await response_cache.respond_async(request, "operadoras", params, snapshot.generation, calcular, run)
 
 @router.get("/operadoras/{registro_ans}")
-def detalhes_operadora(registro_ans: str):
-    op = data_service.get_operadora_by_registro(registro_ans)
-    if not op:
-        raise HTTPException(status_code=404, detail="Operadora não encontrada")
-    return op
+async def detalhes_operadora(request: Request, registro_ans: str):
+    snapshot = data_service.current
+
+    def calcular():
+        op = snapshot.get_operadora_by_registro(registro_ans)
+        if not op:
+            raise HTTPException(status_code=404, detail="Operadora não encontrada")
+        return op
+
+    params = {"registro_ans": registro_ans}
+    return await response_cache.respond_async(request, "operadora", params, snapshot.generation, calcular, run_inline)
 
 @router.get("/operadoras/{registro_ans}/despesas")
-def historico_despesas(registro_ans: str):
-    despesas = data_service.get_despesas_by_registro(registro_ans)
-    if despesas is None:
-        raise HTTPException(status_code=404, detail="Operadora não encontrada")
-    return despesas
+async def historico_despesas(
+    request: Request,
+    registro_ans: str,
+    format: str = Query(FORMAT_RECORDS, pattern="^(records|columns)$"),
+    limit: int = Query(None, ge=1, le=1000),
+    cursor: str = None
+):
+    snapshot = data_service.current
+
+    # Sem 'limit'/'cursor' devolve o histórico inteiro (formato original da rota)
+    if limit is None and cursor is None:
+        def calcular():
+            despesas = snapshot.get_despesas_by_registro(registro_ans, format)
+            if despesas is None:
+                raise HTTPException(status_code=404, detail="Operadora não encontrada")
+            return despesas
+    else:
+        # Keyset sobre (Ano, Trimestre, ordem no trimestre): o cursor guarda a última chave
+        # vista e continua valendo depois de uma recarga dos dados
+        limit = limit or DESPESAS_PAGE_SIZE
+        after = decode_despesas_cursor(cursor)
+
+        def calcular():
+            resultado = snapshot.get_despesas_keyset(registro_ans, limit, after, format)
+            if resultado is None:
+                raise HTTPException(status_code=404, detail="Operadora não encontrada")
+            last_key = resultado['last_key']
+            return {
+                "data": resultado['data'],
+                "meta": {
+                    "limit": limit,
+                    "total_records": resultado['total'],
+                    "next_cursor": encode_cursor({"k": last_key}) if last_key else None
+                }
+            }
+
+    params = {"registro_ans": registro_ans, "format": format, "limit": limit, "cursor": cursor}
+    return await response_cache.respond_async(request, "despesas", params, snapshot.generation, calcular,
+                                              run_in_executor("despesas"))
 
 @router.get("/estatisticas")
-def dashboard():
-    stats = data_service.get_dashboard_stats()
-    if not stats:
+async def dashboard(
+    request: Request,
+    group_by: str = Query(None, description="Dimensões separadas por vírgula: uf, modalidade, ano, trimestre, operadora"),
+    uf: str = None,
+    modalidade: str = None,
+    ano: str = None,
+    trimestre: str = None,
+    operadora: str = Query(None, description="Registro(s) ANS"),
+    order_by: str = Query("total", pattern="^(total|registros|media|desvio_padrao|dims)$"),
+    top: int = Query(None, ge=1, le=1000)
+):
+    snapshot = data_service.current
+    filtros = {nome: [v.strip() for v in valor.split(',') if v.strip()]
+               for nome, valor in [("uf", uf), ("modalidade", modalidade), ("ano", ano),
+                                   ("trimestre", trimestre), ("operadora", operadora)] if valor}
+
+    # Sem parâmetros: o ranking original dos estados (usado pelo dashboard)
+    if group_by is None and not filtros:
+        def calcular():
+            stats = snapshot.get_dashboard_stats()
+            if not stats:
+                raise HTTPException(status_code=500, detail="Dados não carregados")
+            return stats
+        params = {}
+    else:
+        # Consulta livre aos cubos de agregação (group-by, filtros e top-N)
+        dimensoes = [d.strip() for d in (group_by or '').split(',') if d.strip()]
+
+        def calcular():
+            try:
+                return snapshot.query_stats(dimensoes, filtros, order_by, top)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        params = {"group_by": tuple(dimensoes), "filtros": tuple(sorted((k, tuple(v)) for k, v in filtros.items())),
+                  "order_by": order_by, "top": top}
+
+    return await response_cache.respond_async(request, "estatisticas", params, snapshot.generation, calcular,
+                                              run_in_executor("estatisticas"))
+
+# Análises do Teste 3 (3_queries_analiticas.sql), respondidas a partir dos agregados
+# montados na carga: só ordenam e recortam resultados prontos, direto no event loop.
+async def responder_analise(request, nome, params, calcular):
+    snapshot = data_service.current
+    if snapshot.analytics is None:
         raise HTTPException(status_code=500, detail="Dados não carregados")
-    return stats
\ No newline at end of file
+    return await response_cache.respond_async(request, nome, params, snapshot.generation,
+                                              lambda: calcular(snapshot.analytics), run_inline)
+
+# Query 1: maior crescimento percentual entre o primeiro e o último trimestre
+@router.get("/analises/crescimento")
+async def analise_crescimento(request: Request, top: int = Query(5, ge=1, le=1000)):
+    return await responder_analise(request, "analise_crescimento", {"top": top},
+                                   lambda a: a.top_crescimento(top))
+
+# Query 2: UFs com maiores despesas e média por operadora
+@router.get("/analises/ufs")
+async def analise_ufs(request: Request, top: int = Query(5, ge=1, le=100)):
+    return await responder_analise(request, "analise_ufs", {"top": top}, lambda a: a.top_ufs(top))
+
+# Query 3: operadoras acima da média de mercado em pelo menos 'minimo' trimestres
+@router.get("/analises/acima-media")
+async def analise_acima_media(
+    request: Request,
+    minimo: int = Query(2, ge=1),
+    top: int = Query(None, ge=1, le=10000)
+):
+    return await responder_analise(request, "analise_acima_media", {"minimo": minimo, "top": top},
+                                   lambda a: a.operadoras_acima_media(minimo, top))
+
+# Exportação completa (operadoras ou despesas) em NDJSON ou CSV, transmitida em blocos.
+# Usa o snapshot do início da requisição: uma recarga no meio não mistura gerações.
+@router.get("/export/{dataset}")
+def exportar(
+    dataset: str = Path(..., pattern="^(operadoras|despesas)$"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$")
+):
+    snapshot = data_service.current
+    headers = {"Content-Disposition": f'attachment; filename="{dataset}.{format}"'}
+    return StreamingResponse(stream_export(snapshot, dataset, format), media_type=EXPORT_FORMATS[format], headers=headers)
+
+# Clientes aceitos nas rotas /admin quando ADMIN_TOKEN não está definido
+LOCAL_HOSTS = {'127.0.0.1', '::1', 'localhost'}
+
+# Autorização das rotas /admin: com ADMIN_TOKEN definido, exige o cabeçalho X-Admin-Token;
+# sem ele, só aceita chamadas da própria máquina (loopback).
+def exigir_admin(request, x_admin_token):
+    token = os.environ.get('ADMIN_TOKEN')
+    if token:
+        if x_admin_token != token:
+            raise HTTPException(status_code=403, detail="Token inválido")
+    elif request.client is None or request.client.host not in LOCAL_HOSTS:
+        raise HTTPException(status_code=403, detail="Defina ADMIN_TOKEN para acessar /admin fora do localhost")
+
+# Origem e tempo da última carga, geração atual, memória do processo e ocupação do executor
+# (expõe caminhos e memória do servidor: mesma autorização da recarga)
+@router.get("/admin/status")
+def status_dados(request: Request, x_admin_token: str = Header(None)):
+    exigir_admin(request, x_admin_token)
+    return {**data_service.status(), "executor": heavy_executor.stats()}
+
+# Recarrega os dados sob demanda (ex: ao final do ETL)
+@router.post("/admin/reload")
+def recarregar_dados(request: Request, x_admin_token: str = Header(None)):
+    exigir_admin(request, x_admin_token)
+
+    info = data_service.reload(force=True, trigger='admin')
+    if not info["reloaded"]:
+        raise HTTPException(status_code=500, detail=info)
+    return info
@@ -0,0 +1,92 @@
+import unicodedata
+from functools import lru_cache
+
+# Tamanho dos n-gramas usados no índice invertido
+NGRAM = 3
+# Quantidade de buscas distintas mantidas em cache (digitação repete muito os prefixos)
+CACHE_SIZE = 1024
+
+# Ordem de relevância dos resultados (menor = melhor)
+RANK_REGISTRO_EXATO = 0
+RANK_PREFIXO = 1
+RANK_PREFIXO_PALAVRA = 2
+RANK_SUBSTRING = 3
+
+
+# Normaliza o texto para busca: remove acentos, caixa alta e espaços repetidos.
+# Ex: ' Assistência  Médica ' -> 'ASSISTENCIA MEDICA'
+def fold(texto):
+    if texto is None:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.upper().split())
+
+
+def ngrams(texto, n=NGRAM):
+    return {texto[i:i + n] for i in range(len(texto) - n + 1)}
+
+
+# Índice de busca das operadoras, montado uma vez na carga dos dados.
+# Guarda a razão social e o registro ANS normalizados e um índice invertido de
+# trigramas -> ids, usado para reduzir os candidatos antes da conferência final
+# por substring. O resultado de uma busca é a tupla de ids (posições nos
+# registros originais) já ordenada por relevância, então o total é o tamanho da
+# tupla e cada página é só uma fatia dela.
+class SearchIndex:
+    def __init__(self, razoes, registros, cache_size=CACHE_SIZE):
+        self.razoes = [fold(r) for r in razoes]
+        self.registros = [fold(r) for r in registros]
+        self.all_ids = tuple(range(len(self.razoes)))
+
+        self.postings = {}
+        for doc_id, (razao, registro) in enumerate(zip(self.razoes, self.registros)):
+            for gram in ngrams(razao) | ngrams(registro):
+                self.postings.setdefault(gram, []).append(doc_id)
+
+        self.search = lru_cache(maxsize=cache_size)(self._search)
+
+    def __len__(self):
+        return len(self.razoes)
+
+    # Candidatos: interseção das listas dos trigramas da consulta (do menor para o maior).
+    # Consultas curtas demais para ter trigramas conferem todos os documentos.
+    def _candidates(self, termo):
+        grams = ngrams(termo)
+        if not grams:
+            return self.all_ids
+        listas = sorted((self.postings.get(g, ()) for g in grams), key=len)
+        if not listas[0]:
+            return ()
+        candidatos = set(listas[0])
+        for lista in listas[1:]:
+            candidatos.intersection_update(lista)
+            if not candidatos:
+                break
+        return sorted(candidatos)
+
+    def _rank(self, termo, doc_id):
+        razao, registro = self.razoes[doc_id], self.registros[doc_id]
+        if registro == termo:
+            return RANK_REGISTRO_EXATO
+        if razao.startswith(termo) or registro.startswith(termo):
+            return RANK_PREFIXO
+        if (' ' + termo) in razao:
+            return RANK_PREFIXO_PALAVRA
+        if termo in razao or termo in registro:
+            return RANK_SUBSTRING
+        return None
+
+    def _search(self, query):
+        termo = fold(query)
+        if not termo:
+            return self.all_ids
+
+        encontrados = []
+        for doc_id in self._candidates(termo):
+            rank = self._rank(termo, doc_id)
+            if rank is not None:
+                encontrados.append((rank, doc_id))
+        # Empate de relevância mantém a ordem original do arquivo
+        encontrados.sort()
+        return tuple(doc_id for _, doc_id in encontrados)
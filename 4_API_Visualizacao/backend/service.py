@@ -1,79 +1,211 @@
 import pandas as pd
+import numpy as np
+import bisect
+import hashlib
 import os
-import sys
+import threading
+import time
+
+import bootstrap  # raiz do repositório no path, para o 'shared'
+from shared.columnar import find_parquet_dataset, read_consolidado_parquet, iter_consolidado_parquet
+from shared.cnpj import CnpjMemo, memo_path
+from shared.cadop import CadopRegistry, registry_dir, RAW_NAME as CADOP_RAW_NAME
+from shared.encoding import open_decoded
+from shared.compact import COMPACT_SCHEMA, compact_frame, csv_dtypes, memory_report, format_memory, process_memory
+from search_index import SearchIndex, fold
+from pagination import despesas_keys
+from rollup import RollupCube, ExpenseCells
+from analytics import MarketAnalytics
+from snapshot import snapshot_available, snapshot_dir, load_snapshot, save_snapshot
+from sql_store import (SqlStore, SqlWriter, database_path, database_ready, empty_database, search_filter,
+                       OPERADORA_COLUNAS, BUSCA_RANK)
+
+# Caminho base: sobe 3 níveis a partir deste arquivo para achar a raiz (ou DATA_BASE_DIR)
+DEFAULT_BASE_DIR = os.environ.get('DATA_BASE_DIR') or os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Onde a API guarda os dados: 'pandas' (DataFrames em memória) ou 'sqlite' (ver SqlDataService)
+DATA_BACKEND = os.environ.get('DATA_BACKEND', 'pandas')
+
+# Intervalo (s) entre as verificações de mtime dos arquivos de origem; 0 desliga o watcher
+RELOAD_INTERVAL = float(os.environ.get('RELOAD_INTERVAL', '5'))
+
+# Arquivos de origem da API, a partir da raiz do repositório.
+# Sem o operadoras_ativas.csv do Teste 2, as operadoras vêm do cadastro CADOP local ('cadop').
+def source_paths(base_dir):
+    pasta_teste1 = os.path.join(base_dir, '1_Leitura_Transformacao_Dados')
+    path_ops = os.path.join(base_dir, '2_Transformacao_Validacao', 'data', 'operadoras_ativas.csv')
+    return {
+        'ops': path_ops,
+        'cadop': None if os.path.exists(path_ops) else os.path.join(registry_dir(base_dir), CADOP_RAW_NAME),
+        'desp': os.path.join(pasta_teste1, 'consolidado_despesas.csv'),
+        'desp_parquet': find_parquet_dataset(pasta_teste1),
+        'agg': os.path.join(base_dir, '2_Transformacao_Validacao', 'despesas_agregadas.csv'),
+    }
+
+# Assinatura dos arquivos de origem (caminho, mtime, tamanho); diretórios entram arquivo a arquivo
+def source_signature(paths):
+    assinatura = []
+    for path in paths:
+        if not path:
+            continue
+        arquivos = [path]
+        if os.path.isdir(path):
+            arquivos = sorted(os.path.join(raiz, nome) for raiz, _, nomes in os.walk(path) for nome in nomes)
+        for arquivo in arquivos:
+            if os.path.exists(arquivo):
+                st = os.stat(arquivo)
+                assinatura.append((arquivo, st.st_mtime_ns, st.st_size))
+    return tuple(assinatura)
+
+# Linhas por bloco na exportação completa (/export)
+EXPORT_CHUNK_ROWS = 10000
+# Linhas por bloco ao ler as despesas na carga do banco SQLite (agregados acumulados bloco a bloco)
+AGGREGATE_CHUNK_ROWS = 250000
+
+# Esquema compacto das despesas em memória (ver shared/compact.py), já com os nomes normalizados.
+# Ano/Trimestre ficam categóricos como texto: o contrato da API os devolve como string.
+DESPESAS_CSV_SCHEMA = {**COMPACT_SCHEMA, 'Ano': 'category', 'Trimestre': 'category'}
+DESPESAS_SCHEMA = {
+    'CNPJ_PADRAO': 'category',
+    'CNPJ_CLEAN': 'category',
+    'RAZAOSOCIAL': 'category',
+    'ANO': 'category',
+    'TRIMESTRE': 'category',
+    'VALOR_PADRAO': 'float64',
+}
+
+# Formatos de resposta: lista de objetos (padrão) ou um objeto de colunas (?format=columns),
+# mais compacto por não repetir os nomes dos campos em cada linha
+FORMAT_RECORDS = 'records'
+FORMAT_COLUMNS = 'columns'
+
+# Campos de cada operadora nas respostas
+CAMPOS_OPERADORA = ["RegistroANS", "CNPJ", "RazaoSocial", "UF", "Modalidade"]
+
+# Monta a resposta a partir de colunas já extraídas ({campo: lista de valores})
+def to_format(columns, fmt=FORMAT_RECORDS):
+    if fmt == FORMAT_COLUMNS:
+        return columns
+    campos = list(columns)
+    return [dict(zip(campos, valores)) for valores in zip(*columns.values())]
+
+# LÓGICA DE CONVERSÃO DE NÚMEROS INTELIGENTE
+def limpar_valor(val):
+    if not val: return 0.0
+    val = str(val).strip()
+    # Se tiver vírgula, assume formato BR (1.000,00) -> 1000.00
+    if ',' in val:
+        val = val.replace('.', '').replace(',', '.')
+    # Se não tiver vírgula, assume formato US (292907.23) -> Mantém
+    return float(val)
 
 class DataService:
-    def __init__(self):
+    backend = 'pandas'
+
+    def __init__(self, base_dir=DEFAULT_BASE_DIR, use_snapshot=True):
+        self.base_dir = base_dir
         self.df_ops = pd.DataFrame()
         self.df_desp = pd.DataFrame()
         self.df_agg = pd.DataFrame()
-        self._load_data()
+        # Índices construídos na carga (ver _build_indexes)
+        self.ops_by_registro = {}
+        self.ops_records = []
+        self.search_index = SearchIndex([], [])
+        self.ops_keyset, self.ops_keyset_pos = [], []
+        self.despesas_slices = {}
+        self.cells = ExpenseCells()
+        self.rollup = RollupCube.empty()
+        self.analytics = None
+        self.col_reg = 'REGISTROANS'
+        self.col_razao = 'RAZAOSOCIAL'
+        self.col_data, self.col_ano, self.col_trim = None, 'ANO', 'TRIMESTRE'
+        # Arquivos efetivamente carregados e a geração do dataset (muda quando eles mudam)
+        self.sources = []
+        # Encoding detectado em cada CSV de despesas lido ({'encoding', 'fallback_rows'})
+        self.encodings = {}
+        self.load_error = None
+        self.signature = source_signature(source_paths(base_dir).values())
+        self.generation = hashlib.sha1(repr(self.signature).encode()).hexdigest()[:16]
+        # CNPJs já limpos pelo Teste 2 (ou por cargas anteriores): limpeza O(CNPJs distintos)
+        self.cnpj_memo = CnpjMemo(memo_path(base_dir))
+
+        # Usa o snapshot binário da mesma geração, se houver; senão parseia as fontes e o grava
+        inicio = time.perf_counter()
+        use_snapshot = use_snapshot and snapshot_available()
+        self.loaded_from = 'snapshot' if use_snapshot and self._load_snapshot() else 'fontes'
+        if self.loaded_from == 'fontes':
+            self._load_data()
+        self._build_indexes()
+        if self.loaded_from == 'fontes' and use_snapshot and self.signature and self.load_error is None:
+            self._save_snapshot()
+        self._save_memo()
+        self.load_seconds = time.perf_counter() - inicio
+        print(f"⏱️ Dados prontos em {self.load_seconds:.2f}s (origem: {self.loaded_from}, geração {self.generation})")
+
+    def _load_snapshot(self):
+        frames = load_snapshot(snapshot_dir(self.base_dir), self.generation)
+        if frames is None:
+            return False
+        self.df_ops, self.df_desp, self.df_agg = frames['ops'], frames['desp'], frames['agg']
+        return True
+
+    def _save_snapshot(self):
+        try:
+            save_snapshot(snapshot_dir(self.base_dir), self.generation,
+                          {'ops': self.df_ops, 'desp': self.df_desp, 'agg': self.df_agg})
+        except Exception as e:
+            print(f"⚠️ AVISO: Não foi possível gravar o snapshot: {e}")
+
+    # Grava os CNPJs novos no memo (falha de escrita não impede a API de subir)
+    def _save_memo(self):
+        if not self.cnpj_memo.save():
+            print(f"⚠️ AVISO: Não foi possível gravar o memo de CNPJs: {self.cnpj_memo.path}")
+
+    def _log_encoding(self, path, decoder):
+        self.encodings[path] = decoder.info()
+        if decoder.fallback_rows:
+            print(f"⚠️ AVISO: {decoder.fallback_rows} linhas de {os.path.basename(path)} fora de {decoder.encoding} (decodificadas com fallback).")
 
     # Carrega os dados dos módulos anteriores para a memória.
     def _load_data(self):
         try:
-            # Caminho base: sobe 3 níveis a partir deste arquivo para achar a raiz
-            BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-            
-            path_ops = os.path.join(BASE_DIR, '2_Transformacao_Validacao', 'data', 'operadoras_ativas.csv')
-            path_desp = os.path.join(BASE_DIR, '1_Leitura_Transformacao_Dados', 'consolidado_despesas.csv')
-            path_agg = os.path.join(BASE_DIR, '2_Transformacao_Validacao', 'despesas_agregadas.csv')
+            BASE_DIR = self.base_dir
+            paths = source_paths(BASE_DIR)
+            path_ops, path_desp, path_agg = paths['ops'], paths['desp'], paths['agg']
 
             print(f"Carregando dados de: {BASE_DIR}")
+            self.sources = [paths['cadop'] or path_ops, path_agg]
 
             # ---------------------------
             # 1. CARGA DE OPERADORAS
             # ---------------------------
-            if os.path.exists(path_ops):
-                self.df_ops = pd.read_csv(path_ops, sep=';', encoding='utf-8', dtype=str)
-                self.df_ops.fillna('', inplace=True)
-                # Normaliza colunas para evitar erros de Case Sensitive
-                self.df_ops.columns = [c.strip().upper() for c in self.df_ops.columns]
-                # Garante que temos as chaves principais
-                if 'REGISTROANS' not in self.df_ops.columns and 'REGISTRO' in self.df_ops.columns:
-                    self.df_ops.rename(columns={'REGISTRO': 'REGISTROANS'}, inplace=True)
-            else:
-                print(f"⚠️ AVISO: Arquivo de Operadoras não encontrado: {path_ops}")
+            df_ops = self.load_operadoras(paths)
+            if df_ops is not None:
+                self.df_ops = df_ops
 
             # ---------------------------
             # 2. CARGA DE DESPESAS 
             # ---------------------------
-            if os.path.exists(path_desp):
-                # Lê tudo como string primeiro para segurança
-                try:
-                    self.df_desp = pd.read_csv(path_desp, sep=';', encoding='utf-8', dtype=str)
-                except UnicodeDecodeError:
-                    self.df_desp = pd.read_csv(path_desp, sep=';', encoding='latin1', dtype=str)
-
-                # Normaliza nomes das colunas 
-                # Ex: 'Valor Despesas' vira 'VALOR DESPESAS'
-                self.df_desp.columns = [c.strip().upper() for c in self.df_desp.columns]
-
-                # Tenta encontrar a coluna de VALOR dinamicamente
-                col_valor = next((c for c in self.df_desp.columns if 'VALOR' in c), None)
-                col_cnpj = next((c for c in self.df_desp.columns if 'CNPJ' in c), None)
-
-                if col_valor and col_cnpj:
-                    # Renomeia para o padrão interno
-                    self.df_desp.rename(columns={col_valor: 'VALOR_PADRAO', col_cnpj: 'CNPJ_PADRAO'}, inplace=True)
-
-                    # LÓGICA DE CONVERSÃO DE NÚMEROS INTELIGENTE
-                    def limpar_valor(val):
-                        if not val: return 0.0
-                        val = str(val).strip()
-                        # Se tiver vírgula, assume formato BR (1.000,00) -> 1000.00
-                        if ',' in val:
-                            val = val.replace('.', '').replace(',', '.')
-                        # Se não tiver vírgula, assume formato US (292907.23) -> Mantém
-                        return float(val)
-
-                    self.df_desp['VALOR_PADRAO'] = self.df_desp['VALOR_PADRAO'].apply(limpar_valor)
-                    
-                    # Limpeza de CNPJ para Join
-                    self.df_desp['CNPJ_CLEAN'] = self.df_desp['CNPJ_PADRAO'].str.replace(r'\D', '', regex=True)
+            # Prefere o dataset Parquet do Teste 1 (já tipado) ao CSV
+            parquet_desp = paths['desp_parquet']
+            if parquet_desp or os.path.exists(path_desp):
+                self.sources.append(parquet_desp or path_desp)
+                if parquet_desp:
+                    print(f"Carregando despesas do Parquet: {parquet_desp}")
+                    self.df_desp = read_consolidado_parquet(parquet_desp)
+                    # Mantém o contrato da API (Ano/Trimestre como texto)
+                    for c in ['Ano', 'Trimestre']:
+                        self.df_desp[c] = self.df_desp[c].astype('string').fillna('').astype('category')
                 else:
-                    print("❌ ERRO: Colunas 'VALOR' ou 'CNPJ' não encontradas no CSV de despesas.")
-                    print(f"Colunas encontradas: {self.df_desp.columns.tolist()}")
+                    # Lê como texto, com as colunas repetidas já como categorias. Encoding detectado
+                    # no prefixo e decodificação em uma única passada (linhas inválidas: fallback)
+                    stream, decoder = open_decoded(path_desp)
+                    with stream:
+                        self.df_desp = pd.read_csv(stream, sep=';', encoding='utf-8', dtype=csv_dtypes(DESPESAS_CSV_SCHEMA))
+                    self._log_encoding(path_desp, decoder)
+
+                self.df_desp = compact_frame(self.normalize_despesas(self.df_desp), DESPESAS_SCHEMA)
+                print(f"Despesas em memória: {format_memory(memory_report(self.df_desp))}")
             else:
                  print(f"⚠️ AVISO: Arquivo de Despesas não encontrado: {path_desp}")
 
@@ -82,113 +214,315 @@ class DataService:
             # 3. CARGA DE AGREGADOS
             # ---------------------------
             if os.path.exists(path_agg):
-                self.df_agg = pd.read_csv(path_agg, sep=';', encoding='utf-8')
-                self.df_agg.columns = [c.strip().upper() for c in self.df_agg.columns]
-                
-                col_total = next((c for c in self.df_agg.columns if 'TOTAL' in c or 'VALOR' in c), None)
-                if col_total:
-                     # Garante float
-                    def limpar_agg(val):
-                        if pd.isna(val): return 0.0
-                        if isinstance(val, (int, float)): return float(val)
-                        val = str(val).strip()
-                        if ',' in val: return float(val.replace(',', '.'))
-                        return float(val)
-                        
-                    self.df_agg[col_total] = self.df_agg[col_total].apply(limpar_agg)
-                    self.df_agg.rename(columns={col_total: 'DESPESA_TOTAL'}, inplace=True)
+                self.df_agg = self.read_agregados(path_agg)
 
             print("✅ Dados carregados e normalizados com sucesso!")
 
         except Exception as e:
+            self.load_error = e
             print(f"❌ ERRO CRÍTICO NO DATASERVICE: {e}")
             import traceback
             traceback.print_exc()
 
-    def get_operadoras(self, page: int, limit: int, search: str = None):
-        resultado = self.df_ops.copy()
-        
-        col_razao = next((c for c in resultado.columns if 'RAZAO' in c), 'RAZAOSOCIAL')
-        col_reg = next((c for c in resultado.columns if 'REGISTRO' in c), 'REGISTROANS')
-        
-        # Garante que as colunas existam antes de filtrar
-        if col_razao not in resultado.columns: resultado[col_razao] = "N/I"
-        if col_reg not in resultado.columns: resultado[col_reg] = "000000"
+    # Operadoras do Teste 2 ou, sem o CSV, do snapshot do cadastro CADOP (offline, sem reparsear)
+    def load_operadoras(self, paths):
+        if os.path.exists(paths['ops']):
+            return self.read_operadoras(paths['ops'])
+        registry = CadopRegistry(registry_dir(self.base_dir)).load()
+        if registry.empty:
+            print(f"⚠️ AVISO: Arquivo de Operadoras não encontrado: {paths['ops']}")
+            return None
+        print(f"Operadoras carregadas do cadastro CADOP local: {registry.directory}")
+        df_ops = registry.operadoras_por_cnpj().astype(object).fillna('')
+        df_ops.columns = [c.upper() for c in df_ops.columns]
+        return df_ops
 
-        if search:
-            s = search.upper()
-            resultado = resultado[
-                resultado[col_razao].str.contains(s, na=False) |
-                resultado[col_reg].str.contains(s, na=False)
-            ]
+    @staticmethod
+    def read_operadoras(path_ops):
+        df_ops = pd.read_csv(path_ops, sep=';', encoding='utf-8', dtype=str)
+        df_ops.fillna('', inplace=True)
+        # Normaliza colunas para evitar erros de Case Sensitive
+        df_ops.columns = [c.strip().upper() for c in df_ops.columns]
+        # Garante que temos as chaves principais
+        if 'REGISTROANS' not in df_ops.columns and 'REGISTRO' in df_ops.columns:
+            df_ops.rename(columns={'REGISTRO': 'REGISTROANS'}, inplace=True)
+        return df_ops
+
+    # Normaliza as despesas (a base inteira ou um bloco dela): nomes de colunas,
+    # VALOR_PADRAO numérico e CNPJ_CLEAN (via memo) para o join com o cadastro.
+    def normalize_despesas(self, df_desp):
+        # Normaliza nomes das colunas 
+        # Ex: 'Valor Despesas' vira 'VALOR DESPESAS'
+        df_desp.columns = [c.strip().upper() for c in df_desp.columns]
+
+        # Tenta encontrar a coluna de VALOR dinamicamente
+        col_valor = next((c for c in df_desp.columns if 'VALOR' in c), None)
+        col_cnpj = next((c for c in df_desp.columns if 'CNPJ' in c), None)
+
+        if col_valor and col_cnpj:
+            # Renomeia para o padrão interno
+            df_desp.rename(columns={col_valor: 'VALOR_PADRAO', col_cnpj: 'CNPJ_PADRAO'}, inplace=True)
+
+            # Valores do Parquet já são float64: dispensa o parsing linha a linha
+            if not pd.api.types.is_numeric_dtype(df_desp['VALOR_PADRAO']):
+                df_desp['VALOR_PADRAO'] = df_desp['VALOR_PADRAO'].apply(limpar_valor)
+            
+            # Limpeza de CNPJ para Join
+            df_desp['CNPJ_CLEAN'] = self.cnpj_memo.clean(df_desp['CNPJ_PADRAO'])
+        else:
+            print("❌ ERRO: Colunas 'VALOR' ou 'CNPJ' não encontradas no CSV de despesas.")
+            print(f"Colunas encontradas: {df_desp.columns.tolist()}")
+        return df_desp
+
+    @staticmethod
+    def read_agregados(path_agg):
+        df_agg = pd.read_csv(path_agg, sep=';', encoding='utf-8')
+        df_agg.columns = [c.strip().upper() for c in df_agg.columns]
         
-        total = len(resultado)
+        col_total = next((c for c in df_agg.columns if 'TOTAL' in c or 'VALOR' in c), None)
+        if col_total:
+            # Garante float
+            def limpar_agg(val):
+                if pd.isna(val): return 0.0
+                if isinstance(val, (int, float)): return float(val)
+                val = str(val).strip()
+                if ',' in val: return float(val.replace(',', '.'))
+                return float(val)
+                
+            df_agg[col_total] = df_agg[col_total].apply(limpar_agg)
+            df_agg.rename(columns={col_total: 'DESPESA_TOTAL'}, inplace=True)
+        return df_agg
+
+    # Índices em memória, construídos uma única vez após a carga:
+    # - ops_by_registro: RegistroANS -> registro da operadora (busca O(1));
+    # - despesas_slices: CNPJ -> (início, fim) do bloco contíguo da operadora em df_desp,
+    #   que é reordenado por CNPJ (ordenação estável: mantém a ordem original dentro do bloco).
+    def _build_indexes(self):
+        self.col_reg = next((c for c in self.df_ops.columns if 'REGISTRO' in c), 'REGISTROANS')
+        self.col_razao = next((c for c in self.df_ops.columns if 'RAZAO' in c), 'RAZAOSOCIAL')
+
+        self.ops_by_registro = {}
+        self.ops_records = self._operadora_records(self.df_ops) if self.col_reg in self.df_ops.columns else []
+        for record in self.ops_records:
+            self.ops_by_registro.setdefault(record['RegistroANS'], record)
+        self.search_index = SearchIndex(
+            [r['RazaoSocial'] for r in self.ops_records],
+            [r['RegistroANS'] for r in self.ops_records]
+        )
+        # Ordem estável para paginação por cursor: (RegistroANS, CNPJ, posição original)
+        self.ops_keyset = sorted((r['RegistroANS'], r['CNPJ'], i) for i, r in enumerate(self.ops_records))
+        self.ops_keyset_pos = [0] * len(self.ops_keyset)
+        for pos, (_, _, i) in enumerate(self.ops_keyset):
+            self.ops_keyset_pos[i] = pos
+
+        self.despesas_slices = {}
+        if 'CNPJ_CLEAN' in self.df_desp.columns:
+            # Vindo do snapshot, as despesas já estão ordenadas
+            if not self.df_desp['CNPJ_CLEAN'].is_monotonic_increasing:
+                self.df_desp = self.df_desp.sort_values('CNPJ_CLEAN', kind='stable').reset_index(drop=True)
+            cnpjs = self.df_desp['CNPJ_CLEAN'].to_numpy(dtype=object)
+            if len(cnpjs):
+                # Início de cada bloco = posições onde o CNPJ muda
+                starts = np.concatenate(([0], np.flatnonzero(cnpjs[1:] != cnpjs[:-1]) + 1))
+                ends = np.append(starts[1:], len(cnpjs))
+                self.despesas_slices = {
+                    cnpjs[a]: (int(a), int(b)) for a, b in zip(starts, ends) if isinstance(cnpjs[a], str)
+                }
+
+        # Colunas das despesas, resolvidas uma vez (antes eram buscadas a cada requisição)
+        self.col_data = next((c for c in self.df_desp.columns if 'DATA' in c), None) # Pode não existir no consolidado se for por trim
+        self.col_ano = next((c for c in self.df_desp.columns if 'ANO' in c), 'ANO')
+        self.col_trim = next((c for c in self.df_desp.columns if 'TRIM' in c), 'TRIMESTRE')
+
+        self._build_aggregates()
+
+    # Agregados das despesas: as células (CNPJ, Ano, Trimestre) dão origem aos cubos (rollup.py)
+    # e às análises do Teste 3 (analytics.py). As despesas já estão inteiras em memória, então
+    # agregam em uma única passada (re-fatiar em blocos só repetiria o combine() a cada bloco).
+    def _build_aggregates(self):
+        celulas = ExpenseCells()
+        colunas = ['CNPJ_CLEAN', 'VALOR_PADRAO', self.col_ano, self.col_trim]
+        if set(colunas) <= set(self.df_desp.columns) and len(self.df_desp):
+            celulas.add(pd.DataFrame({
+                'CNPJ': self.df_desp['CNPJ_CLEAN'],
+                'Ano': self.df_desp[self.col_ano],
+                'Trimestre': self.df_desp[self.col_trim],
+                'Valor': self.df_desp['VALOR_PADRAO'],
+            }))
+
+        self.cells = celulas
+        self._build_cubes(celulas.cells, self.ops_records)
+
+    # Cubos e análises a partir das células e das operadoras (registros no formato da API)
+    def _build_cubes(self, celulas, ops_records):
+        ops = pd.DataFrame(ops_records, columns=["RegistroANS", "CNPJ", "RazaoSocial", "UF", "Modalidade"])
+        cadastro = ops.replace('', np.nan)
+        cadastro['CNPJ'] = self.cnpj_memo.clean(cadastro['CNPJ'])
+
+        nomes = dict(zip(ops['RegistroANS'][::-1], ops['RazaoSocial'][::-1]))
+        self.rollup = RollupCube.from_cells(celulas, cadastro[["RegistroANS", "CNPJ", "UF", "Modalidade"]], nomes)
+        self.analytics = MarketAnalytics(celulas, cadastro[["CNPJ", "RegistroANS", "RazaoSocial", "UF"]])
+
+    # Converte linhas de df_ops no formato de resposta da API.
+    def _operadora_records(self, df):
+        cols = {
+            "RegistroANS": self.col_reg, "CNPJ": 'CNPJ', "RazaoSocial": self.col_razao,
+            "UF": 'UF', "Modalidade": 'MODALIDADE'
+        }
+        data = {key: (df[col] if col in df.columns else pd.Series('', index=df.index)) for key, col in cols.items()}
+        return pd.DataFrame(data).to_dict('records')
+
+    # Listagem paginada: a busca devolve os ids já ranqueados (com cache por consulta),
+    # então o total é o tamanho do resultado e a página é uma fatia dos ids.
+    def get_operadoras(self, page: int, limit: int, search: str = None, fmt=FORMAT_RECORDS):
+        ids = self.search_index.search(search or '')
+
         inicio = (page - 1) * limit
         fim = inicio + limit
-        
-        retorno = []
-        for _, row in resultado.iloc[inicio:fim].iterrows():
-            retorno.append({
-                "RegistroANS": row.get(col_reg, ''),
-                "CNPJ": row.get('CNPJ', ''),
-                "RazaoSocial": row.get(col_razao, ''),
-                "UF": row.get('UF', ''),
-                "Modalidade": row.get('MODALIDADE', '')
-            })
+        pagina = [self.ops_records[i] for i in ids[inicio:fim]]
+        if fmt == FORMAT_COLUMNS:
+            campos = ["RegistroANS", "CNPJ", "RazaoSocial", "UF", "Modalidade"]
+            pagina = {campo: [op[campo] for op in pagina] for campo in campos}
 
         return {
-            "data": retorno,
-            "total": total
+            "data": pagina,
+            "total": len(ids)
         }
 
-    def get_operadora_by_registro(self, registro: str):
-        col_reg = next((c for c in self.df_ops.columns if 'REGISTRO' in c), 'REGISTROANS')
-        
-        op = self.df_ops[self.df_ops[col_reg] == registro]
-        if op.empty:
-            return None
-            
-        row = op.iloc[0]
-        col_razao = next((c for c in self.df_ops.columns if 'RAZAO' in c), 'RAZAOSOCIAL')
-        
+    # Paginação por cursor (keyset) sobre (RegistroANS, CNPJ, posição): a próxima página
+    # começa logo depois da última chave vista, então é estável mesmo se os dados forem
+    # recarregados entre uma página e outra. Com busca, filtra os ids encontrados
+    # mantendo a mesma ordem. Retorna os dados, o total e a chave da última linha (ou None).
+    def get_operadoras_keyset(self, limit: int, after=None, search: str = None, fmt=FORMAT_RECORDS):
+        if search:
+            ids = self.search_index.search(search)
+            posicoes = sorted(self.ops_keyset_pos[i] for i in ids)
+            total = len(ids)
+        else:
+            posicoes = range(len(self.ops_keyset))
+            total = len(self.ops_keyset)
+
+        inicio = 0
+        if after is not None:
+            corte = bisect.bisect_right(self.ops_keyset, tuple(after))
+            inicio = bisect.bisect_left(posicoes, corte)
+        janela = posicoes[inicio:inicio + limit]
+
+        pagina = [self.ops_records[self.ops_keyset[pos][2]] for pos in janela]
+        if fmt == FORMAT_COLUMNS:
+            campos = ["RegistroANS", "CNPJ", "RazaoSocial", "UF", "Modalidade"]
+            pagina = {campo: [op[campo] for op in pagina] for campo in campos}
+
+        tem_mais = inicio + limit < len(posicoes)
         return {
-            "RegistroANS": row.get(col_reg, ''),
-            "CNPJ": row.get('CNPJ', ''),
-            "RazaoSocial": row.get(col_razao, ''),
-            "UF": row.get('UF', ''),
-            "Modalidade": row.get('MODALIDADE', '')
+            "data": pagina,
+            "total": total,
+            "last_key": list(self.ops_keyset[janela[-1]]) if tem_mais else None
         }
 
-    def get_despesas_by_registro(self, registro: str):
+    def get_operadora_by_registro(self, registro: str):
+        op = self.ops_by_registro.get(registro)
+        return dict(op) if op else None
+
+    # Intervalo (início, fim) das despesas da operadora em df_desp; None se a operadora não existe
+    def _despesas_range(self, registro: str):
         op_data = self.get_operadora_by_registro(registro)
         if not op_data:
             return None
         
         # CNPJ limpo para comparação
         cnpj_alvo = str(op_data['CNPJ']).replace('.', '').replace('/', '').replace('-', '')
-        
-        if 'CNPJ_CLEAN' not in self.df_desp.columns:
-            return []
 
-        despesas = self.df_desp[self.df_desp['CNPJ_CLEAN'] == cnpj_alvo]
+        # Bloco contíguo da operadora: O(k) no número de despesas dela
+        return self.despesas_slices.get(cnpj_alvo, (0, 0))
+
+    def count_despesas(self, registro: str):
+        intervalo = self._despesas_range(registro)
+        return None if intervalo is None else intervalo[1] - intervalo[0]
+
+    # Extrai colunas das despesas de uma vez (sem iterrows); coluna ausente vira o valor padrão
+    @staticmethod
+    def _colunas(df, mapeamento):
+        return {
+            campo: df[col].tolist() if col in df.columns else [padrao] * len(df)
+            for campo, (col, padrao) in mapeamento.items()
+        }
+
+    # 'offset'/'limit' recortam o bloco da operadora (paginação por cursor na rota)
+    def get_despesas_by_registro(self, registro: str, fmt=FORMAT_RECORDS, offset=0, limit=None):
+        intervalo = self._despesas_range(registro)
+        if intervalo is None:
+            return None
+
+        inicio, fim = intervalo
+        inicio = min(inicio + offset, fim)
+        if limit is not None:
+            fim = min(inicio + limit, fim)
+        despesas = self.df_desp.iloc[inicio:fim]
         
-        # Mapeamento dinâmico das colunas do seu CSV
-        col_data = next((c for c in self.df_desp.columns if 'DATA' in c), None) # Pode não existir no consolidado se for por trim
-        col_ano = next((c for c in self.df_desp.columns if 'ANO' in c), 'ANO')
-        col_trim = next((c for c in self.df_desp.columns if 'TRIM' in c), 'TRIMESTRE')
-
-        saida = []
-        for _, row in despesas.iterrows():
-            data_evento = row.get(col_data, f"{row.get(col_trim)}º Tri/{row.get(col_ano)}")
-            
-            saida.append({
-                "Data_Evento": data_evento,
-                "Ano": row.get(col_ano, ''),
-                "Trimestre": row.get(col_trim, ''),
-                "Valor_Despesa": row.get('VALOR_PADRAO', 0.0)
-            })
-            
-        return saida
+        col_data, col_ano, col_trim = self.col_data, self.col_ano, self.col_trim
+        colunas = self._colunas(despesas, {
+            "Data_Evento": (col_data, None),
+            "Ano": (col_ano, ''),
+            "Trimestre": (col_trim, ''),
+            "Valor_Despesa": ('VALOR_PADRAO', 0.0),
+        })
+        if col_data not in despesas.columns:
+            trimestres = self._colunas(despesas, {"t": (col_trim, None), "a": (col_ano, None)})
+            colunas["Data_Evento"] = [f"{t}º Tri/{a}" for t, a in zip(trimestres["t"], trimestres["a"])]
+
+        return to_format(colunas, fmt)
+
+    # Página keyset do histórico, ordenado por (Ano, Trimestre, ordem no trimestre): começa logo
+    # após 'after' (última chave vista), então continua válida depois de uma recarga dos dados.
+    # Serve aos dois backends: o bloco da operadora já é pequeno (O(k) despesas).
+    def get_despesas_keyset(self, registro: str, limit: int, after=None, fmt=FORMAT_RECORDS):
+        colunas = self.get_despesas_by_registro(registro, FORMAT_COLUMNS)
+        if colunas is None:
+            return None
+        chaves = despesas_keys(colunas["Ano"], colunas["Trimestre"])
+        ordem = sorted(range(len(chaves)), key=chaves.__getitem__)
+        inicio = 0
+        if after is not None:
+            inicio = bisect.bisect_right([chaves[i] for i in ordem], tuple(after))
+        janela = ordem[inicio:inicio + limit]
+        tem_mais = inicio + limit < len(ordem)
+        return {
+            "data": to_format({campo: [valores[i] for i in janela] for campo, valores in colunas.items()}, fmt),
+            "total": len(chaves),
+            "last_key": list(chaves[janela[-1]]) if tem_mais else None
+        }
+
+    # Exportação completa em blocos de 'chunk_rows' linhas: cada bloco é um dict de colunas.
+    # Só um bloco fica materializado por vez, então a memória não cresce com o tamanho da base.
+    def iter_export(self, dataset, chunk_rows=EXPORT_CHUNK_ROWS):
+        if dataset == 'operadoras':
+            campos = ["RegistroANS", "CNPJ", "RazaoSocial", "UF", "Modalidade"]
+            for a in range(0, len(self.ops_records), chunk_rows):
+                bloco = self.ops_records[a:a + chunk_rows]
+                yield {campo: [op[campo] for op in bloco] for campo in campos}
+            return
+
+        col_razao = next((c for c in self.df_desp.columns if 'RAZAO' in c), 'RAZAOSOCIAL')
+        mapeamento = {
+            "CNPJ": ('CNPJ_PADRAO', ''),
+            "RazaoSocial": (col_razao, ''),
+            "Ano": (self.col_ano, ''),
+            "Trimestre": (self.col_trim, ''),
+            "Valor_Despesa": ('VALOR_PADRAO', 0.0),
+        }
+        for a in range(0, len(self.df_desp), chunk_rows):
+            yield self._colunas(self.df_desp.iloc[a:a + chunk_rows], mapeamento)
+
+    # Estatísticas sob demanda, respondidas pelos cubos de agregação
+    def query_stats(self, group_by=(), filters=None, order_by='total', top=None):
+        dados, total_grupos = self.rollup.query(group_by, filters, order_by, top)
+        return {
+            "group_by": list(group_by),
+            "filters": filters or {},
+            "total_groups": total_grupos,
+            "data": dados
+        }
 
     def get_dashboard_stats(self):
         if self.df_agg.empty:
@@ -205,14 +539,347 @@ class DataService:
             .reset_index()
         )
         
-        retorno = []
-        for _, row in top_uf.iterrows():
-            retorno.append({
-                "UF": row[grp_col],
-                "Despesa_Total": row['DESPESA_TOTAL']
-            })
+        retorno = to_format({
+            "UF": top_uf[grp_col].tolist(),
+            "Despesa_Total": top_uf['DESPESA_TOTAL'].tolist()
+        })
 
         return {"top_estados": retorno}
 
 
-data_service = DataService()
\ No newline at end of file
+# Mesma interface do DataService, mas com os dados num banco SQLite com o esquema estrela do
+# Teste 3 (sql_store.py) em vez de DataFrames. O banco é montado uma vez por geração, lendo as
+# despesas em blocos, então a base não precisa caber na memória; busca, detalhe, histórico,
+# contagem e exportação viram consultas indexadas. Cubos e análises continuam em memória,
+# montados a partir das células (CNPJ, Ano, Trimestre) gravadas no próprio banco.
+class SqlDataService(DataService):
+    backend = 'sqlite'
+
+    def __init__(self, base_dir=DEFAULT_BASE_DIR):
+        self.base_dir = base_dir
+        self.col_reg = 'REGISTROANS'
+        self.col_razao = 'RAZAOSOCIAL'
+        self.cells = ExpenseCells()
+        self.rollup = RollupCube.empty()
+        self.analytics = None
+        self.razao_por_cnpj = None
+        self.sources = []
+        self.encodings = {}
+        self.load_error = None
+        self.signature = source_signature(source_paths(base_dir).values())
+        self.generation = hashlib.sha1(repr(self.signature).encode()).hexdigest()[:16]
+        self.cnpj_memo = CnpjMemo(memo_path(base_dir))
+
+        # Reaproveita o banco da mesma geração, se houver; senão monta a partir das fontes
+        inicio = time.perf_counter()
+        caminho = database_path(base_dir, self.generation)
+        self.loaded_from = 'sqlite'
+        if not database_ready(caminho, self.generation):
+            self.loaded_from = 'fontes'
+            self._build_database(caminho)
+            if self.load_error is not None:
+                caminho = empty_database(os.path.dirname(caminho))
+
+        self.store = SqlStore(caminho)
+        self.total_operadoras = self.store.query_one("SELECT COUNT(*) FROM dim_operadoras")[0]
+        self._build_cubes(self._read_celulas(), self._query_operadoras("ORDER BY rowid"))
+        self._save_memo()
+        self.load_seconds = time.perf_counter() - inicio
+        print(f"⏱️ Dados prontos em {self.load_seconds:.2f}s (origem: {self.loaded_from}, banco {caminho})")
+
+    def _build_database(self, caminho):
+        paths = source_paths(self.base_dir)
+        print(f"Montando o banco SQLite a partir de: {self.base_dir}")
+        writer = SqlWriter(caminho)
+        try:
+            self.sources = [paths['cadop'] or paths['ops'], paths['agg']]
+            df_ops = self.load_operadoras(paths)
+            if df_ops is not None:
+                self.col_reg = next((c for c in df_ops.columns if 'REGISTRO' in c), 'REGISTROANS')
+                self.col_razao = next((c for c in df_ops.columns if 'RAZAO' in c), 'RAZAOSOCIAL')
+                writer.insert_operadoras(self._operadora_records(df_ops))
+
+            writer.insert_celulas(self._load_despesas(writer, paths).cells)
+
+            if os.path.exists(paths['agg']):
+                writer.insert_agregados(self.read_agregados(paths['agg']))
+
+            writer.commit(self.generation)
+            print(f"✅ Banco SQLite montado: {caminho}")
+        except Exception as e:
+            writer.abort()
+            self.load_error = e
+            print(f"❌ ERRO CRÍTICO NO DATASERVICE: {e}")
+            import traceback
+            traceback.print_exc()
+
+    # Grava as despesas bloco a bloco, acumulando as células agregadas no caminho.
+    # O CSV é decodificado em uma única passada (encoding detectado no prefixo, fallback por linha).
+    def _load_despesas(self, writer, paths):
+        parquet_desp, path_desp = paths['desp_parquet'], paths['desp']
+        if not (parquet_desp or os.path.exists(path_desp)):
+            print(f"⚠️ AVISO: Arquivo de Despesas não encontrado: {path_desp}")
+            return ExpenseCells()
+
+        self.sources.append(parquet_desp or path_desp)
+        if parquet_desp:
+            return self._write_despesas(writer, iter_consolidado_parquet(parquet_desp, AGGREGATE_CHUNK_ROWS))
+        stream, decoder = open_decoded(path_desp)
+        with stream:
+            blocos = pd.read_csv(stream, sep=';', encoding='utf-8', dtype=str, chunksize=AGGREGATE_CHUNK_ROWS)
+            celulas = self._write_despesas(writer, blocos)
+        self._log_encoding(path_desp, decoder)
+        return celulas
+
+    def _write_despesas(self, writer, blocos):
+        celulas = ExpenseCells()
+        for bloco in blocos:
+            bloco = self.normalize_despesas(bloco)
+            if 'CNPJ_CLEAN' not in bloco.columns:
+                break
+            col_data = next((c for c in bloco.columns if 'DATA' in c), None)
+            col_ano = next((c for c in bloco.columns if 'ANO' in c), None)
+            col_trim = next((c for c in bloco.columns if 'TRIM' in c), None)
+            fatos = pd.DataFrame({
+                'CNPJ': bloco['CNPJ_CLEAN'],
+                'Data': bloco[col_data] if col_data else None,
+                'Ano': bloco[col_ano] if col_ano else None,
+                'Trimestre': bloco[col_trim] if col_trim else None,
+                'Valor': bloco['VALOR_PADRAO'],
+            })
+            writer.insert_despesas(fatos)
+            celulas.add(fatos)
+        return celulas
+
+    def _read_celulas(self):
+        celulas = self.store.frame(
+            "SELECT cnpj AS CNPJ, ano AS Ano, trimestre AS Trimestre, n, total, media AS mean, m2 FROM agg_celulas")
+        celulas['Ano'] = celulas['Ano'].astype('Int16')
+        celulas['Trimestre'] = celulas['Trimestre'].astype('Int16')
+        return celulas
+
+    # Operadoras (registros no formato da API) de um SELECT sobre dim_operadoras
+    def _query_operadoras(self, complemento, params=()):
+        linhas = self.store.query(f"SELECT {OPERADORA_COLUNAS} FROM dim_operadoras {complemento}", params)
+        return [dict(zip(CAMPOS_OPERADORA, linha)) for linha in linhas]
+
+    @staticmethod
+    def _operadoras_format(linhas, fmt):
+        if fmt == FORMAT_COLUMNS:
+            return {campo: [linha[i] for linha in linhas] for i, campo in enumerate(CAMPOS_OPERADORA)}
+        return [dict(zip(CAMPOS_OPERADORA, linha)) for linha in linhas]
+
+    # Busca com a mesma normalização e ranking do SearchIndex; sem busca, a ordem do arquivo
+    def get_operadoras(self, page: int, limit: int, search: str = None, fmt=FORMAT_RECORDS):
+        termo = fold(search or '')
+        inicio = (page - 1) * limit
+        if not termo:
+            linhas = self.store.query(f"SELECT {OPERADORA_COLUNAS} FROM dim_operadoras ORDER BY rowid LIMIT ? OFFSET ?",
+                                      (limit, inicio))
+            return {"data": self._operadoras_format(linhas, fmt), "total": self.total_operadoras}
+
+        filtro, params = search_filter(termo, self.store.fts)
+        total = self.store.query_one(f"SELECT COUNT(*) FROM busca_operadoras WHERE {filtro}", params)[0]
+        linhas = self.store.query(
+            f"SELECT {OPERADORA_COLUNAS} FROM busca_operadoras "
+            f"JOIN dim_operadoras ON dim_operadoras.rowid = busca_operadoras.rowid "
+            f"WHERE {filtro} ORDER BY {BUSCA_RANK}, busca_operadoras.rowid LIMIT :limit OFFSET :offset",
+            {**params, 'limit': limit, 'offset': inicio}
+        )
+        return {"data": self._operadoras_format(linhas, fmt), "total": total}
+
+    # Keyset sobre (RegistroANS, CNPJ, rowid): a chave primária da dimensão já dá a ordem
+    def get_operadoras_keyset(self, limit: int, after=None, search: str = None, fmt=FORMAT_RECORDS):
+        termo = fold(search or '')
+        origem, filtro, params = "dim_operadoras", "1", {'limit': limit + 1}
+        total = self.total_operadoras
+        if termo:
+            filtro, busca = search_filter(termo, self.store.fts)
+            params.update(busca)
+            origem += " JOIN busca_operadoras ON busca_operadoras.rowid = dim_operadoras.rowid"
+            total = self.store.query_one(f"SELECT COUNT(*) FROM busca_operadoras WHERE {filtro}", busca)[0]
+        if after is not None:
+            filtro += " AND (dim_operadoras.registro_ans, dim_operadoras.cnpj, dim_operadoras.rowid) > (:reg, :cnpj, :pos)"
+            params.update(reg=after[0], cnpj=after[1], pos=after[2])
+
+        linhas = self.store.query(
+            f"SELECT {OPERADORA_COLUNAS}, dim_operadoras.rowid FROM {origem} WHERE {filtro} "
+            f"ORDER BY dim_operadoras.registro_ans, dim_operadoras.cnpj, dim_operadoras.rowid LIMIT :limit", params
+        )
+        tem_mais = len(linhas) > limit
+        linhas = linhas[:limit]
+        return {
+            "data": self._operadoras_format([linha[:-1] for linha in linhas], fmt),
+            "total": total,
+            "last_key": [linhas[-1][0], linhas[-1][1], linhas[-1][-1]] if tem_mais else None
+        }
+
+    def get_operadora_by_registro(self, registro: str):
+        ops = self._query_operadoras("WHERE registro_ans = ?", (registro,))
+        return ops[0] if ops else None
+
+    # CNPJ limpo da operadora (chave de fato_despesas); None se a operadora não existe
+    def _cnpj_operadora(self, registro: str):
+        op_data = self.get_operadora_by_registro(registro)
+        if not op_data:
+            return None
+        return str(op_data['CNPJ']).replace('.', '').replace('/', '').replace('-', '')
+
+    def count_despesas(self, registro: str):
+        cnpj = self._cnpj_operadora(registro)
+        if cnpj is None:
+            return None
+        return self.store.query_one("SELECT COUNT(*) FROM fato_despesas WHERE cnpj_operadora = ?", (cnpj,))[0]
+
+    # Histórico pelo índice idx_cnpj, na ordem de carga (id)
+    def get_despesas_by_registro(self, registro: str, fmt=FORMAT_RECORDS, offset=0, limit=None):
+        cnpj = self._cnpj_operadora(registro)
+        if cnpj is None:
+            return None
+
+        linhas = self.store.query(
+            "SELECT COALESCE(data_evento, trimestre || 'º Tri/' || ano), COALESCE(CAST(ano AS TEXT), ''), "
+            "COALESCE(CAST(trimestre AS TEXT), ''), valor_despesa "
+            "FROM fato_despesas WHERE cnpj_operadora = ? ORDER BY id LIMIT ? OFFSET ?",
+            (cnpj, -1 if limit is None else limit, offset)
+        )
+        campos = ["Data_Evento", "Ano", "Trimestre", "Valor_Despesa"]
+        return to_format({campo: [linha[i] for linha in linhas] for i, campo in enumerate(campos)}, fmt)
+
+    # Despesas na ordem do índice por CNPJ (a mesma do DataService). O fato só guarda o CNPJ
+    # limpo, então a razão social vem do cadastro (vazia para operadoras fora dele).
+    def iter_export(self, dataset, chunk_rows=EXPORT_CHUNK_ROWS):
+        if dataset == 'operadoras':
+            for linhas in self.store.iter_query(f"SELECT {OPERADORA_COLUNAS} FROM dim_operadoras ORDER BY rowid",
+                                                chunk_rows=chunk_rows):
+                yield self._operadoras_format(linhas, FORMAT_COLUMNS)
+            return
+
+        if self.razao_por_cnpj is None:
+            razoes = {}
+            for cnpj, razao in self.store.query("SELECT cnpj, razao_social FROM dim_operadoras ORDER BY rowid"):
+                razoes.setdefault(str(cnpj).replace('.', '').replace('/', '').replace('-', ''), razao)
+            self.razao_por_cnpj = razoes
+
+        campos = ["CNPJ", "RazaoSocial", "Ano", "Trimestre", "Valor_Despesa"]
+        for linhas in self.store.iter_query(
+                "SELECT cnpj_operadora, COALESCE(CAST(ano AS TEXT), ''), COALESCE(CAST(trimestre AS TEXT), ''), "
+                "valor_despesa FROM fato_despesas ORDER BY cnpj_operadora, id", chunk_rows=chunk_rows):
+            cnpjs = [linha[0] for linha in linhas]
+            yield dict(zip(campos, [
+                [c or '' for c in cnpjs],
+                [self.razao_por_cnpj.get(c, '') for c in cnpjs],
+                [linha[1] for linha in linhas],
+                [linha[2] for linha in linhas],
+                [linha[3] for linha in linhas],
+            ]))
+
+    def get_dashboard_stats(self):
+        linhas = self.store.query(
+            "SELECT uf, SUM(despesa_total) FROM agg_despesas_uf WHERE uf IS NOT NULL "
+            "GROUP BY uf ORDER BY SUM(despesa_total) DESC LIMIT 5"
+        )
+        if not linhas:
+            return None
+        return {"top_estados": to_format({"UF": [l[0] for l in linhas], "Despesa_Total": [l[1] for l in linhas]})}
+
+
+# Backends disponíveis (DATA_BACKEND)
+BACKENDS = {'pandas': DataService, 'sqlite': SqlDataService}
+
+def create_data_service(base_dir=DEFAULT_BASE_DIR, backend=None):
+    backend = backend or DATA_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"DATA_BACKEND inválido: {backend} (use {' ou '.join(BACKENDS)})")
+    return BACKENDS[backend](base_dir)
+
+
+# Mantém o DataService atual (um snapshot imutável, já indexado) e troca por um novo
+# quando os arquivos de origem mudam. A carga roda fora do caminho das requisições e a
+# troca é uma única atribuição: quem já pegou o snapshot antigo termina nele.
+class LiveDataService:
+    def __init__(self, base_dir=DEFAULT_BASE_DIR, backend=None):
+        self.base_dir = base_dir
+        self.backend = backend or DATA_BACKEND
+        self.reload_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.watcher = None
+        self.last_reload = None
+        self.current = create_data_service(base_dir, self.backend)
+        self.signature = self.current.signature
+
+    def status(self):
+        return {
+            "backend": self.current.backend,
+            "generation": self.current.generation,
+            "loaded_from": self.current.loaded_from,
+            "load_seconds": round(self.current.load_seconds, 3),
+            "encodings": self.current.encodings,
+            "memory_kb": process_memory(),
+            "last_reload": self.last_reload,
+        }
+
+    # Atalho para o snapshot atual (ex: data_service.generation)
+    def __getattr__(self, name):
+        return getattr(self.current, name)
+
+    # Recarrega os dados. Sem 'force', só recarrega se a assinatura dos arquivos mudou.
+    def reload(self, force=False, trigger='manual'):
+        with self.reload_lock:
+            signature = source_signature(source_paths(self.base_dir).values())
+            if not force and signature == self.signature:
+                return None
+
+            inicio = time.perf_counter()
+            novo = create_data_service(self.base_dir, self.backend)
+            duracao = time.perf_counter() - inicio
+
+            info = {
+                "trigger": trigger,
+                "duration_seconds": round(duracao, 3),
+                "generation": novo.generation,
+                "reloaded": novo.load_error is None,
+                "finished_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+            if novo.load_error is None:
+                self.current = novo
+                self.signature = novo.signature
+                print(f"🔄 Dados recarregados em {duracao:.2f}s (geração {novo.generation}, gatilho: {trigger})")
+            else:
+                info["error"] = str(novo.load_error)
+                print(f"❌ Recarga falhou em {duracao:.2f}s; mantendo a geração {self.current.generation}")
+            self.last_reload = info
+            return info
+
+    # Verifica periodicamente os mtimes. Só recarrega quando a assinatura nova se repete
+    # em duas verificações seguidas, para não ler um arquivo que o ETL ainda está escrevendo.
+    def _watch(self, interval):
+        pendente = None
+        while not self.stop_event.wait(interval):
+            signature = source_signature(source_paths(self.base_dir).values())
+            if signature == self.signature:
+                pendente = None
+            elif signature != pendente:
+                pendente = signature
+            else:
+                pendente = None
+                try:
+                    self.reload(trigger='watcher')
+                except Exception as e:
+                    print(f"❌ ERRO NA RECARGA AUTOMÁTICA: {e}")
+
+    def start_watcher(self, interval=RELOAD_INTERVAL):
+        if interval <= 0 or (self.watcher and self.watcher.is_alive()):
+            return
+        self.stop_event.clear()
+        self.watcher = threading.Thread(target=self._watch, args=(interval,), name='data-reload', daemon=True)
+        self.watcher.start()
+
+    def stop_watcher(self):
+        self.stop_event.set()
+        if self.watcher:
+            self.watcher.join()
+            self.watcher = None
+
+
+data_service = LiveDataService()
\ No newline at end of file
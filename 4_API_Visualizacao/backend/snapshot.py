@@ -0,0 +1,74 @@
+import glob
+import json
+import os
+
+# PyArrow é opcional: sem ele a API sempre carrega a partir dos CSVs.
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Snapshot binário (Arrow IPC, sem compressão) do estado já normalizado do DataService:
+# um cache de subida rápida. Os processos seguintes da mesma geração leem os arquivos
+# (via memory_map, sem parse) em vez de reparsear os CSVs. A conversão para pandas copia
+# as colunas para a memória do próprio processo: cada worker tem a sua cópia dos dados.
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR')
+SNAPSHOT_ENABLED = os.environ.get('DATA_SNAPSHOT', '1') != '0'
+META_NAME = 'meta.json'
+
+def snapshot_available():
+    return pa is not None and SNAPSHOT_ENABLED
+
+def snapshot_dir(base_dir):
+    return SNAPSHOT_DIR or os.path.join(base_dir, '4_API_Visualizacao', 'snapshot')
+
+def _table_path(directory, name, generation):
+    return os.path.join(directory, f"{name}-{generation}.arrow")
+
+# Grava as tabelas da geração informada. Cada arquivo é escrito em um temporário e
+# renomeado; o meta.json vai por último e é ele que "publica" o snapshot.
+def save_snapshot(directory, generation, frames):
+    os.makedirs(directory, exist_ok=True)
+    sufixo = f".tmp{os.getpid()}"
+
+    for name, df in frames.items():
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        path = _table_path(directory, name, generation)
+        with pa.OSFile(path + sufixo, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(path + sufixo, path)
+
+    meta_path = os.path.join(directory, META_NAME)
+    with open(meta_path + sufixo, 'w', encoding='utf-8') as f:
+        json.dump({"generation": generation, "tables": sorted(frames)}, f)
+    os.replace(meta_path + sufixo, meta_path)
+
+    # Remove gerações antigas (quem ainda as lê continua lendo: o arquivo só some do diretório)
+    for path in glob.glob(os.path.join(directory, '*.arrow')):
+        if not os.path.basename(path).endswith(f"-{generation}.arrow"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+# Carrega o snapshot se ele for da geração informada. Retorna {nome: DataFrame} ou None.
+# to_pandas() materializa as colunas (categorias viram códigos + valores distintos em pandas).
+def load_snapshot(directory, generation):
+    meta_path = os.path.join(directory, META_NAME)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("generation") != generation:
+            return None
+
+        frames = {}
+        for name in meta["tables"]:
+            source = pa.memory_map(_table_path(directory, name, generation), 'r')
+            frames[name] = pa.ipc.open_file(source).read_all().to_pandas()
+        return frames
+    except (OSError, ValueError, KeyError, pa.ArrowInvalid) as e:
+        print(f"⚠️ AVISO: Snapshot ignorado ({e}); carregando das fontes.")
+        return None
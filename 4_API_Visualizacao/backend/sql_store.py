@@ -0,0 +1,225 @@
+import glob
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+import bootstrap  # raiz do repositório no path, para o 'shared'
+from shared.star_schema import connect, create_indexes, create_tables
+from search_index import NGRAM, fold
+from snapshot import snapshot_dir
+
+# Armazenamento em SQLite para o backend DATA_BACKEND=sqlite (ver SqlDataService).
+# Um arquivo por geração do dataset com o esquema estrela do Teste 3 e seus índices; as
+# consultas da API viram SELECTs indexados e as despesas não precisam caber na memória.
+SQLITE_DIR = os.environ.get('SQLITE_DIR')
+DB_PREFIX = 'api-'
+# Banco só com o esquema, usado quando a carga falha (nome fixo: regravado a cada falha, nunca acumula)
+EMPTY_DB_NAME = f"{DB_PREFIX}vazio.sqlite"
+
+# Tabelas próprias da API, além do esquema estrela:
+# - api_meta: geração do arquivo e se a busca usa FTS5;
+# - agg_celulas: agregados por (CNPJ, Ano, Trimestre), base dos cubos e das análises.
+API_TABLES = [
+    "CREATE TABLE IF NOT EXISTS api_meta (chave TEXT PRIMARY KEY, valor TEXT)",
+    """CREATE TABLE IF NOT EXISTS agg_celulas (
+        cnpj TEXT, ano INTEGER, trimestre INTEGER, n INTEGER, total REAL, media REAL, m2 REAL
+    )""",
+]
+# Busca de operadoras: razão social e registro normalizados (fold), com o mesmo rowid da
+# dimensão. Com FTS5 o tokenizer trigram indexa substrings; sem ele, a tabela é varrida.
+BUSCA_FTS = "CREATE VIRTUAL TABLE busca_operadoras USING fts5(razao, registro, tokenize='trigram')"
+BUSCA_TABELA = "CREATE TABLE busca_operadoras (razao TEXT, registro TEXT)"
+
+# Colunas da operadora no formato de resposta (RegistroANS, CNPJ, RazaoSocial, UF, Modalidade)
+OPERADORA_COLUNAS = ("dim_operadoras.registro_ans, dim_operadoras.cnpj, dim_operadoras.razao_social, "
+                     "COALESCE(dim_operadoras.uf, ''), COALESCE(dim_operadoras.modalidade, '')")
+
+# Mesma ordem de relevância do SearchIndex (search_index.py)
+BUSCA_RANK = """CASE
+    WHEN busca_operadoras.registro = :t THEN 0
+    WHEN substr(busca_operadoras.razao, 1, length(:t)) = :t
+      OR substr(busca_operadoras.registro, 1, length(:t)) = :t THEN 1
+    WHEN instr(busca_operadoras.razao, ' ' || :t) > 0 THEN 2
+    ELSE 3 END"""
+
+
+def database_path(base_dir, generation):
+    return os.path.join(SQLITE_DIR or snapshot_dir(base_dir), f"{DB_PREFIX}{generation}.sqlite")
+
+
+# O banco existe e é da geração pedida?
+def database_ready(path, generation):
+    if not os.path.exists(path):
+        return False
+    try:
+        conn = connect(path, readonly=True)
+        try:
+            linha = conn.execute("SELECT valor FROM api_meta WHERE chave = 'generation'").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return linha is not None and linha[0] == generation
+
+
+# Filtro da busca (termo já normalizado com fold) sobre busca_operadoras.
+# Com FTS5, termos de NGRAM+ caracteres usam o índice trigram para achar os candidatos;
+# a conferência por substring (instr) vale para os dois casos e decide o resultado.
+def search_filter(termo, fts):
+    params = {'t': termo}
+    filtro = "(instr(busca_operadoras.razao, :t) > 0 OR instr(busca_operadoras.registro, :t) > 0)"
+    if fts and len(termo) >= NGRAM:
+        filtro = "busca_operadoras MATCH :fts AND " + filtro
+        params['fts'] = '"' + termo.replace('"', '""') + '"'
+    return filtro, params
+
+
+# Série -> lista para o executemany (nulos do pandas viram None)
+def _valores(serie):
+    return serie.astype(object).where(serie.notna(), None).tolist()
+
+
+# Monta o banco de uma geração. Tudo é gravado num arquivo temporário (sem journal: se a
+# carga falhar, ele é descartado); os índices são criados só no final e o arquivo é
+# renomeado para o nome definitivo, então leitores nunca veem um banco pela metade.
+class SqlWriter:
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f"{path}.tmp{os.getpid()}"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+        self.conn = connect(self.tmp_path)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        create_tables(self.conn)
+        for ddl in API_TABLES:
+            self.conn.execute(ddl)
+        try:
+            self.conn.execute(BUSCA_FTS)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.conn.execute(BUSCA_TABELA)
+            self.fts = False
+
+    # records: operadoras no formato da API. Registro repetido: vale a primeira linha.
+    def insert_operadoras(self, records):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO dim_operadoras (registro_ans, cnpj, razao_social, modalidade, uf) VALUES (?, ?, ?, ?, ?)",
+            [(r['RegistroANS'], r['CNPJ'], r['RazaoSocial'], r['Modalidade'] or None, r['UF'] or None) for r in records]
+        )
+        linhas = self.conn.execute("SELECT rowid, razao_social, registro_ans FROM dim_operadoras").fetchall()
+        self.conn.executemany(
+            "INSERT INTO busca_operadoras (rowid, razao, registro) VALUES (?, ?, ?)",
+            [(rowid, fold(razao), fold(registro)) for rowid, razao, registro in linhas]
+        )
+
+    # fatos: DataFrame com CNPJ (limpo), Data, Ano, Trimestre e Valor
+    def insert_despesas(self, fatos):
+        self.conn.executemany(
+            "INSERT INTO fato_despesas (cnpj_operadora, data_evento, trimestre, ano, valor_despesa) VALUES (?, ?, ?, ?, ?)",
+            zip(_valores(fatos['CNPJ']), _valores(fatos['Data']),
+                _valores(pd.to_numeric(fatos['Trimestre'], errors='coerce').astype('Int64')),
+                _valores(pd.to_numeric(fatos['Ano'], errors='coerce').astype('Int64')),
+                fatos['Valor'].astype('float64').tolist())
+        )
+
+    # df_agg: despesas_agregadas.csv já normalizado (colunas em maiúsculas); coluna ausente vira nulo
+    def insert_agregados(self, df_agg):
+        colunas = ['RAZAOSOCIAL', 'REGISTROANS', 'MODALIDADE', 'UF', 'DESPESA_TOTAL',
+                   'MEDIA_TRIMESTRAL', 'DESVIO_PADRAO', 'QTD_REGISTROS']
+        if df_agg.empty:
+            return
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO agg_despesas_uf (razao_social, registro_ans, modalidade, uf, despesa_total, "
+            "media_trimestral, desvio_padrao, qtd_registros) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            zip(*(_valores(df_agg[c]) if c in df_agg.columns else [None] * len(df_agg) for c in colunas))
+        )
+
+    def insert_celulas(self, celulas):
+        self.conn.executemany(
+            "INSERT INTO agg_celulas (cnpj, ano, trimestre, n, total, media, m2) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            zip(*(_valores(celulas[c]) for c in ['CNPJ', 'Ano', 'Trimestre', 'n', 'total', 'mean', 'm2']))
+        )
+
+    # 'prune': remove as gerações anteriores à última (a que acabou de ser substituída continua
+    # no disco: workers que ainda não recarregaram abrem conexões novas nela a cada exportação)
+    def commit(self, generation, prune=True):
+        create_indexes(self.conn)
+        self.conn.executemany("INSERT OR REPLACE INTO api_meta (chave, valor) VALUES (?, ?)",
+                              [('generation', generation), ('fts', '1' if self.fts else '0')])
+        self.conn.commit()
+        self.conn.execute("ANALYZE")
+        self.conn.close()
+        os.replace(self.tmp_path, self.path)
+
+        if prune:
+            self.prune()
+
+    # Mantém este banco e a geração anterior (a mais recente das demais); remove o resto.
+    # O banco vazio (EMPTY_DB_NAME) não conta como geração anterior e fica: é um só arquivo.
+    def prune(self):
+        antigos = [p for p in glob.glob(os.path.join(os.path.dirname(self.path), f"{DB_PREFIX}*.sqlite"))
+                   if p != self.path and os.path.basename(p) != EMPTY_DB_NAME]
+        antigos.sort(key=lambda p: os.stat(p).st_mtime_ns, reverse=True)
+        for path in antigos[1:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def abort(self):
+        self.conn.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+# Banco só com o esquema (carga que falhou): a API responde vazio em vez de quebrar.
+# Fica na pasta dos bancos, com nome fixo: falhas repetidas reaproveitam o mesmo arquivo.
+def empty_database(directory):
+    path = os.path.join(directory, EMPTY_DB_NAME)
+    if not database_ready(path, ''):
+        SqlWriter(path).commit('', prune=False)
+    return path
+
+
+# Leitura do banco de uma geração. Cada thread (event loop e workers do executor) tem a
+# sua conexão somente leitura, com o cache de instruções preparadas do sqlite3.
+class SqlStore:
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        meta = dict(self.query("SELECT chave, valor FROM api_meta"))
+        self.fts = meta.get('fts') == '1'
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = connect(self.path, readonly=True)
+        return conn
+
+    def query(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchone()
+
+    def frame(self, sql, params=()):
+        return pd.read_sql_query(sql, self.connection(), params=params)
+
+    # Resultado em blocos de 'chunk_rows' linhas. Usa uma conexão própria: o gerador da
+    # exportação pode ser consumido por threads diferentes a cada bloco.
+    def iter_query(self, sql, params=(), chunk_rows=10000):
+        conn = connect(self.path, readonly=True, check_same_thread=False)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                linhas = cursor.fetchmany(chunk_rows)
+                if not linhas:
+                    break
+                yield linhas
+        finally:
+            conn.close()
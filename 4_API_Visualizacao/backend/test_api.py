@@ -1,6 +1,51 @@
+import asyncio
+import atexit
+import os
+import shutil
+import threading
+import tempfile
 import unittest
+import pandas as pd
 from fastapi.testclient import TestClient
+
+# Monta uma raiz fake do repositório com os CSVs que o DataService espera
+def criar_base_dados(base_dir):
+    os.makedirs(os.path.join(base_dir, '2_Transformacao_Validacao', 'data'))
+    os.makedirs(os.path.join(base_dir, '1_Leitura_Transformacao_Dados'))
+
+    with open(os.path.join(base_dir, '2_Transformacao_Validacao', 'data', 'operadoras_ativas.csv'), 'w', encoding='utf-8') as f:
+        f.write("Registro_ANS;CNPJ;Razao_Social;UF;Modalidade\n")
+        f.write("111111;11.111.111/0001-11;OPERADORA ALFA;SP;Medicina de Grupo\n")
+        f.write("222222;22.222.222/0001-22;OPERADORA BETA;RJ;Cooperativa Médica\n")
+        f.write("333333;33.333.333/0001-33;OPERADORA GAMA;MG;Autogestão\n")
+
+    with open(os.path.join(base_dir, '1_Leitura_Transformacao_Dados', 'consolidado_despesas.csv'), 'w', encoding='utf-8') as f:
+        f.write("CNPJ;RazaoSocial;Trimestre;Ano;Valor Despesas\n")
+        f.write("22222222000122;OPERADORA BETA;1;2024;100,50\n")
+        f.write("11111111000111;OPERADORA ALFA;1;2024;10,00\n")
+        f.write("22222222000122;OPERADORA BETA;2;2024;200,00\n")
+        f.write("11111111000111;OPERADORA ALFA;2;2024;20,00\n")
+        f.write("22222222000122;OPERADORA BETA;3;2024;300,00\n")
+
+# O serviço global (o do 'main') sobe contra uma base temporária: os testes não leem os
+# dados reais nem gravam snapshot, SQLite ou memo de CNPJs na árvore do repositório
+BASE_TESTES = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, BASE_TESTES, True)
+criar_base_dados(BASE_TESTES)
+os.environ['DATA_BASE_DIR'] = BASE_TESTES
+
 from main import app
+import time
+from service import DataService, SqlDataService, LiveDataService, create_data_service, data_service
+from search_index import SearchIndex, fold
+from rollup import ExpenseCells
+import gzip
+import json
+from cache import ResponseCache, etag_matches, accepts_gzip
+from pagination import encode_cursor
+from starlette.requests import Request
+from executor import BoundedExecutor
+from fastapi import HTTPException
 
 # Cria um cliente de teste que simula requisições reais
 client = TestClient(app)
@@ -51,5 +96,635 @@ class TestOperadorasAPI(unittest.TestCase):
         response = client.get("/api/rota-que-nao-existe")
         self.assertEqual(response.status_code, 404)
 
+class TestAdmin(unittest.TestCase):
+    # Mesma autorização da recarga: sem ADMIN_TOKEN, só localhost; com ele, o cabeçalho
+    def test_status(self):
+        os.environ.pop('ADMIN_TOKEN', None)
+        self.assertEqual(client.get("/api/admin/status").status_code, 403)
+        os.environ['ADMIN_TOKEN'] = 'segredo'
+        try:
+            self.assertEqual(client.get("/api/admin/status").status_code, 403)
+            self.assertEqual(client.get("/api/admin/status", headers={"X-Admin-Token": "segredo"}).status_code, 200)
+        finally:
+            os.environ.pop('ADMIN_TOKEN', None)
+
+        response = TestClient(app, client=("127.0.0.1", 50000)).get("/api/admin/status")
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        self.assertIn(dados["loaded_from"], ("fontes", "snapshot"))
+        self.assertIn("memory_kb", dados)
+
+    # Sem ADMIN_TOKEN, a recarga só é aceita a partir do localhost
+    def test_reload_endpoint(self):
+        os.environ.pop('ADMIN_TOKEN', None)
+        self.assertEqual(client.post("/api/admin/reload").status_code, 403)
+
+        response = TestClient(app, client=("127.0.0.1", 50000)).post("/api/admin/reload")
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        self.assertEqual(dados["trigger"], "admin")
+        self.assertIn("duration_seconds", dados)
+
+    # Com ADMIN_TOKEN, vale o cabeçalho X-Admin-Token (de qualquer origem, inclusive localhost)
+    def test_reload_com_token(self):
+        os.environ['ADMIN_TOKEN'] = 'segredo'
+        try:
+            self.assertEqual(client.post("/api/admin/reload").status_code, 403)
+            local = TestClient(app, client=("127.0.0.1", 50000))
+            self.assertEqual(local.post("/api/admin/reload", headers={"X-Admin-Token": "errado"}).status_code, 403)
+            self.assertEqual(client.post("/api/admin/reload", headers={"X-Admin-Token": "segredo"}).status_code, 200)
+        finally:
+            os.environ.pop('ADMIN_TOKEN', None)
+
+class TestCacheRespostas(unittest.TestCase):
+    # A resposta traz ETag forte; repetir a requisição com If-None-Match devolve 304 sem corpo
+    def test_etag_e_304(self):
+        response = client.get("/api/operadoras?limit=5")
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["etag"]
+        self.assertTrue(etag.startswith('"'))
+        self.assertEqual(response.headers["cache-control"], "no-cache")
+
+        response = client.get("/api/operadoras?limit=5", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        # Parâmetros diferentes são outra entrada do cache
+        response = client.get("/api/operadoras?limit=6", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('"a", "b"', '"b"'))
+        self.assertTrue(etag_matches('W/"b"', '"b"'))
+        self.assertTrue(etag_matches('*', '"b"'))
+        self.assertFalse(etag_matches(None, '"b"'))
+        self.assertFalse(etag_matches('"a"', '"b"'))
+
+    # Limite por quantidade e por bytes remove primeiro o item usado há mais tempo
+    def test_lru(self):
+        cache = ResponseCache(max_entries=2, max_bytes=10)
+        cache.put('a', b'1234', '"a"')
+        cache.put('b', b'1234', '"b"')
+        cache.get('a')
+        cache.put('c', b'12', '"c"')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), (b'1234', '"a"', None))
+
+        cache.put('d', b'123456789', '"d"')
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.size_bytes, 9)
+
+class TestExecutorLimitado(unittest.TestCase):
+    def setUp(self):
+        self.executor = BoundedExecutor(max_workers=1, max_queue=0)
+        self.liberar = threading.Event()
+
+    def tearDown(self):
+        self.liberar.set()
+        self.executor.shutdown()
+
+    def test_resultado(self):
+        self.assertEqual(asyncio.run(self.executor.run(lambda: 42, timeout=1)), 42)
+
+    # Passou do tempo limite: 504; a vaga só é liberada quando a tarefa termina de fato
+    def test_timeout_e_admissao(self):
+        async def cenario():
+            with self.assertRaises(HTTPException) as ctx:
+                await self.executor.run(lambda: self.liberar.wait(5), timeout=0.05)
+            self.assertEqual(ctx.exception.status_code, 504)
+
+            # Executor lotado: 503 imediato com Retry-After
+            with self.assertRaises(HTTPException) as ctx:
+                await self.executor.run(lambda: 1, timeout=1)
+            self.assertEqual(ctx.exception.status_code, 503)
+            self.assertIn("Retry-After", ctx.exception.headers)
+
+            self.liberar.set()
+            for _ in range(100):
+                if self.executor.stats()["in_flight"] == 0:
+                    break
+                await asyncio.sleep(0.01)
+            self.assertEqual(await self.executor.run(lambda: 1, timeout=1), 1)
+
+        asyncio.run(cenario())
+        stats = self.executor.stats()
+        self.assertEqual((stats["rejected"], stats["timed_out"]), (1, 1))
+
+    # Tarefa que estourou o tempo ainda na fila é cancelada e libera a vaga na hora
+    def test_timeout_na_fila_libera_vaga(self):
+        executor = BoundedExecutor(max_workers=1, max_queue=1)
+        try:
+            async def cenario():
+                ocupando = asyncio.ensure_future(executor.run(lambda: self.liberar.wait(5), timeout=5))
+                await asyncio.sleep(0.05)
+                with self.assertRaises(HTTPException) as ctx:
+                    await executor.run(lambda: self.fail("tarefa cancelada executou"), timeout=0.05)
+                self.assertEqual(ctx.exception.status_code, 504)
+                self.assertEqual(executor.stats()["in_flight"], 1)
+                self.liberar.set()
+                self.assertTrue(await ocupando)
+            asyncio.run(cenario())
+        finally:
+            executor.shutdown()
+
+def requisicao(headers):
+    return Request({"type": "http", "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]})
+
+class TestSerializacao(unittest.TestCase):
+    def test_accepts_gzip(self):
+        self.assertTrue(accepts_gzip('br, gzip, deflate'))
+        self.assertFalse(accepts_gzip('gzip;q=0'))
+        self.assertFalse(accepts_gzip(None))
+
+    # Corpo grande sai comprimido para quem aceita gzip, com ETag próprio e Vary
+    def test_gzip_cacheado(self):
+        cache = ResponseCache()
+        dados = [{"Valor": i, "Nome": "OPERADORA"} for i in range(200)]
+
+        response = cache.respond(requisicao({"Accept-Encoding": "gzip"}), "r", {}, "g1", lambda: dados)
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        self.assertEqual(json.loads(gzip.decompress(response.body)), dados)
+        etag_gzip = response.headers["etag"]
+
+        response = cache.respond(requisicao({}), "r", {}, "g1", lambda: self.fail("deveria vir do cache"))
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(json.loads(response.body), dados)
+        self.assertNotEqual(response.headers["etag"], etag_gzip)
+
+        response = cache.respond(requisicao({"Accept-Encoding": "gzip", "If-None-Match": etag_gzip}), "r", {}, "g1", None)
+        self.assertEqual(response.status_code, 304)
+
+class TestDataServiceIndices(unittest.TestCase):
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        criar_base_dados(self.base_dir)
+        self.service = DataService(base_dir=self.base_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    # Busca por registro vem do índice e mantém o formato de resposta
+    def test_operadora_por_registro(self):
+        op = self.service.get_operadora_by_registro('222222')
+        self.assertEqual(op, {
+            "RegistroANS": '222222', "CNPJ": '22.222.222/0001-22', "RazaoSocial": 'OPERADORA BETA',
+            "UF": 'RJ', "Modalidade": 'Cooperativa Médica'
+        })
+        self.assertIsNone(self.service.get_operadora_by_registro('999999'))
+
+    # Despesas saem do bloco da operadora, na ordem original do arquivo
+    def test_despesas_por_registro(self):
+        despesas = self.service.get_despesas_by_registro('222222')
+        self.assertEqual([d['Trimestre'] for d in despesas], ['1', '2', '3'])
+        self.assertEqual([d['Valor_Despesa'] for d in despesas], [100.5, 200.0, 300.0])
+
+        self.assertEqual(len(self.service.get_despesas_by_registro('111111')), 2)
+        # Operadora sem despesas: lista vazia; registro inexistente: None
+        self.assertEqual(self.service.get_despesas_by_registro('333333'), [])
+        self.assertIsNone(self.service.get_despesas_by_registro('999999'))
+
+    # Segunda carga da mesma geração vem do snapshot binário, com as mesmas respostas
+    def test_snapshot_binario(self):
+        self.assertEqual(self.service.loaded_from, 'fontes')
+        recarregado = DataService(base_dir=self.base_dir)
+        self.assertEqual(recarregado.loaded_from, 'snapshot')
+        self.assertEqual(recarregado.generation, self.service.generation)
+        for registro in ['111111', '222222', '333333']:
+            self.assertEqual(recarregado.get_operadora_by_registro(registro), self.service.get_operadora_by_registro(registro))
+            self.assertEqual(recarregado.get_despesas_by_registro(registro), self.service.get_despesas_by_registro(registro))
+        self.assertEqual(recarregado.get_operadoras(1, 10, 'beta'), self.service.get_operadoras(1, 10, 'beta'))
+
+        # Desligado, sempre parseia as fontes
+        self.assertEqual(DataService(base_dir=self.base_dir, use_snapshot=False).loaded_from, 'fontes')
+
+    # Despesas no esquema compacto (categorias + float64), inclusive vindas do snapshot
+    def test_esquema_compacto(self):
+        for service in (self.service, DataService(base_dir=self.base_dir)):
+            tipos = service.df_desp.dtypes
+            for col in ['CNPJ_PADRAO', 'CNPJ_CLEAN', 'RAZAOSOCIAL', 'ANO', 'TRIMESTRE']:
+                self.assertIsInstance(tipos[col], pd.CategoricalDtype, col)
+            self.assertEqual(str(tipos['VALOR_PADRAO']), 'float64')
+            self.assertEqual(service.get_despesas_by_registro('111111')[0]['Ano'], '2024')
+
+    # CNPJs limpos na carga ficam no memo compartilhado; a próxima carga não recalcula nenhum
+    def test_memo_cnpj(self):
+        self.assertTrue(os.path.exists(self.service.cnpj_memo.path))
+        recarregado = DataService(base_dir=self.base_dir, use_snapshot=False)
+        self.assertEqual(recarregado.cnpj_memo.new_entries, 0)
+        self.assertEqual(recarregado.cnpj_memo.entries['11.111.111/0001-11'], ('11111111000111', False))
+
+    # Sem o operadoras_ativas.csv do Teste 2, as operadoras vêm do cadastro CADOP local
+    def test_operadoras_do_cadastro_cadop(self):
+        os.remove(os.path.join(self.base_dir, '2_Transformacao_Validacao', 'data', 'operadoras_ativas.csv'))
+        pasta = os.path.join(self.base_dir, '1_Leitura_Transformacao_Dados', 'data', 'auxiliary')
+        os.makedirs(pasta)
+        with open(os.path.join(pasta, 'Relatorio_Cadop.csv'), 'w', encoding='utf-8') as f:
+            f.write("REGISTRO_OPERADORA;CNPJ;Razao_Social;Modalidade;UF\n")
+            f.write('"222222";"22222222000122";"OPERADORA BETA";"Cooperativa Médica";"RJ"\n')
+
+        for classe in (DataService, SqlDataService):
+            service = classe(base_dir=self.base_dir)
+            self.assertEqual(service.get_operadora_by_registro('222222'), {
+                "RegistroANS": '222222', "CNPJ": '22222222000122', "RazaoSocial": 'OPERADORA BETA',
+                "UF": 'RJ', "Modalidade": 'Cooperativa Médica'
+            })
+            self.assertEqual(len(service.get_despesas_by_registro('222222')), 3)
+        self.assertTrue(os.path.exists(os.path.join(pasta, 'cadop_registry.pkl')))
+
+    # Despesas UTF-8 com uma linha em Latin-1: uma única leitura, só essa linha em fallback
+    def test_encoding_despesas(self):
+        path = os.path.join(self.base_dir, '1_Leitura_Transformacao_Dados', 'consolidado_despesas.csv')
+        with open(path, 'ab') as f:
+            f.write("33333333000133;OPERADORA GAMA SAÚDE;1;2024;5,00\n".encode('utf-8'))
+            f.write("33333333000133;OPERADORA GAMA SAÚDE;2;2024;7,00\n".encode('latin1'))
+
+        for classe in (DataService, SqlDataService):
+            service = classe(base_dir=self.base_dir)
+            self.assertEqual(service.encodings[path], {'encoding': 'utf-8', 'fallback_rows': 1})
+            self.assertEqual(len(service.get_despesas_by_registro('333333')), 2)
+
+    # A geração do dataset muda quando um arquivo de origem muda
+    def test_geracao_dataset(self):
+        self.assertEqual(DataService(base_dir=self.base_dir).generation, self.service.generation)
+        path = os.path.join(self.base_dir, '2_Transformacao_Validacao', 'data', 'operadoras_ativas.csv')
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write("444444;44.444.444/0001-44;OPERADORA DELTA;BA;Autogestão\n")
+        self.assertNotEqual(DataService(base_dir=self.base_dir).generation, self.service.generation)
+
+    # Cubos: agregações batem com o cálculo direto sobre as despesas
+    def test_rollup(self):
+        por_uf = self.service.query_stats(['uf'])
+        self.assertEqual(por_uf["total_groups"], 2)
+        rj = por_uf["data"][0]
+        self.assertEqual((rj["UF"], rj["Registros"], rj["Total"], rj["Media"]), ('RJ', 3, 600.5, 200.17))
+        self.assertAlmostEqual(rj["Desvio_Padrao"], round(float(pd.Series([100.5, 200.0, 300.0]).std()), 2))
+
+        # Série temporal com variação sobre o trimestre anterior
+        serie = self.service.query_stats(['ano', 'trimestre'], order_by='dims')["data"]
+        self.assertEqual([(d["Trimestre"], d["Total"]) for d in serie], [(1, 110.5), (2, 220.0), (3, 300.0)])
+        self.assertEqual([d["Variacao_Pct"] for d in serie], [None, 99.1, 36.36])
+
+        # Filtro + por operadora (usa o cubo por operadora) e top-N
+        ops = self.service.query_stats(['operadora'], {'trimestre': ['1', '2']}, top=1)
+        self.assertEqual(ops["total_groups"], 2)
+        self.assertEqual(ops["data"][0]["RegistroANS"], '222222')
+        self.assertEqual(ops["data"][0]["RazaoSocial"], 'OPERADORA BETA')
+        self.assertEqual(ops["data"][0]["Total"], 300.5)
+
+        with self.assertRaises(ValueError):
+            self.service.query_stats(['cor'])
+
+    # Despesas com período inválido continuam nos totais dos cubos (grupo de período nulo)
+    def test_rollup_periodo_invalido(self):
+        with open(os.path.join(self.base_dir, '1_Leitura_Transformacao_Dados', 'consolidado_despesas.csv'), 'a', encoding='utf-8') as f:
+            f.write("22222222000122;OPERADORA BETA;;2024;50,00\n")
+            f.write("22222222000122;OPERADORA BETA;X;abc;10,00\n")
+
+        for classe in (DataService, SqlDataService):
+            service = classe(base_dir=self.base_dir)
+            rj = service.query_stats(['uf'])["data"][0]
+            self.assertEqual((rj["UF"], rj["Registros"], rj["Total"]), ('RJ', 5, 660.5), classe.__name__)
+
+            serie = service.query_stats(['ano', 'trimestre'], order_by='dims')["data"]
+            self.assertEqual(sum(d["Total"] for d in serie), 690.5)
+            self.assertIn((None, 10.0), [(d["Trimestre"], d["Total"]) for d in serie if d["Ano"] is None])
+            # As análises por trimestre continuam ignorando essas linhas
+            self.assertEqual(service.analytics.top_crescimento()[0]["Crescimento_Pct"], 198.51)
+
+    # Análises do Teste 3 a partir dos agregados da carga
+    def test_analises(self):
+        analytics = self.service.analytics
+        crescimento = analytics.top_crescimento()
+        self.assertEqual([c["RegistroANS"] for c in crescimento], ['222222', '111111'])
+        self.assertEqual(crescimento[0]["Crescimento_Pct"], 198.51)
+        self.assertEqual(crescimento[0]["Periodo"], '1T2024 -> 3T2024')
+
+        ufs = analytics.top_ufs()
+        self.assertEqual([(u["UF"], u["Despesa_Total"], u["Qtd_Operadoras"]) for u in ufs], [('RJ', 600.5, 1), ('SP', 30.0, 1)])
+
+        acima = analytics.operadoras_acima_media()
+        self.assertEqual([(a["RegistroANS"], a["Trimestres_Acima_Media"]) for a in acima], [('222222', 2)])
+        self.assertEqual(len(analytics.operadoras_acima_media(minimo=3)), 0)
+
+    # Acumular em blocos dá o mesmo resultado que agregar tudo de uma vez
+    def test_celulas_incrementais(self):
+        fatos = pd.DataFrame({'CNPJ': ['a', 'b', 'a', 'a'], 'Ano': ['2024'] * 4, 'Trimestre': ['1', '1', '1', '2'],
+                              'Valor': [1.0, 5.0, 3.0, 7.0]})
+        inteiro = ExpenseCells().add(fatos).cells.sort_values(['CNPJ', 'Trimestre']).reset_index(drop=True)
+        celulas = ExpenseCells().add(fatos.iloc[:1]).add(fatos.iloc[1:3]).add(fatos.iloc[3:])
+        em_blocos = celulas.cells.sort_values(['CNPJ', 'Trimestre']).reset_index(drop=True)
+        self.assertEqual(celulas.rows, 4)
+        pd.testing.assert_frame_equal(inteiro[['CNPJ', 'n', 'total', 'm2']], em_blocos[['CNPJ', 'n', 'total', 'm2']],
+                                      check_dtype=False)
+
+        # Linha a linha (blocos ficam pendentes entre as combinações): mesmo resultado
+        celulas = ExpenseCells()
+        for i in range(len(fatos)):
+            celulas.add(fatos.iloc[i:i + 1])
+        linha_a_linha = celulas.cells.sort_values(['CNPJ', 'Trimestre']).reset_index(drop=True)
+        pd.testing.assert_frame_equal(inteiro[['CNPJ', 'n', 'total', 'm2']], linha_a_linha[['CNPJ', 'n', 'total', 'm2']],
+                                      check_dtype=False)
+
+    # Formato colunar traz os mesmos valores que a lista de objetos
+    def test_formato_colunas(self):
+        registros = self.service.get_despesas_by_registro('222222')
+        colunas = self.service.get_despesas_by_registro('222222', 'columns')
+        self.assertEqual(list(colunas), ["Data_Evento", "Ano", "Trimestre", "Valor_Despesa"])
+        self.assertEqual([dict(zip(colunas, v)) for v in zip(*colunas.values())], registros)
+        self.assertEqual(registros[0]["Data_Evento"], "1º Tri/2024")
+
+        pagina = self.service.get_operadoras(1, 2, None, 'columns')
+        self.assertEqual(pagina["data"]["RegistroANS"], ['111111', '222222'])
+        self.assertEqual(pagina["total"], 3)
+
+    # Busca na listagem: total e páginas são fatias do resultado ranqueado
+    def test_paginacao_sobre_resultado(self):
+        pagina = self.service.get_operadoras(page=1, limit=2, search='operadora')
+        self.assertEqual(pagina['total'], 3)
+        self.assertEqual([o['RegistroANS'] for o in pagina['data']], ['111111', '222222'])
+
+        pagina = self.service.get_operadoras(page=2, limit=2, search='operadora')
+        self.assertEqual([o['RegistroANS'] for o in pagina['data']], ['333333'])
+
+        pagina = self.service.get_operadoras(page=1, limit=10, search='gamá')
+        self.assertEqual([o['RazaoSocial'] for o in pagina['data']], ['OPERADORA GAMA'])
+
+class TestRecargaDados(unittest.TestCase):
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        criar_base_dados(self.base_dir)
+        self.service = LiveDataService(base_dir=self.base_dir)
+        self.path_ops = os.path.join(self.base_dir, '2_Transformacao_Validacao', 'data', 'operadoras_ativas.csv')
+
+    def tearDown(self):
+        self.service.stop_watcher()
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def adicionar_operadora(self):
+        with open(self.path_ops, 'a', encoding='utf-8') as f:
+            f.write("444444;44.444.444/0001-44;OPERADORA DELTA;BA;Autogestão\n")
+
+    # Sem mudança nos arquivos não recarrega; com mudança troca o snapshot inteiro
+    def test_recarga_troca_snapshot(self):
+        self.assertIsNone(self.service.reload())
+
+        antigo = self.service.current
+        self.adicionar_operadora()
+        info = self.service.reload()
+        self.assertTrue(info["reloaded"])
+        self.assertGreaterEqual(info["duration_seconds"], 0)
+        self.assertNotEqual(self.service.generation, antigo.generation)
+        self.assertIsNotNone(self.service.get_operadora_by_registro('444444'))
+        # Quem segurava o snapshot antigo continua vendo os dados antigos
+        self.assertIsNone(antigo.get_operadora_by_registro('444444'))
+
+    # Falha na carga mantém o snapshot atual
+    def test_recarga_com_erro_mantem_dados(self):
+        atual = self.service.current
+        with open(self.path_ops, 'w', encoding='utf-8') as f:
+            f.write('Registro_ANS;CNPJ\n"111111;abc\n')
+        info = self.service.reload()
+        self.assertFalse(info["reloaded"])
+        self.assertIs(self.service.current, atual)
+
+    def test_watcher(self):
+        geracao = self.service.generation
+        self.service.start_watcher(interval=0.05)
+        self.adicionar_operadora()
+        limite = time.time() + 5
+        while self.service.generation == geracao and time.time() < limite:
+            time.sleep(0.05)
+        self.assertNotEqual(self.service.generation, geracao)
+        self.assertEqual(self.service.last_reload["trigger"], 'watcher')
+
+# Rotas sobre a base fake: troca o snapshot do serviço global durante o teste
+class TestRotasComDados(unittest.TestCase):
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        criar_base_dados(self.base_dir)
+        self.original = data_service.current
+        data_service.current = DataService(base_dir=self.base_dir)
+
+    def tearDown(self):
+        data_service.current = self.original
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def test_cursor_operadoras(self):
+        vistos, cursor = [], ""
+        while cursor is not None:
+            dados = client.get("/api/operadoras", params={"limit": 2, "cursor": cursor}).json()
+            vistos += [o["RegistroANS"] for o in dados["data"]]
+            self.assertEqual(dados["meta"]["total_records"], 3)
+            cursor = dados["meta"]["next_cursor"]
+        self.assertEqual(vistos, ['111111', '222222', '333333'])
+
+        # Com busca, o cursor percorre só os encontrados
+        dados = client.get("/api/operadoras", params={"limit": 1, "cursor": "", "search": "beta"}).json()
+        self.assertEqual([o["RegistroANS"] for o in dados["data"]], ['222222'])
+        self.assertIsNone(dados["meta"]["next_cursor"])
+
+        self.assertEqual(client.get("/api/operadoras", params={"cursor": "lixo"}).status_code, 400)
+        # Chave com tipos errados não chega à busca binária
+        for chave in [[1, 2, 3], ["111111", None, 0], ["111111", "x", "0"]]:
+            response = client.get("/api/operadoras", params={"cursor": encode_cursor({"k": chave})})
+            self.assertEqual(response.status_code, 400)
+
+    def test_cursor_despesas(self):
+        dados = client.get("/api/operadoras/222222/despesas", params={"limit": 2}).json()
+        self.assertEqual([d["Trimestre"] for d in dados["data"]], ['1', '2'])
+        self.assertEqual(dados["meta"]["total_records"], 3)
+
+        cursor = dados["meta"]["next_cursor"]
+        segunda = client.get("/api/operadoras/222222/despesas", params={"limit": 2, "cursor": cursor}).json()
+        self.assertEqual([d["Trimestre"] for d in segunda["data"]], ['3'])
+        self.assertIsNone(segunda["meta"]["next_cursor"])
+
+        # Depois de uma recarga com um trimestre novo, o mesmo cursor continua de onde parou
+        with open(os.path.join(self.base_dir, '1_Leitura_Transformacao_Dados', 'consolidado_despesas.csv'), 'a', encoding='utf-8') as f:
+            f.write("22222222000122;OPERADORA BETA;4;2024;400,00\n")
+        data_service.current = type(data_service.current)(base_dir=self.base_dir)
+        dados = client.get("/api/operadoras/222222/despesas", params={"limit": 2, "cursor": cursor}).json()
+        self.assertEqual([d["Trimestre"] for d in dados["data"]], ['3', '4'])
+        self.assertEqual(dados["meta"]["total_records"], 4)
+
+        for invalido in ["lixo", encode_cursor({"k": ["2024", 1, 0]}), encode_cursor({"g": "x", "o": 2})]:
+            response = client.get("/api/operadoras/222222/despesas", params={"cursor": invalido})
+            self.assertEqual(response.status_code, 400)
+
+    def test_estatisticas_cubo(self):
+        dados = client.get("/api/estatisticas", params={"group_by": "modalidade", "uf": "SP,RJ"}).json()
+        self.assertEqual({d["Modalidade"] for d in dados["data"]}, {"Medicina de Grupo", "Cooperativa Médica"})
+        self.assertEqual(client.get("/api/estatisticas", params={"group_by": "cor"}).status_code, 400)
+
+    def test_rotas_analises(self):
+        self.assertEqual(client.get("/api/analises/crescimento").json()[0]["RegistroANS"], '222222')
+        self.assertEqual(client.get("/api/analises/ufs", params={"top": 1}).json()[0]["UF"], 'RJ')
+        self.assertEqual(client.get("/api/analises/acima-media", params={"minimo": 1}).json()[0]["RegistroANS"], '222222')
+
+    def test_export(self):
+        response = client.get("/api/export/despesas", params={"format": "csv"})
+        self.assertEqual(response.status_code, 200)
+        linhas = response.text.strip().split('\n')
+        self.assertEqual(linhas[0], 'CNPJ;RazaoSocial;Ano;Trimestre;Valor_Despesa')
+        self.assertEqual(len(linhas), 6)
+
+        response = client.get("/api/export/operadoras")
+        registros = [json.loads(linha) for linha in response.text.strip().split('\n')]
+        self.assertEqual([r["RegistroANS"] for r in registros], ['111111', '222222', '333333'])
+        self.assertEqual(client.get("/api/export/outra").status_code, 422)
+
+    # Exportação em blocos: junta todos e confere com a base
+    def test_export_blocos(self):
+        blocos = list(data_service.current.iter_export('despesas', chunk_rows=2))
+        self.assertEqual([len(b["CNPJ"]) for b in blocos], [2, 2, 1])
+
+# As mesmas rotas com o backend SQLite
+class TestRotasComDadosSqlite(TestRotasComDados):
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        criar_base_dados(self.base_dir)
+        self.original = data_service.current
+        data_service.current = SqlDataService(base_dir=self.base_dir)
+
+# Backend SQLite: mesmas respostas do DataService em memória
+class TestSqlDataService(unittest.TestCase):
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        criar_base_dados(self.base_dir)
+        with open(os.path.join(self.base_dir, '2_Transformacao_Validacao', 'despesas_agregadas.csv'), 'w', encoding='utf-8') as f:
+            f.write("RazaoSocial;RegistroANS;Modalidade;UF;Despesa_Total;Media_Trimestral;Desvio_Padrao;Qtd_Registros\n")
+            f.write("OPERADORA BETA;222222;Cooperativa Médica;RJ;600.5;200.17;99.75;3\n")
+            f.write("OPERADORA ALFA;111111;Medicina de Grupo;SP;30.0;15.0;7.07;2\n")
+        self.pandas = DataService(base_dir=self.base_dir)
+        self.sql = SqlDataService(base_dir=self.base_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def test_mesmas_respostas(self):
+        for busca in [None, 'opera', 'beta', 'médica', '22', '222222', 'zz']:
+            for fmt in ['records', 'columns']:
+                self.assertEqual(self.sql.get_operadoras(1, 2, busca, fmt), self.pandas.get_operadoras(1, 2, busca, fmt))
+        for registro in ['111111', '222222', '333333', '999999']:
+            self.assertEqual(self.sql.get_operadora_by_registro(registro), self.pandas.get_operadora_by_registro(registro))
+            self.assertEqual(self.sql.count_despesas(registro), self.pandas.count_despesas(registro))
+            self.assertEqual(self.sql.get_despesas_by_registro(registro), self.pandas.get_despesas_by_registro(registro))
+            self.assertEqual(self.sql.get_despesas_by_registro(registro, 'columns', 1, 1),
+                             self.pandas.get_despesas_by_registro(registro, 'columns', 1, 1))
+        self.assertEqual(self.sql.get_dashboard_stats(), self.pandas.get_dashboard_stats())
+        self.assertEqual(self.sql.query_stats(['uf', 'ano', 'trimestre']), self.pandas.query_stats(['uf', 'ano', 'trimestre']))
+        self.assertEqual(self.sql.analytics.top_crescimento(), self.pandas.analytics.top_crescimento())
+        self.assertEqual(list(self.sql.iter_export('despesas')), list(self.pandas.iter_export('despesas')))
+
+    def test_keyset(self):
+        vistos, after = [], None
+        while True:
+            pagina = self.sql.get_operadoras_keyset(1, after, 'opera')
+            vistos += [o['RegistroANS'] for o in pagina['data']]
+            after = pagina['last_key']
+            if after is None:
+                break
+        self.assertEqual(vistos, ['111111', '222222', '333333'])
+        self.assertEqual(pagina['total'], 3)
+
+    # O banco da geração é reaproveitado; arquivo de origem novo gera outro banco
+    def test_banco_por_geracao(self):
+        self.assertEqual(self.sql.loaded_from, 'fontes')
+        reaberto = SqlDataService(base_dir=self.base_dir)
+        self.assertEqual(reaberto.loaded_from, 'sqlite')
+        self.assertEqual(reaberto.get_despesas_by_registro('222222'), self.sql.get_despesas_by_registro('222222'))
+
+        with open(os.path.join(self.base_dir, '1_Leitura_Transformacao_Dados', 'consolidado_despesas.csv'), 'a', encoding='utf-8') as f:
+            f.write("11111111000111;OPERADORA ALFA;3;2024;5,00\n")
+        novo = SqlDataService(base_dir=self.base_dir)
+        self.assertEqual(novo.loaded_from, 'fontes')
+        self.assertEqual(novo.count_despesas('111111'), 3)
+
+    # A geração anterior continua no disco depois da troca: quem ainda a serve abre conexões
+    # novas (outra thread, exportação); só as gerações mais antigas que ela são removidas
+    def test_geracao_anterior_continua_legivel(self):
+        despesas = os.path.join(self.base_dir, '1_Leitura_Transformacao_Dados', 'consolidado_despesas.csv')
+        with open(despesas, 'a', encoding='utf-8') as f:
+            f.write("11111111000111;OPERADORA ALFA;3;2024;5,00\n")
+        gen2 = SqlDataService(base_dir=self.base_dir)
+
+        resultado = {}
+        def ler():
+            try:
+                resultado['count'] = self.sql.store.query_one("SELECT COUNT(*) FROM fato_despesas")[0]
+                resultado['export'] = list(self.sql.iter_export('despesas'))
+            except Exception as e:
+                resultado['erro'] = e
+        leitor = threading.Thread(target=ler)
+        leitor.start()
+        leitor.join()
+        self.assertNotIn('erro', resultado)
+        self.assertEqual(resultado['count'], 5)
+        self.assertEqual(resultado['export'], list(self.pandas.iter_export('despesas')))
+
+        with open(despesas, 'a', encoding='utf-8') as f:
+            f.write("11111111000111;OPERADORA ALFA;4;2024;6,00\n")
+        SqlDataService(base_dir=self.base_dir)
+        self.assertFalse(os.path.exists(self.sql.store.path))
+        self.assertTrue(os.path.exists(gen2.store.path))
+
+    # Cargas que falham reaproveitam um único banco vazio na pasta dos bancos (nada em /tmp)
+    def test_falha_usa_banco_vazio_fixo(self):
+        import service as service_mod
+        insert_original = service_mod.SqlWriter.insert_celulas
+        def falhar(*args, **kwargs):
+            raise RuntimeError("falha simulada")
+        despesas = os.path.join(self.base_dir, '1_Leitura_Transformacao_Dados', 'consolidado_despesas.csv')
+        service_mod.SqlWriter.insert_celulas = falhar
+        try:
+            caminhos = set()
+            for trimestre in (3, 4):
+                with open(despesas, 'a', encoding='utf-8') as f:
+                    f.write(f"11111111000111;OPERADORA ALFA;{trimestre};2024;5,00\n")
+                falho = SqlDataService(base_dir=self.base_dir)
+                self.assertIsNotNone(falho.load_error)
+                self.assertEqual(falho.get_operadoras(1, 10), self.sql.get_operadoras(1, 10, 'zz'))
+                caminhos.add(falho.store.path)
+        finally:
+            service_mod.SqlWriter.insert_celulas = insert_original
+        self.assertEqual(caminhos, {os.path.join(os.path.dirname(self.sql.store.path), 'api-vazio.sqlite')})
+
+        # A geração válida anterior continua no disco
+        self.assertTrue(os.path.exists(self.sql.store.path))
+
+    def test_backend_invalido(self):
+        self.assertEqual(create_data_service(self.base_dir, 'sqlite').backend, 'sqlite')
+        with self.assertRaises(ValueError):
+            create_data_service(self.base_dir, 'oracle')
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex(
+            ['UNIMED CAMPINAS', 'SAÚDE CAIXA', 'CAIXA DE ASSISTÊNCIA', 'AMIL SAÚDE', 'ASSOCIACAO SAUDE UNIMED'],
+            ['123456', '654321', '111222', '222111', '120000']
+        )
+
+    def test_fold(self):
+        self.assertEqual(fold('  Assistência   Médica '), 'ASSISTENCIA MEDICA')
+        self.assertEqual(fold(None), '')
+
+    # Acentos e caixa não importam; substring no meio do nome também casa
+    def test_busca_sem_acento_e_substring(self):
+        self.assertEqual(self.index.search('saude'), (1, 3, 4))
+        self.assertEqual(self.index.search('SISTÊN'), (2,))
+
+    # Prefixo do nome vem antes de prefixo de palavra, que vem antes de substring
+    def test_ranking(self):
+        self.assertEqual(self.index.search('unimed'), (0, 4))
+        self.assertEqual(self.index.search('caixa'), (2, 1))
+        # Registro exato em primeiro lugar, depois prefixos do registro
+        self.assertEqual(self.index.search('12'), (0, 4, 2))
+        self.assertEqual(self.index.search('120000'), (4,))
+
+    def test_sem_busca_e_sem_resultado(self):
+        self.assertEqual(self.index.search(''), (0, 1, 2, 3, 4))
+        self.assertEqual(self.index.search('XYZ_NOME_IMPOSSIVEL_123'), ())
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1 @@
+# Utilitários compartilhados entre os módulos do pipeline (Testes 1, 2 e 4).
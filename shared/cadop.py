@@ -0,0 +1,284 @@
+import io
+import json
+import os
+import re
+import zipfile
+from datetime import datetime, timezone
+from urllib.parse import urljoin
+
+import pandas as pd
+
+# requests é opcional: a API só lê o cadastro local (load), sem acessar a rede.
+try:
+    import requests
+except ImportError:
+    requests = None
+
+from shared.cnpj import clean_cnpjs
+from shared.encoding import decode_bytes
+
+# Cadastro de operadoras ativas da ANS (CADOP), compartilhado pelos Testes 1 e 2 e pela API.
+# O CSV é baixado com requisição condicional (If-None-Match / If-Modified-Since), o encoding
+# é detectado uma única vez e o resultado vira um snapshot tipado (pickle do pandas) com os
+# índices por Registro ANS e por CNPJ. As execuções seguintes só leem o snapshot.
+CADOP_DIR_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/"
+CADOP_URL = urljoin(CADOP_DIR_URL, "Relatorio_cadop.csv")
+# O certificado do servidor da ANS é verificado: o CSV baixado fica gravado e é usado pelos
+# Testes 1, 2 e pela API. CADOP_INSECURE_SSL=1 desliga a verificação (só se a cadeia do gov.br
+# não for reconhecida na máquina).
+VERIFY_SSL = os.environ.get('CADOP_INSECURE_SSL') != '1'
+
+# Pasta do cadastro (padrão: a pasta auxiliar do Teste 1, onde o CSV sempre foi guardado)
+CADOP_DIR = os.environ.get('CADOP_DIR')
+RAW_NAME = "Relatorio_Cadop.csv"
+SNAPSHOT_NAME = "cadop_registry.pkl"
+META_NAME = "cadop_registry.json"
+# Muda quando o formato do snapshot muda (snapshots antigos são refeitos a partir do CSV)
+SNAPSHOT_VERSION = 1
+
+CAMPOS = ['RegistroANS', 'CNPJ', 'RazaoSocial', 'UF', 'Modalidade']
+
+
+def registry_dir(base_dir):
+    return CADOP_DIR or os.path.join(base_dir, '1_Leitura_Transformacao_Dados', 'data', 'auxiliary')
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+# Busca dinâmica do arquivo CADOP na listagem do diretório (usada quando a URL fixa dá 404,
+# ex: o arquivo foi renomeado). Retorna a URL do primeiro CSV/ZIP com 'cadop' ou 'relatorio' no nome, ou None.
+def find_cadop_url(dir_url, timeout=30):
+    response = requests.get(dir_url, timeout=timeout, verify=VERIFY_SSL)
+    response.raise_for_status()
+    links = re.findall(r'href\s*=\s*["\']([^"\']+)["\']', response.text, flags=re.IGNORECASE)
+    candidates = [l for l in links if ('csv' in l.lower() or 'zip' in l.lower())
+                  and ('cadop' in l.lower() or 'relatorio' in l.lower())]
+    return urljoin(dir_url, candidates[0]) if candidates else None
+
+
+# Chave canônica do Registro ANS: sem aspas, espaços e zeros à esquerda.
+# Equivale às tentativas reg / reg.lstrip('0') / reg.zfill(6) em uma única chave.
+def canonical_reg(series):
+    return series.astype(str).str.replace('"', '').str.strip().str.lstrip('0')
+
+
+# Índice do CADOP (Registro ANS canônico -> CNPJ, RazaoSocial), construído uma única vez.
+def build_cadop_index(df_cadop, reg_col, cnpj_col, raz_col):
+    index = df_cadop[[cnpj_col, raz_col]].copy()
+    index.columns = ['CNPJ', 'RazaoSocial']
+    index.index = canonical_reg(df_cadop[reg_col]).values
+    # Mantém a primeira ocorrência de cada registro
+    return index[~index.index.duplicated(keep='first')]
+
+
+# Busca as linhas de 'index' para uma coluna de chaves ('canonical' normaliza as chaves).
+# A chave é calculada só para os valores distintos (poucos milhares de operadoras) e o
+# resultado é expandido para todas as linhas pelos códigos do factorize.
+def lookup_index(index, keys, canonical=None):
+    codes, uniques = pd.factorize(keys)
+    uniques = pd.Series(uniques, dtype=object)
+    chaves = (canonical(uniques) if canonical else uniques).tolist()
+    # Uma linha extra, sem correspondência, para as chaves nulas (código -1)
+    found = index.reindex(chaves + [None])
+    codes[codes < 0] = len(chaves)
+    result = found.take(codes)
+    result.index = keys.index
+    return result
+
+
+# Busca CNPJ/RazaoSocial para uma coluna de Registros ANS.
+def lookup_cadop(index, regs):
+    return lookup_index(index, regs, canonical_reg)
+
+
+# Converte o CSV decodificado no cadastro tipado (colunas CAMPOS, na ordem do arquivo).
+# Colunas localizadas por nome parcial, como antes (resiliência contra mudança de nomes).
+def parse_cadop(texto):
+    df = pd.read_csv(io.StringIO(texto), sep=';', dtype=str, on_bad_lines='skip', quotechar='"')
+    df.columns = df.columns.str.strip().str.upper()
+    col = lambda *nomes: next((c for nome in nomes for c in df.columns if nome(c)), None)
+    colunas = {
+        'RegistroANS': col(lambda c: 'REGISTRO' in c and 'DATA' not in c),
+        'CNPJ': col(lambda c: 'CNPJ' in c),
+        'RazaoSocial': col(lambda c: 'RAZAO' in c),
+        'UF': col(lambda c: c == 'UF', lambda c: 'UF' in c),
+        'Modalidade': col(lambda c: 'MODALIDADE' in c),
+    }
+    faltando = [campo for campo in ('RegistroANS', 'CNPJ', 'RazaoSocial') if colunas[campo] is None]
+    if faltando:
+        raise ValueError(f"colunas esperadas do CADOP não encontradas: {faltando}")
+
+    cadastro = pd.DataFrame({
+        campo: (df[c].str.strip() if c else pd.Series(pd.NA, index=df.index, dtype='string'))
+        for campo, c in colunas.items()
+    })
+    cadastro['RegistroANS'] = cadastro['RegistroANS'].str.replace('"', '')
+    cadastro['CNPJ'] = clean_cnpjs(cadastro['CNPJ'])
+    cadastro['UF'] = cadastro['UF'].astype('category')
+    cadastro['Modalidade'] = cadastro['Modalidade'].astype('category')
+    return cadastro.reset_index(drop=True)
+
+
+# Cadastro local do CADOP. Uso: CadopRegistry(pasta).refresh() (com rede) ou .load() (offline).
+# - operadoras: cadastro tipado, na ordem do arquivo;
+# - por_registro: Registro ANS canônico -> CNPJ, RazaoSocial, UF, Modalidade, RegistroANS;
+# - por_cnpj: CNPJ (só dígitos) -> RegistroANS, RazaoSocial, UF, Modalidade.
+# Registros e CNPJs repetidos: vale a primeira ocorrência, como antes em cada teste.
+class CadopRegistry:
+    def __init__(self, directory, url=CADOP_URL):
+        self.directory = directory
+        self.url = url
+        self.raw_path = os.path.join(directory, RAW_NAME)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        self.meta_path = os.path.join(directory, META_NAME)
+        self.meta = self._read_meta()
+        self.operadoras = pd.DataFrame(columns=CAMPOS)
+        self.por_registro = pd.DataFrame(columns=CAMPOS).set_index('RegistroANS', drop=False)
+        self.por_cnpj = pd.DataFrame(columns=CAMPOS).set_index('CNPJ', drop=False)
+        # Como o cadastro foi obtido: 'baixado', 'nao_modificado', 'offline' ou 'local'
+        self.status = None
+
+    @property
+    def empty(self):
+        return self.operadoras.empty
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self):
+        tmp_path = f"{self.meta_path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, indent=2, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp_path, self.meta_path)
+
+    # Requisição condicional: os validadores só valem para a mesma URL do download anterior
+    def _get(self, url, timeout):
+        headers = {}
+        if os.path.exists(self.raw_path) and self.meta.get('url') == url:
+            if self.meta.get('etag'):
+                headers['If-None-Match'] = self.meta['etag']
+            if self.meta.get('last_modified'):
+                headers['If-Modified-Since'] = self.meta['last_modified']
+        return requests.get(url, headers=headers, timeout=timeout, verify=VERIFY_SSL)
+
+    # Baixa o CSV só se ele mudou no servidor (304 = mantém o local) e carrega o cadastro.
+    # Se a URL fixa der 404, procura o arquivo na listagem do diretório.
+    # Sem rede (ou sem requests), segue com o que houver localmente.
+    def refresh(self, timeout=60):
+        if requests is None:
+            print("     [AVISO] requests não instalado: CADOP não atualizado. Usando a cópia local.")
+            self.status = 'offline'
+            return self.load()
+        try:
+            url = self.url
+            r = self._get(url, timeout)
+            if r.status_code == 404:
+                encontrada = find_cadop_url(urljoin(url, '.'), timeout)
+                if encontrada and encontrada != url:
+                    print(f"     [AVISO] {url} não encontrado; usando {encontrada} (listagem do diretório).")
+                    url = encontrada
+                    r = self._get(url, timeout)
+            if r.status_code == 304:
+                self.status = 'nao_modificado'
+            else:
+                r.raise_for_status()
+                self._store_raw(r.content)
+                self.meta.update(url=url, etag=r.headers.get('ETag'),
+                                 last_modified=r.headers.get('Last-Modified'), fetched_at=utc_now())
+                self.status = 'baixado'
+            self.meta['checked_at'] = utc_now()
+            self._write_meta()
+        except (requests.RequestException, OSError, zipfile.BadZipFile) as e:
+            print(f"     [AVISO] CADOP não atualizado ({e}). Usando a cópia local.")
+            self.status = 'offline'
+        return self.load()
+
+    # Grava o CSV baixado (ZIP: o primeiro CSV de dentro) por cima do anterior, atomicamente
+    def _store_raw(self, conteudo):
+        if zipfile.is_zipfile(io.BytesIO(conteudo)):
+            with zipfile.ZipFile(io.BytesIO(conteudo)) as z:
+                membros = [m for m in z.namelist() if m.lower().endswith('.csv')]
+                if not membros:
+                    raise zipfile.BadZipFile("ZIP do CADOP sem CSV")
+                conteudo = z.read(membros[0])
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.raw_path}.tmp{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(conteudo)
+        os.replace(tmp_path, self.raw_path)
+
+    # Versão do CSV local (tamanho + mtime): se bater com a do snapshot, não há o que reparsear
+    def _raw_version(self):
+        if not os.path.exists(self.raw_path):
+            return None
+        st = os.stat(self.raw_path)
+        return [st.st_size, st.st_mtime_ns]
+
+    # Carrega o snapshot, ou o refaz a partir do CSV local se ele mudou. Nunca acessa a rede.
+    def load(self):
+        versao = self._raw_version()
+        snapshot = self.meta.get('snapshot') or {}
+        usa_snapshot = (snapshot.get('version') == SNAPSHOT_VERSION and os.path.exists(self.snapshot_path)
+                        and (versao is None or snapshot.get('raw') == versao))
+        if usa_snapshot:
+            try:
+                self._set(pd.read_pickle(self.snapshot_path))
+                self.status = self.status or 'local'
+                return self
+            except Exception as e:
+                print(f"     [AVISO] Snapshot do CADOP ignorado ({e}); relendo o CSV.")
+
+        if versao is None:
+            return self
+
+        with open(self.raw_path, 'rb') as f:
+            # Encoding detectado no prefixo (uma vez por versão do arquivo), decodificação em uma passada
+            texto, encoding, fallback_rows = decode_bytes(f.read())
+        cadastro = parse_cadop(texto)
+        indices = self._build(cadastro)
+        self._set(indices)
+
+        tmp_path = f"{self.snapshot_path}.tmp{os.getpid()}"
+        try:
+            pd.to_pickle(indices, tmp_path)
+            os.replace(tmp_path, self.snapshot_path)
+            self.meta.update(encoding=encoding, fallback_rows=fallback_rows, rows=len(cadastro),
+                             snapshot={'version': SNAPSHOT_VERSION, 'raw': versao, 'built_at': utc_now()})
+            self._write_meta()
+        except OSError as e:
+            print(f"     [AVISO] Não foi possível gravar o snapshot do CADOP: {e}")
+        self.status = self.status or 'local'
+        return self
+
+    @staticmethod
+    def _build(cadastro):
+        chaves = canonical_reg(cadastro['RegistroANS'])
+        por_registro = cadastro.set_index(pd.Index(chaves.to_numpy(), name=None))
+        por_registro = por_registro[~por_registro.index.duplicated(keep='first')]
+        com_cnpj = cadastro[cadastro['CNPJ'].fillna('') != '']
+        por_cnpj = com_cnpj.set_index(pd.Index(com_cnpj['CNPJ'].to_numpy(), name=None))
+        por_cnpj = por_cnpj[~por_cnpj.index.duplicated(keep='first')]
+        return {'operadoras': cadastro, 'por_registro': por_registro, 'por_cnpj': por_cnpj}
+
+    def _set(self, indices):
+        self.operadoras = indices['operadoras']
+        self.por_registro = indices['por_registro']
+        self.por_cnpj = indices['por_cnpj']
+
+    # Cadastro para uma coluna de Registros ANS (aceita zeros à esquerda, aspas e espaços)
+    def lookup_registro(self, regs):
+        return lookup_index(self.por_registro, regs, canonical_reg)
+
+    # Cadastro para uma coluna de CNPJs já limpos (só dígitos)
+    def lookup_cnpj(self, cnpjs):
+        return lookup_index(self.por_cnpj, cnpjs)
+
+    # Uma operadora por CNPJ, no formato de operadoras_ativas.csv (Teste 2)
+    def operadoras_por_cnpj(self):
+        return self.operadoras.drop_duplicates(subset=['CNPJ'])[['CNPJ', 'RegistroANS', 'RazaoSocial', 'UF', 'Modalidade']]
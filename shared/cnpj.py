@@ -0,0 +1,160 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Pesos do Módulo 11 para o primeiro e o segundo dígito verificador
+PESOS1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], dtype=np.int64)
+PESOS2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], dtype=np.int64)
+
+# Máscara usual do CNPJ (00.000.000/0000-00), removida sem regex
+SEPARADORES = ('.', '/', '-', ' ')
+
+# Tabela de CNPJs já resolvidos (valor bruto -> CNPJ limpo -> válido), gravada ao lado da
+# saída do Teste 2 e reaproveitada pelo Teste 2, pelo Teste 3 e pela API
+MEMO_FILE = "cnpj_memo.csv"
+MEMO_COLUMNS = ['bruto', 'cnpj', 'valido']
+# Limite de entradas gravadas (as usadas na última execução têm prioridade)
+MEMO_MAX_ENTRIES = 200000
+
+
+# Dígito verificador a partir das somas ponderadas (vetor de somas -> vetor de dígitos)
+def _digito(somas):
+    digito = 11 - (somas % 11)
+    return np.where(digito >= 10, 0, digito)
+
+
+# Remove caracteres não numéricos da coluna (nulos continuam nulos).
+# Os separadores da máscara saem com substituições literais; a regex só roda nas
+# poucas linhas que ainda tiverem outro caractere.
+def clean_cnpjs(cnpjs):
+    serie = cnpjs if isinstance(cnpjs, pd.Series) else pd.Series(cnpjs, dtype=object)
+    if not isinstance(serie.dtype, pd.StringDtype):
+        serie = serie.astype(object).astype(str)
+    for separador in SEPARADORES:
+        serie = serie.str.replace(separador, '', regex=False)
+    outros = ~serie.str.isdigit().to_numpy(dtype=bool, na_value=True)
+    if outros.any():
+        serie = serie.copy()
+        serie[outros] = serie[outros].str.replace(r'[^0-9]', '', regex=True)
+    return serie
+
+
+# Valida CNPJs já limpos (só dígitos), retornando uma máscara booleana (np.ndarray).
+# Os dígitos de cada CNPJ de 14 posições viram uma linha de uma matriz N x 14 e os dois
+# dígitos verificadores saem de produtos matriciais com os vetores de pesos.
+def check_digits(digitos):
+    valido = (digitos.str.len() == 14).to_numpy(dtype=bool, na_value=False, copy=True)
+    if not valido.any():
+        return valido
+
+    # Matriz N x 14 com os dígitos (bytes ASCII - '0'; dígitos não ASCII viram '?' e invalidam a linha)
+    texto = ''.join(digitos[valido].tolist()).encode('ascii', errors='replace')
+    matriz = (np.frombuffer(texto, dtype=np.uint8).reshape(-1, 14) - ord('0')).astype(np.int64)
+    ok = (matriz <= 9).all(axis=1)
+
+    # Sequências inválidas conhecidas (ex: 00000000000000)
+    ok &= ~(matriz == matriz[:, :1]).all(axis=1)
+
+    # Cálculo dos dígitos verificadores
+    ok &= _digito(matriz[:, :12] @ PESOS1) == matriz[:, 12]
+    ok &= _digito(matriz[:, :13] @ PESOS2) == matriz[:, 13]
+
+    valido[valido] = ok
+    return valido
+
+
+def validate_cnpj_batch(cnpjs):
+    return check_digits(clean_cnpjs(cnpjs))
+
+
+# Caminho padrão da tabela, a partir da raiz do repositório
+def memo_path(base_dir):
+    return os.path.join(base_dir, '2_Transformacao_Validacao', 'data', MEMO_FILE)
+
+
+# Memo de CNPJs: cada valor bruto distinto é limpo e validado uma única vez (aqui e nas
+# execuções seguintes, via arquivo). Nas colunas de despesas, com milhões de linhas e
+# poucos milhares de operadoras, o custo passa a ser O(CNPJs distintos) e não O(linhas).
+class CnpjMemo:
+    def __init__(self, path=None, max_entries=MEMO_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = {}
+        self.used = set()
+        self.new_entries = 0
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        try:
+            df = pd.read_csv(self.path, sep=';', encoding='utf-8', dtype=str, keep_default_na=False)
+        except (OSError, ValueError, pd.errors.ParserError):
+            return
+        # Arquivo de outro formato: ignora (será regravado)
+        if list(df.columns) != MEMO_COLUMNS:
+            return
+        self.entries = dict(zip(df['bruto'], zip(df['cnpj'], (df['valido'] == '1').tolist())))
+
+    # (CNPJ limpo, válido) para cada linha: fatoriza a coluna e só resolve os valores
+    # ausentes do memo. Nulos ficam nulos e inválidos.
+    def resolve(self, cnpjs):
+        serie = cnpjs if isinstance(cnpjs, pd.Series) else pd.Series(cnpjs, dtype=object)
+        codes, uniques = pd.factorize(serie)
+        brutos = [str(u) for u in uniques]
+
+        faltantes = [b for b in brutos if b not in self.entries]
+        if faltantes:
+            digitos = clean_cnpjs(pd.Series(faltantes, dtype=object))
+            self.entries.update(zip(faltantes, zip(digitos.tolist(), check_digits(digitos).tolist())))
+            self.new_entries += len(faltantes)
+        self.used.update(brutos)
+
+        # A última posição (sentinela) atende os nulos: o factorize os codifica como -1
+        limpos = np.array([self.entries[b][0] for b in brutos] + [None], dtype=object)
+        validos = np.array([self.entries[b][1] for b in brutos] + [False], dtype=bool)
+
+        # Entrada categórica (esquema compacto): a saída também é categórica, sem uma string por
+        # linha. Categorias ordenadas: ordenar pela coluna é ordenar pelo CNPJ limpo.
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            posicoes, categorias = pd.factorize(pd.Series(limpos[:-1], dtype=object), sort=True)
+            codigos = np.append(posicoes, -1)[codes]
+            limpo = pd.Series(pd.Categorical.from_codes(codigos, categories=categorias), index=serie.index)
+            return limpo, validos[codes]
+
+        limpo = pd.Series(limpos[codes], index=serie.index, dtype=object)
+        if isinstance(serie.dtype, pd.StringDtype):
+            limpo = limpo.astype(serie.dtype)
+        return limpo, validos[codes]
+
+    def clean(self, cnpjs):
+        return self.resolve(cnpjs)[0]
+
+    def validate(self, cnpjs):
+        return self.resolve(cnpjs)[1]
+
+    # Grava a tabela (se houver entradas novas), limitada a max_entries: primeiro as
+    # usadas nesta execução, depois as antigas. Retorna False se não foi possível gravar.
+    def save(self):
+        if not self.path or (not self.new_entries and len(self.entries) <= self.max_entries):
+            return True
+        brutos = [b for b in self.entries if b in self.used] + [b for b in self.entries if b not in self.used]
+        brutos = brutos[:self.max_entries]
+        df = pd.DataFrame({
+            'bruto': brutos,
+            'cnpj': [self.entries[b][0] for b in brutos],
+            'valido': ['1' if self.entries[b][1] else '0' for b in brutos],
+        }, columns=MEMO_COLUMNS)
+
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            df.to_csv(tmp_path, sep=';', index=False, encoding='utf-8')
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        self.entries = {b: self.entries[b] for b in brutos}
+        self.new_entries = 0
+        return True
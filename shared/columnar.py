@@ -0,0 +1,120 @@
+import os
+import glob
+import shutil
+
+import pandas as pd
+
+from shared.compact import compact_frame
+
+# PyArrow é opcional: sem ele, o pipeline continua apenas com o CSV.
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+
+PARQUET_DIR_NAME = "consolidado_despesas_parquet"
+# CSV consolidado gravado na mesma pasta e na mesma execução que o dataset
+CSV_NAME = "consolidado_despesas.csv"
+# Marcador gravado quando a execução que gerou o dataset termina (o leitor do dataset ignora '_*')
+MARKER_NAME = "_SUCCESS"
+PARTITION_COLS = ['Ano', 'Trimestre']
+
+def pyarrow_available():
+    return pa is not None
+
+# Esquema tipado do consolidado de despesas. Ano/Trimestre são as colunas de partição:
+# ficam no caminho dos arquivos e não dentro deles.
+def _schema():
+    return pa.schema([
+        ('CNPJ', pa.string()),
+        ('RazaoSocial', pa.dictionary(pa.int32(), pa.string())),
+        ('Valor Despesas', pa.float64()),
+        ('Ano', pa.int16()),
+        ('Trimestre', pa.int16()),
+    ])
+
+def _partitioning():
+    return ds.partitioning(pa.schema([('Ano', pa.int16()), ('Trimestre', pa.int16())]), flavor='hive')
+
+# Grava o consolidado em Parquet particionado por Ano/Trimestre (Ano=2024/Trimestre=1/part-*.parquet),
+# bloco a bloco. Cada bloco vira um arquivo numerado, o que permite descartar (rollback)
+# os blocos de um arquivo de origem que precise ser relido.
+class ParquetDatasetWriter:
+    def __init__(self, root_dir):
+        if pa is None:
+            raise ImportError("pyarrow não está instalado (pip install pyarrow)")
+        self.root_dir = root_dir
+        self.sequence = 0
+        if os.path.exists(root_dir): shutil.rmtree(root_dir)
+        os.makedirs(root_dir)
+
+    def write(self, df):
+        frame = pd.DataFrame({
+            'CNPJ': df['CNPJ'].astype(object),
+            'RazaoSocial': df['RazaoSocial'].astype(object),
+            'Valor Despesas': df['Valor Despesas'].astype('float64'),
+            'Ano': df['Ano'].astype('Int16'),
+            'Trimestre': df['Trimestre'].astype('Int16'),
+        })
+        table = pa.Table.from_pandas(frame, schema=_schema(), preserve_index=False)
+        ds.write_dataset(
+            table, self.root_dir, format='parquet', partitioning=_partitioning(),
+            basename_template=f"part-{self.sequence:06d}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+        )
+        self.sequence += 1
+
+    def checkpoint(self):
+        return self.sequence
+
+    # Marca o dataset como completo: só então ele passa a ser encontrado por find_parquet_dataset
+    def commit(self):
+        with open(os.path.join(self.root_dir, MARKER_NAME), 'w', encoding='utf-8'):
+            pass
+
+    def rollback(self, checkpoint):
+        for path in glob.glob(os.path.join(self.root_dir, '**', 'part-*.parquet'), recursive=True):
+            if int(os.path.basename(path).split('-')[1]) >= checkpoint:
+                os.remove(path)
+        self.sequence = checkpoint
+
+# Remove o dataset de uma execução anterior (ex: rodada sem --parquet depois de uma com)
+def remove_parquet_dataset(root_dir):
+    if not os.path.isdir(root_dir):
+        return False
+    shutil.rmtree(root_dir)
+    return True
+
+# Procura o dataset Parquet do consolidado ao lado do CSV ('base_dir'). Retorna o caminho ou None.
+# Só vale um dataset completo (com o marcador) e pelo menos tão novo quanto o CSV da pasta:
+# um dataset que sobrou de uma execução anterior não pode esconder o CSV gravado depois.
+def find_parquet_dataset(base_dir):
+    path = os.path.join(base_dir, PARQUET_DIR_NAME)
+    marker = os.path.join(path, MARKER_NAME)
+    if pa is None or not os.path.exists(marker):
+        return None
+    if not glob.glob(os.path.join(path, '**', '*.parquet'), recursive=True):
+        return None
+    csv_path = os.path.join(base_dir, CSV_NAME)
+    if os.path.exists(csv_path) and os.stat(csv_path).st_mtime_ns > os.stat(marker).st_mtime_ns:
+        return None
+    return path
+
+# Lê o consolidado no esquema compacto (shared/compact.py): Trimestre/Ano Int16, Valor float64
+# e CNPJ/RazaoSocial categóricos.
+def read_consolidado_parquet(path):
+    dataset = ds.dataset(path, format='parquet', partitioning=_partitioning())
+    df = dataset.to_table().to_pandas()
+    cols = ['CNPJ', 'RazaoSocial', 'Trimestre', 'Ano', 'Valor Despesas']
+    return compact_frame(df[cols].copy())
+
+# Mesma leitura em blocos de até 'batch_rows' linhas, sem materializar o dataset inteiro
+def iter_consolidado_parquet(path, batch_rows):
+    dataset = ds.dataset(path, format='parquet', partitioning=_partitioning())
+    cols = ['CNPJ', 'RazaoSocial', 'Trimestre', 'Ano', 'Valor Despesas']
+    for batch in dataset.to_batches(columns=cols, batch_size=batch_rows):
+        df = batch.to_pandas()
+        df['Ano'] = df['Ano'].astype('Int16')
+        df['Trimestre'] = df['Trimestre'].astype('Int16')
+        yield df
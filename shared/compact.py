@@ -0,0 +1,78 @@
+from collections import defaultdict
+
+import pandas as pd
+
+# Esquema compacto do consolidado de despesas em memória. As colunas de texto repetem poucos
+# milhares de valores em milhões de linhas: viram categorias (um código int8/int16 por linha +
+# uma cópia de cada valor). Ano/Trimestre viram inteiros pequenos (nulos preservados) e o valor,
+# float64. Colunas ausentes no DataFrame são ignoradas.
+COMPACT_SCHEMA = {
+    'CNPJ': 'category',
+    'RazaoSocial': 'category',
+    'UF': 'category',
+    'Modalidade': 'category',
+    'Ano': 'Int16',
+    'Trimestre': 'Int16',
+    'Valor Despesas': 'float64',
+}
+
+
+# dtype para o read_csv: as colunas categóricas já saem do parser como categorias (sem uma
+# string por linha em memória); as demais continuam texto e são convertidas por compact_frame.
+def csv_dtypes(schema=COMPACT_SCHEMA):
+    return defaultdict(lambda: str, {col: 'category' for col, tipo in schema.items() if tipo == 'category'})
+
+
+# Aplica o esquema compacto (em place) e devolve o DataFrame.
+# Valores de texto em formato monetário devem ser convertidos antes (float64 só é aplicado a
+# colunas numéricas); Ano/Trimestre em texto são convertidos, e o que não for número vira nulo.
+def compact_frame(df, schema=COMPACT_SCHEMA):
+    for col, tipo in schema.items():
+        if col not in df.columns or str(df[col].dtype) == tipo:
+            continue
+        if tipo == 'category':
+            df[col] = df[col].astype('category')
+        elif tipo == 'float64':
+            if pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = df[col].astype('float64')
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype(tipo)
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(tipo)
+    return df
+
+
+# Memória do processo (kB). No Linux separa a parte anônima (RssAnon) da mapeada de
+# arquivos (RssFile), que é onde ficam arquivos mapeados como o snapshot da API.
+def process_memory():
+    memoria = {}
+    try:
+        with open('/proc/self/status') as f:
+            for linha in f:
+                chave, _, valor = linha.partition(':')
+                if chave in ('VmRSS', 'RssAnon', 'RssFile', 'VmHWM'):
+                    memoria[chave] = int(valor.split()[0])
+    except OSError:
+        import resource
+        memoria['VmHWM'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return memoria
+
+
+# Relatório de memória de um DataFrame: bytes por coluna (deep, contando as strings), total,
+# bytes por linha e a RSS atual do processo (kB), para comparar esquemas na mesma base.
+def memory_report(df):
+    colunas = df.memory_usage(deep=True, index=False)
+    total = int(colunas.sum())
+    return {
+        'linhas': len(df),
+        'bytes': total,
+        'bytes_por_linha': round(total / len(df), 1) if len(df) else 0.0,
+        'colunas': {col: int(n) for col, n in colunas.items()},
+        'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
+        'rss_kb': process_memory().get('VmRSS'),
+    }
+
+
+# Linha de resumo do relatório para os logs
+def format_memory(report):
+    return f"{report['bytes'] / 1024 ** 2:.1f} MB ({report['bytes_por_linha']:.0f} bytes/linha, {report['linhas']} linhas)"
@@ -0,0 +1,130 @@
+import codecs
+import io
+import os
+
+# Prefixo do arquivo usado para detectar o encoding (lido uma única vez, sem reabrir o arquivo)
+SAMPLE_BYTES = 64 * 1024
+UTF8_BOM = codecs.BOM_UTF8
+
+# Política de fallback: o encoding detectado no prefixo vale para o arquivo inteiro; uma linha
+# que não decodifique nele (ex: um byte Latin-1 perdido no fim de um CSV UTF-8) é decodificada
+# com o primeiro destes encodings que funcionar. 'latin1' aceita qualquer byte.
+FALLBACK_ENCODINGS = ('cp1252', 'latin1')
+
+# Tamanho dos blocos decodificados de uma vez
+BLOCK_SIZE = 1024 * 1024
+
+
+# Detecta o encoding a partir de um prefixo do arquivo: BOM -> 'utf-8-sig'; se a maioria das linhas
+# não ASCII da amostra for UTF-8 válido -> 'utf-8' (as demais ficam para o fallback por linha);
+# senão, o primeiro encoding de fallback que decodifica a amostra. A última linha pode estar cortada
+# no meio de um caractere multibyte: ela passa pelo decodificador incremental.
+def sniff_encoding(sample):
+    if sample.startswith(UTF8_BOM):
+        return 'utf-8-sig'
+    linhas = sample.split(b'\n')
+    validas = invalidas = 0
+    for i, linha in enumerate(linhas):
+        if linha.isascii():
+            continue
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(linha, final=i < len(linhas) - 1)
+            validas += 1
+        except UnicodeDecodeError:
+            invalidas += 1
+    if validas >= invalidas:
+        return 'utf-8'
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            sample.decode(encoding)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return FALLBACK_ENCODINGS[-1]
+
+
+# Decodifica um stream binário em uma única passada e o repassa em UTF-8 (para o read_csv com
+# encoding='utf-8'). O encoding é detectado no prefixo (ou informado, ex: o que já foi registrado
+# no manifesto). Blocos de linhas inteiras são decodificados de uma vez; só um bloco que falhar é
+# refeito linha a linha, e cada linha decodificada com o fallback é contada em 'fallback_rows'.
+# Em UTF-8, os blocos válidos são repassados como estão (a decodificação serve só de validação).
+class DecodedStream(io.RawIOBase):
+    def __init__(self, stream, encoding=None, block_size=BLOCK_SIZE):
+        self.stream = stream
+        self.block_size = block_size
+        self.fallback_rows = 0
+        head = stream.read(SAMPLE_BYTES) or b''
+        self.encoding = encoding or sniff_encoding(head)
+        self.sniffed = encoding is None
+        self.codec = 'utf-8' if self.encoding in ('utf-8', 'utf-8-sig') else self.encoding
+        if self.encoding == 'utf-8-sig' and head.startswith(UTF8_BOM):
+            head = head[len(UTF8_BOM):]
+        self._rest = head
+        self._pending = b''
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def close(self):
+        if not self.closed:
+            self.stream.close()
+        super().close()
+
+    def _fill(self):
+        while not self._pending and not self._eof:
+            block = self.stream.read(self.block_size)
+            if not block:
+                self._eof = True
+                block, self._rest = self._rest, b''
+            else:
+                block = self._rest + block
+                cut = block.rfind(b'\n') + 1
+                block, self._rest = block[:cut], block[cut:]
+            if block:
+                self._pending = self._decode(block)
+
+    def _decode(self, block):
+        try:
+            texto = block.decode(self.codec)
+        except UnicodeDecodeError:
+            return b'\n'.join(self._decode_line(linha) for linha in block.split(b'\n'))
+        return block if self.codec == 'utf-8' else texto.encode('utf-8')
+
+    def _decode_line(self, linha):
+        try:
+            texto = linha.decode(self.codec)
+        except UnicodeDecodeError:
+            self.fallback_rows += 1
+            for encoding in FALLBACK_ENCODINGS:
+                try:
+                    return linha.decode(encoding).encode('utf-8')
+                except UnicodeDecodeError:
+                    continue
+        return linha if self.codec == 'utf-8' else texto.encode('utf-8')
+
+    def readinto(self, buffer):
+        self._fill()
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    # Resumo para logs e manifestos
+    def info(self):
+        return {'encoding': self.encoding, 'fallback_rows': self.fallback_rows}
+
+
+# Abre um arquivo (caminho ou stream binário) decodificado em uma única passada.
+# Retorna (stream em UTF-8 para o read_csv, DecodedStream com o encoding e o contador de fallback).
+def open_decoded(source, encoding=None):
+    raw = open(source, 'rb') if isinstance(source, (str, os.PathLike)) else source
+    decoder = DecodedStream(raw, encoding)
+    return io.BufferedReader(decoder, buffer_size=BLOCK_SIZE), decoder
+
+
+# Decodifica um conteúdo já em memória. Retorna (texto, encoding, linhas em fallback).
+def decode_bytes(conteudo, encoding=None):
+    decoder = DecodedStream(io.BytesIO(conteudo), encoding)
+    texto = decoder.readall().decode('utf-8')
+    return texto, decoder.encoding, decoder.fallback_rows
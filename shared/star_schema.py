@@ -0,0 +1,73 @@
+import pathlib
+import sqlite3
+
+# Esquema estrela do Teste 3 (3_Banco_de_Dados/1_create_tables.sql) no dialeto do SQLite,
+# para rodar localmente sem MySQL. Diferenças em relação ao script original:
+# - DECIMAL vira REAL e DATE vira TEXT (o SQLite não tem esses tipos);
+# - data_evento aceita nulo: o consolidado do Teste 1 é trimestral e não traz a data;
+# - sem a FK fato_despesas -> dim_operadoras e sem UNIQUE no CNPJ da dimensão: despesas de
+#   operadoras fora do cadastro são mantidas, como no restante do pipeline;
+# - a chave de agg_despesas_uf é o grão real do agregador do Teste 2 (razão social, registro,
+#   modalidade e UF): com só (registro_ans, uf), as operadoras 'N/I' colidiriam entre si.
+# Os índices ficam separados das tabelas para que uma carga em massa possa criá-los só no final.
+TABLES = [
+    """CREATE TABLE IF NOT EXISTS dim_operadoras (
+        registro_ans TEXT PRIMARY KEY,
+        cnpj TEXT NOT NULL,
+        razao_social TEXT NOT NULL,
+        modalidade TEXT,
+        uf TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS fato_despesas (
+        id INTEGER PRIMARY KEY,
+        cnpj_operadora TEXT,
+        data_evento TEXT,
+        trimestre INTEGER,
+        ano INTEGER,
+        valor_despesa REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS agg_despesas_uf (
+        razao_social TEXT,
+        registro_ans TEXT,
+        modalidade TEXT,
+        uf TEXT,
+        despesa_total REAL,
+        media_trimestral REAL,
+        desvio_padrao REAL,
+        qtd_registros INTEGER,
+        PRIMARY KEY (registro_ans, uf, razao_social, modalidade)
+    )""",
+]
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_operadoras_cnpj ON dim_operadoras (cnpj)",
+    "CREATE INDEX IF NOT EXISTS idx_uf ON dim_operadoras (uf)",
+    "CREATE INDEX IF NOT EXISTS idx_data ON fato_despesas (data_evento)",
+    "CREATE INDEX IF NOT EXISTS idx_cnpj ON fato_despesas (cnpj_operadora)",
+]
+
+# Instruções preparadas mantidas por conexão (o sqlite3 reaproveita o plano das consultas repetidas)
+CACHED_STATEMENTS = 256
+# Quanto do arquivo pode ser lido via mmap nas conexões de leitura
+MMAP_BYTES = 256 * 1024 * 1024
+
+
+def create_tables(conn):
+    for ddl in TABLES:
+        conn.execute(ddl)
+
+
+def create_indexes(conn):
+    for ddl in INDEXES:
+        conn.execute(ddl)
+
+
+# Abre o banco. Somente leitura usa a URI 'mode=ro' (nunca cria nem altera o arquivo) e mmap.
+def connect(path, readonly=False, check_same_thread=True):
+    if readonly:
+        uri = pathlib.Path(path).absolute().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, cached_statements=CACHED_STATEMENTS,
+                               check_same_thread=check_same_thread)
+        conn.execute(f"PRAGMA mmap_size={MMAP_BYTES}")
+        return conn
+    return sqlite3.connect(path, cached_statements=CACHED_STATEMENTS, check_same_thread=check_same_thread)